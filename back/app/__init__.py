@@ -1,18 +1,47 @@
+import logging
 from flask import Flask, jsonify
 from flask_cors import CORS
 from app.config import Config
 from app.routes.storage_routes import storage_bp
 from app.routes.logging_routes import logging_bp
 from app.routes.pipeline_routes import pipeline_bp
+from app.routes.metrics_routes import metrics_bp
+from app.routes.profiling_routes import profiling_bp
 from app.utils.exceptions import InvalidUsage
+from app.utils import compression, metrics, profiling
+from app.utils.json_provider import FastJSONProvider
+
+
+def _configure_logging():
+    """
+    Los módulos de la app registran con logging.getLogger(__name__) (loggers
+    "app.*"). Bajo gunicorn se usan sus handlers y su nivel; en local, stderr.
+    """
+    logger = logging.getLogger("app")
+    if logger.handlers:
+        return
+    gunicorn_logger = logging.getLogger("gunicorn.error")
+    if gunicorn_logger.handlers:
+        logger.handlers = gunicorn_logger.handlers
+        logger.setLevel(gunicorn_logger.level)
+    else:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(
+            "[%(asctime)s] [%(process)d] [%(levelname)s] %(name)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    logger.propagate = False
 
 
 def create_app():
     """
     Application Factory: Crea y configura la instancia de la aplicación Flask
     """
+    _configure_logging()
     app = Flask(__name__)
     app.config.from_object(Config)
+    # jsonify con orjson (numpy/NaN nativos) si está instalado
+    app.json = FastJSONProvider(app)
 
     # Configurar CORS con los orígenes permitidos
     CORS(app, origins=Config.CORS_ORIGINS)
@@ -22,6 +51,26 @@ def create_app():
     app.register_blueprint(logging_bp, url_prefix="/api/logs")
     app.register_blueprint(pipeline_bp, url_prefix="/api/pipeline")
 
+    # Latencia por request/etapa: /metrics y header Server-Timing
+    if Config.METRICS_ENABLED:
+        metrics.init_app(app, server_timing=Config.SERVER_TIMING_ENABLED)
+        app.register_blueprint(metrics_bp)
+
+    # Se registra después de las métricas para que su tiempo entre en Server-Timing
+    if Config.RESPONSE_COMPRESSION_MIN_BYTES > 0:
+        compression.init_app(app, min_bytes=Config.RESPONSE_COMPRESSION_MIN_BYTES)
+
+    # Perfilado bajo demanda de cualquier ruta: solo si hay token configurado
+    if Config.PROFILING_TOKEN:
+        profiling.init_app(
+            app,
+            token=Config.PROFILING_TOKEN,
+            output_dir=Config.PROFILING_OUTPUT_DIR,
+            interval=Config.PROFILING_SAMPLE_INTERVAL,
+            max_profiles=Config.PROFILING_MAX_PROFILES,
+        )
+        app.register_blueprint(profiling_bp)
+
     # Registrar un manejador de errores personalizado para toda la app
     @app.errorhandler(InvalidUsage)
     def handle_invalid_usage(error):
@@ -1,5 +1,6 @@
 import os
 import json
+import tempfile
 from dotenv import load_dotenv
 
 # __file__ se refiere a config.py, dirname() nos da /app, dirname() de nuevo nos da la raíz
@@ -17,7 +18,72 @@ class Config:
     GCP_LOGGER_NAME = os.environ.get("GCP_LOGGER_NAME")
     
     CORS_ORIGINS = os.environ.get("CORS_ORIGINS", "").split(",")
-    
+
+    # Tamaño del pool de conexiones HTTP compartido por los clientes de BigQuery
+    GCP_HTTP_POOL_SIZE = int(os.environ.get("GCP_HTTP_POOL_SIZE", 16))
+
+    # Caché de esquemas de BigQuery (validación del paso 3)
+    BQ_SCHEMA_CACHE_TTL = int(os.environ.get("BQ_SCHEMA_CACHE_TTL", 10 * 60))
+    # Tablas inexistentes: TTL corto para que una tabla recién creada aparezca rápido
+    BQ_SCHEMA_NEGATIVE_TTL = int(os.environ.get("BQ_SCHEMA_NEGATIVE_TTL", 30))
+
+    # Caché de análisis (/analyze pasos 2 y 3 y /upload reutilizan el mismo parseo)
+    ANALYSIS_CACHE_TTL = int(os.environ.get("ANALYSIS_CACHE_TTL", 15 * 60))
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("ANALYSIS_CACHE_MAX_ENTRIES", 16))
+
+    # Caché de listados de GCS (navegación de productos/carpetas)
+    LISTING_CACHE_TTL = int(os.environ.get("LISTING_CACHE_TTL", 30))
+    LISTING_CACHE_MAX_ENTRIES = int(os.environ.get("LISTING_CACHE_MAX_ENTRIES", 2048))
+
+    # Escritura de Parquet en streaming hacia GCS (memoria acotada a un row group)
+    PARQUET_ROW_GROUP_SIZE = int(os.environ.get("PARQUET_ROW_GROUP_SIZE", 100_000))
+    PARQUET_COMPRESSION = os.environ.get("PARQUET_COMPRESSION", "snappy")
+    # Debe ser múltiplo de 256 KB (requisito de las subidas reanudables de GCS)
+    GCS_UPLOAD_CHUNK_SIZE = int(os.environ.get("GCS_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+
+    # Jobs en segundo plano (save-data). El store SQLite es compartido por los
+    # workers de gunicorn del contenedor. Por defecto vive en /tmp, que en Cloud
+    # Run es memoria de la instancia: al reciclarse se pierden los jobs y sus
+    # payloads. Para conservarlos, JOBS_DB_PATH (y JOBS_SPOOL_DIR) deben apuntar
+    # a un volumen montado (ej: Filestore/NFS).
+    JOBS_DB_PATH = os.environ.get(
+        "JOBS_DB_PATH", os.path.join(tempfile.gettempdir(), "jobs.sqlite3"))
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+    JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", 24 * 60 * 60))
+    # Cada proceso renueva cada JOB_HEARTBEAT_INTERVAL el lease de sus jobs; un
+    # job pendiente con el lease vencido se considera huérfano y se re-encola
+    JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 60))
+    JOB_HEARTBEAT_INTERVAL = float(os.environ.get("JOB_HEARTBEAT_INTERVAL", 15))
+    # Payloads columnares de jobs encolados (tablas Arrow en disco, mismo volumen que el store)
+    JOBS_SPOOL_DIR = os.environ.get(
+        "JOBS_SPOOL_DIR", os.path.join(os.path.dirname(JOBS_DB_PATH) or ".", "job-spool"))
+
+    # Envío de logs a Cloud Logging: "async" (lotes en segundo plano) o "sync"
+    LOGGING_MODE = os.environ.get("LOGGING_MODE", "async").lower()
+    LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", 100))
+    LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", 2.0))
+    # Con la cola llena los logs nuevos se descartan (se cuentan como 'dropped')
+    LOG_QUEUE_MAX_ENTRIES = int(os.environ.get("LOG_QUEUE_MAX_ENTRIES", 10000))
+
+    # Caché de consultas de logs (/api/logs/...)
+    LOG_QUERY_CACHE_TTL = int(os.environ.get("LOG_QUERY_CACHE_TTL", 60))
+    LOG_QUERY_CACHE_MAX_ENTRIES = int(os.environ.get("LOG_QUERY_CACHE_MAX_ENTRIES", 100))
+
+    # Métricas: endpoint /metrics (Prometheus) y header Server-Timing por request
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "true").lower() == "true"
+
+    # Compresión (gzip/zstd según Accept-Encoding) de respuestas de al menos N bytes; 0 la desactiva
+    RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get("RESPONSE_COMPRESSION_MIN_BYTES", 32 * 1024))
+
+    # Perfilado bajo demanda de una request (header X-Profile: <token>).
+    # Sin token queda desactivado y no se registra ningún hook.
+    PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+    PROFILING_OUTPUT_DIR = os.environ.get(
+        "PROFILING_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "request-profiles"))
+    PROFILING_SAMPLE_INTERVAL = float(os.environ.get("PROFILING_SAMPLE_INTERVAL", 0.005))
+    PROFILING_MAX_PROFILES = int(os.environ.get("PROFILING_MAX_PROFILES", 50))
+
     # Cargar la configuración de entornos GCP desde un archivo fijo
     #    Esto garantiza que la variable siempre exista.
     config_filename = "environments.json"
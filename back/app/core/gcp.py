@@ -1,24 +1,138 @@
-from google.cloud import storage, logging
+import threading
 from app.config import Config
 
-# Se inicializan una sola vez y se importan donde se necesiten
-# El logging utiliza la variable GCP_PROJECT_ID en .env
-logging_client = logging.Client()
+# Los módulos de google.cloud y los clientes se cargan al primer uso (no al
+# importar la app): un arranque en frío no paga el descubrimiento de
+# credenciales ni la construcción de clientes de proyectos que no se usan.
+
+GCP_SCOPES = ("https://www.googleapis.com/auth/cloud-platform",)
+
+# Clientes creados al primer uso y reutilizados entre requests.
+# El lock evita crearlos dos veces entre threads.
+_lock = threading.RLock()
+_logging_client = None
+_storage_clients = {}
+_bigquery_clients = {}
+_dataform_client = None
+_http_session = None
+_credentials = None
+
+
+def _configured_project_ids():
+    return {env['project_id'] for env in Config.GCP_ENVIRONMENTS}
+
+
+def _build_logging_client():
+    from google.cloud import logging
+    # El logging utiliza la variable GCP_PROJECT_ID en .env
+    return logging.Client(credentials=_get_credentials())
+
+
+def _build_storage_client(project_id: str):
+    from google.cloud import storage
+    return storage.Client(project=project_id, credentials=_get_credentials())
+
+
+def get_logging_client():
+    """
+    Devuelve el cliente de Cloud Logging, creándolo al primer uso.
+    """
+    global _logging_client
+    if _logging_client is not None:
+        return _logging_client
+
+    with _lock:
+        if _logging_client is None:
+            _logging_client = _build_logging_client()
+        return _logging_client
 
-# Se crea un cliente por cada project_id único en nuestra configuración
-# Asegura que las operaciones se ejecuten en el contexto del proyecto correcto
-storage_client = {
-    env['project_id']: storage.Client(project=env['project_id'])
-    for env in Config.GCP_ENVIRONMENTS
-}
 
 def get_storage_client(project_id: str):
     """
     Función de ayuda para obtener el cliente de Storage correcto para un project_id.
+    Se crea un cliente por proyecto al primer uso, para que las operaciones se
+    ejecuten en el contexto del proyecto correcto.
     Lanza un error si se solicita un cliente para un proyecto no configurado
     """
-    
-    client = storage_client.get(project_id)
-    if not client:
+    client = _storage_clients.get(project_id)
+    if client is not None:
+        return client
+
+    if project_id not in _configured_project_ids():
         raise ValueError(f"No se encontró un cliente de Storage configurado para el project_id: '{project_id}'")
-    return client
\ No newline at end of file
+
+    with _lock:
+        client = _storage_clients.get(project_id)
+        if client is None:
+            client = _build_storage_client(project_id)
+            _storage_clients[project_id] = client
+        return client
+
+
+def _get_credentials():
+    """
+    Credenciales por defecto (ADC), resueltas una sola vez por proceso.
+    """
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            import google.auth
+            _credentials, _ = google.auth.default(scopes=GCP_SCOPES)
+        return _credentials
+
+
+def _get_http_session():
+    """
+    Sesión HTTP autenticada compartida, con un pool de conexiones dimensionado
+    para que los threads de gunicorn reutilicen conexiones keep-alive.
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            from google.auth.transport.requests import AuthorizedSession
+            from requests.adapters import HTTPAdapter
+            session = AuthorizedSession(_get_credentials())
+            adapter = HTTPAdapter(
+                pool_connections=Config.GCP_HTTP_POOL_SIZE,
+                pool_maxsize=Config.GCP_HTTP_POOL_SIZE,
+            )
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def get_bigquery_client(project_id: str):
+    """
+    Devuelve el cliente de BigQuery del proyecto, creándolo al primer uso.
+    Todos comparten las credenciales y el pool de conexiones HTTP.
+    """
+    client = _bigquery_clients.get(project_id)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _bigquery_clients.get(project_id)
+        if client is None:
+            from google.cloud import bigquery
+            client = bigquery.Client(
+                project=project_id,
+                credentials=_get_credentials(),
+                _http=_get_http_session(),
+            )
+            _bigquery_clients[project_id] = client
+        return client
+
+
+def get_dataform_client():
+    """
+    Devuelve el cliente de Dataform (gRPC), creándolo al primer uso.
+    """
+    global _dataform_client
+    if _dataform_client is not None:
+        return _dataform_client
+
+    with _lock:
+        if _dataform_client is None:
+            from google.cloud import dataform_v1beta1
+            _dataform_client = dataform_v1beta1.DataformClient(credentials=_get_credentials())
+        return _dataform_client
@@ -1,25 +1,53 @@
+from datetime import datetime
 from flask import Blueprint, request, jsonify
 from app.services import logging_service
 from app.utils.exceptions import InvalidUsage
 
 logging_bp = Blueprint("logging", __name__)
 
+
+def _page_args(default_limit: int) -> dict:
+    """
+    Lee los parámetros de paginación y rango de tiempo comunes a los endpoints:
+    limit, page_token, start y end (ISO 8601; sin zona horaria se asume UTC).
+    """
+    limit = request.args.get('limit', default=default_limit, type=int)
+    if limit is None or limit < 1:
+        raise InvalidUsage("El parámetro 'limit' debe ser un entero positivo.", status_code=400)
+
+    args = {"limit": limit, "page_token": request.args.get('page_token') or None}
+    for name in ("start", "end"):
+        value = request.args.get(name)
+        if not value:
+            continue
+        try:
+            args[name] = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise InvalidUsage(
+                f"El parámetro '{name}' debe ser una fecha ISO 8601.", status_code=400)
+    return args
+
+
 @logging_bp.route("/user/<string:user>", methods=["GET"])
 def get_logs_user(user: str):
+    page_args = _page_args(default_limit=5)
     try:
-        limit = request.args.get('limit', default=5, type=int)
-        logs = logging_service.get_logs_by_user(user, limit=limit)
-        return jsonify({"logs": logs})
+        page = logging_service.get_logs_by_user(user, **page_args)
+        return jsonify(page)
+    except ValueError as e:
+        raise InvalidUsage(str(e), status_code=400)
     except Exception as e:
         logging_service.log_error(f"Fallo al consultar logs para el usuario {user}", error=str(e))
         raise InvalidUsage(f"Error al consultar logs por usuario: {e}", status_code=500)
 
 @logging_bp.route("/product/<string:product>", methods=["GET"])
 def get_logs_product(product: str):
+    page_args = _page_args(default_limit=15)
     try:
-        limit = request.args.get('limit', default=15, type=int)
-        logs = logging_service.get_logs_by_product(product, limit=limit)
-        return jsonify({"logs": logs})
+        page = logging_service.get_logs_by_product(product, **page_args)
+        return jsonify(page)
+    except ValueError as e:
+        raise InvalidUsage(str(e), status_code=400)
     except Exception as e:
         logging_service.log_error(f"Fallo al consultar logs para el producto {product}", error=str(e))
-        raise InvalidUsage(f"Error al consultar logs por producto: {e}", status_code=500)
\ No newline at end of file
+        raise InvalidUsage(f"Error al consultar logs por producto: {e}", status_code=500)
@@ -0,0 +1,13 @@
+from flask import Blueprint, Response
+from app.utils.metrics import registry
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics_api():
+    """
+    Métricas del proceso en formato Prometheus: latencia por etapa y por
+    endpoint, filas/bytes procesados, cachés y cola de logs.
+    """
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,37 @@
+import os
+import re
+from flask import Blueprint, Response, request, send_file
+from app.config import Config
+from app.utils.exceptions import InvalidUsage
+from app.utils.profiling import is_authorized
+
+profiling_bp = Blueprint("profiling", __name__)
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+@profiling_bp.route("/profiles/<string:profile_id>", methods=["GET"])
+def get_profile_api(profile_id):
+    """
+    Descarga un perfil guardado. Requiere el mismo token que lo activa
+    (header X-Profile).
+    - format=folded (default): stacks en formato "folded" (flamegraph.pl, speedscope).
+    - format=json: resumen con duración, muestras y asignaciones de memoria.
+    """
+    if not is_authorized(request, Config.PROFILING_TOKEN):
+        raise InvalidUsage("No autorizado.", status_code=403)
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        raise InvalidUsage("Id de perfil inválido.", status_code=400)
+
+    output_format = request.args.get('format', 'folded').lower()
+    if output_format not in ('folded', 'json'):
+        raise InvalidUsage("Formato no soportado. Use 'folded' o 'json'.", status_code=400)
+
+    path = os.path.join(Config.PROFILING_OUTPUT_DIR, f"{profile_id}.{output_format}")
+    if not os.path.exists(path):
+        raise InvalidUsage(f"No existe el perfil '{profile_id}'.", status_code=404)
+
+    if output_format == 'json':
+        return send_file(path, mimetype="application/json")
+    with open(path) as f:
+        return Response(f.read(), mimetype="text/plain")
@@ -1,19 +1,32 @@
 from datetime import datetime
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, url_for
 from app.config import Config
-from app.services import storage_service, logging_service, bq_service
+from app.services import storage_service, logging_service, bq_service, dataset_service, job_service
 from app.utils.gcp_utils import get_project_id_for_bucket
-from app.utils.file_processing import read_file_to_dataframe
-from app.utils.file_converter import dataframe_to_parquet_tempfile
+from app.utils.analysis_cache import read_file_cached, file_size_bytes
 from app.utils.bq_mapping import resolve_bq_coordinates
 from app.utils.exceptions import InvalidUsage
-import pandas as pd
-import numpy as np
-import os
+from app.utils.json_provider import dataframe_json_response
 import json
 
 storage_bp = Blueprint("storage", __name__)
 
+# Tamaño de página por defecto y máximo (modo JSON) para preview-latest paginado
+PREVIEW_DEFAULT_LIMIT = 1000
+PREVIEW_MAX_JSON_LIMIT = 50000
+
+# save-data: payload en Arrow IPC (stream) y compresiones aceptadas en Content-Encoding
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+SUPPORTED_CONTENT_ENCODINGS = ("gzip", "zstd")
+
+# preview-latest en binario: formatos de descarga y compresiones del IPC de Arrow
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+BINARY_PREVIEW_FORMATS = ("arrow", "parquet")
+ARROW_IPC_COMPRESSIONS = ("lz4", "zstd")
+
+# Parámetros de búsqueda de preview-latest (proyección, filtros, texto libre y orden)
+PREVIEW_QUERY_PARAMS = ("columns", "filter", "search", "sort")
+
 
 @storage_bp.route("/environments", methods=["GET"])
 def get_environments():
@@ -156,6 +169,87 @@ def initiate_resumable_upload_api():
         raise InvalidUsage(f"Error al iniciar la subida: {e}", status_code=500)
 
 
+def _excel_options(source):
+    """
+    Lee 'sheet_name' y 'header_row' (fila del encabezado tal como se ve en
+    Excel, 1 = primera) de un form o body JSON. Solo aplican a archivos Excel.
+    """
+    sheet_name = source.get('sheet_name') or None
+    header_row = source.get('header_row')
+    if header_row in (None, ""):
+        return {"sheet_name": sheet_name, "header_row": None}
+    try:
+        # En un body JSON puede llegar como número: true/false y decimales no valen
+        if isinstance(header_row, bool) or (isinstance(header_row, float) and not header_row.is_integer()):
+            raise ValueError(header_row)
+        header_row = int(header_row)
+    except (TypeError, ValueError):
+        raise InvalidUsage("El parámetro 'header_row' debe ser un entero.", status_code=400)
+    if header_row < 1:
+        raise InvalidUsage("El parámetro 'header_row' debe ser un entero positivo.", status_code=400)
+    return {"sheet_name": sheet_name, "header_row": header_row}
+
+
+@storage_bp.route("/process-upload", methods=["POST"])
+def process_resumable_upload_api():
+    """
+    Procesa en el servidor un archivo que ya llegó a GCS por subida reanudable:
+    lo lee por bloques, lo limpia y deja un "data.parquet" en la misma partición.
+    Body: env_id, bucket_name, gcs_path (el 'finalPath' de /initiate-resumable-upload),
+    y opcionalmente user, delete_source y, para Excel, sheet_name y header_row.
+    """
+    data = request.get_json()
+    if not data or not all(k in data for k in ['env_id', 'bucket_name', 'gcs_path']):
+        raise InvalidUsage("Faltan parámetros requeridos.", status_code=400)
+
+    env_id = data['env_id']
+    bucket_name = data['bucket_name']
+    gcs_path = data['gcs_path']
+    delete_source = bool(data.get('delete_source', False))
+    user = data.get('user', 'anonymous')
+    excel_options = _excel_options(data)
+
+    try:
+        project_id = get_project_id_for_bucket(env_id, bucket_name)
+
+        result = storage_service.process_landed_upload(
+            project_id, bucket_name, gcs_path, delete_source=delete_source, **excel_options)
+
+        path_parts = gcs_path.split('/')
+        product = path_parts[0] if len(path_parts) > 0 else None
+        dataset = path_parts[1] if len(path_parts) > 1 else None
+
+        logging_service.log_info(
+            "Archivo reanudable procesado a Parquet",
+            user=user,
+            env_id=env_id,
+            bucket=bucket_name,
+            file_name=path_parts[-1],
+            product=product,
+            dataset=dataset,
+            gcs_path=result['path'],
+            rows_processed=result['rows']
+        )
+
+        return jsonify({
+            "message": f"Ingesta exitosa. Archivo en {bucket_name}",
+            "path": result['path'],
+            "rows": result['rows']
+        })
+
+    except InvalidUsage as e:
+        raise e
+    except FileNotFoundError as e:
+        raise InvalidUsage(str(e), status_code=404)
+    except ValueError as e:
+        # Ej: hoja de Excel inexistente o el archivo ya es el Parquet final
+        raise InvalidUsage(str(e), status_code=400)
+    except Exception as e:
+        logging_service.log_error(
+            "Fallo al procesar subida reanudable", user=user, error=str(e))
+        raise InvalidUsage(f"Error al procesar el archivo: {e}", status_code=500)
+
+
 @storage_bp.route("/analyze", methods=["POST"])
 def analyze_file_api():
     """
@@ -168,6 +262,7 @@ def analyze_file_api():
     file = request.files["file"]
     step = request.form.get("step", "1")
     is_new_table = request.form.get('is_new_table') == 'true'
+    excel_options = _excel_options(request.form)
 
     if not file.filename:
         raise InvalidUsage(
@@ -187,33 +282,35 @@ def analyze_file_api():
         return c.strip()
 
     try:
-        # 1. Leemos el archivo
-        df = read_file_to_dataframe(file)
-
-        # ==============================================================================
-        # LIMPIEZA GLOBAL DE COLUMNAS (Para Paso 2 y Paso 3)
-        # ==============================================================================
-        if step != "1":
-            df.columns = [clean_col_name(col) for col in df.columns]
-        # ==============================================================================
-
         # --- PASO 1: Metadata ---
+        # Solo necesita el tamaño en bytes: no se parsea el archivo
         if step == "1":
-            file.seek(0)
             # Dividimos por (1024 * 1024) para obtener MB
-            tamano = round(len(file.read()) / (1024 * 1024), 2)
+            tamano = round(file_size_bytes(file) / (1024 * 1024), 2)
 
             metadata = {
                 "nombre_archivo": file.filename,
                 "tamano": f"{tamano} MB",
                 "tipo_archivo": file.filename.split('.')[-1].upper(),
-                "fecha_de_carga": pd.Timestamp.now().strftime('%d-%m-%Y'),
-                "hora_de_carga": pd.Timestamp.now().strftime('%H:%M horas'),
+                "fecha_de_carga": datetime.now().strftime('%d-%m-%Y'),
+                "hora_de_carga": datetime.now().strftime('%H:%M horas'),
             }
             return jsonify(metadata)
 
+        # Import diferido: el paso 1 y las rutas de navegación no necesitan pandas
+        import pandas as pd
+
+        # 1. Leemos el archivo (parseado una sola vez y reutilizado entre pasos)
+        df = read_file_cached(file, **excel_options)
+
+        # ==============================================================================
+        # LIMPIEZA GLOBAL DE COLUMNAS (Para Paso 2 y Paso 3)
+        # ==============================================================================
+        df.columns = [clean_col_name(col) for col in df.columns]
+        # ==============================================================================
+
         # --- PASO 2: Estructura y Previsualización ---
-        elif step == "2":
+        if step == "2":
             def map_dtype(dtype):
                 if pd.api.types.is_numeric_dtype(dtype):
                     return "Number"
@@ -223,16 +320,14 @@ def analyze_file_api():
 
             columnas = [{"nombre": col, "tipo": map_dtype(
                 dtype)} for col, dtype in df.dtypes.items()]
-            vista_previa = df.head(5).replace(
-                {np.nan: None}).to_dict(orient='records')
 
             structure_data = {
                 "numero_columnas": len(df.columns),
                 "numero_registros": len(df),
                 "columnas_encontradas": columnas,
-                "vista_previa": vista_previa
             }
-            return jsonify(structure_data)
+            # Las filas se serializan directo desde las columnas (NaN -> null)
+            return dataframe_json_response(structure_data, "vista_previa", df.head(5))
 
         # --- PASO 3: Validación contra BigQuery ---
         elif step == "3":
@@ -392,6 +487,7 @@ def upload_file_api():
 
     metadata_json = request.form.get('metadata')
     schema_json = request.form.get('schema')
+    excel_options = _excel_options(request.form)
 
     if not all([env_id, bucket_name, destination]):
         raise InvalidUsage(
@@ -472,21 +568,20 @@ def upload_file_api():
         # 2. PROCESO DE SUBIDA A GCS
         # =====================================================================
 
-        df = read_file_to_dataframe(file)
-
-        # Convertimos explícitamente todo el DataFrame a String para asegurar
-        # compatibilidad con la tabla que acabamos de crear (que es puro STRING)
-        df = df.astype(str)
-
-        # BigQuery acepta "nan" como string, pero suele ser mejor limpiarlo si quieres NULLs reales:
-        df = df.replace('nan', "")
-
-        parquet_path = dataframe_to_parquet_tempfile(df, file.filename)
-
-        final_blob_path = storage_service.upload_file(
-            project_id, bucket_name, parquet_path, destination)
+        if file.filename.lower().endswith('.parquet'):
+            # Camino rápido: lotes Arrow directo a Parquet limpio, sin DataFrame
+            file.stream.seek(0)
+            final_blob_path = storage_service.upload_parquet_stream(
+                project_id, bucket_name, file.stream, destination)
+        else:
+            # Si el archivo ya pasó por /analyze, se reutiliza el parseo cacheado
+            df = read_file_cached(file, **excel_options)
 
-        os.remove(parquet_path)
+            # Limpieza + Parquet + subida en streaming (sin archivo temporal local).
+            # La limpieza ya deja todo como texto (la tabla es puro STRING) y los
+            # nulos como "", vengan como NaN (parseo) o None (artefacto cacheado).
+            final_blob_path = storage_service.upload_dataframe(
+                project_id, bucket_name, df, destination)
 
         # Logging final
         path_parts = destination.split('/') if destination else []
@@ -518,16 +613,35 @@ def upload_file_api():
 def get_latest_dataset_preview_api(product_path):
     """
     Obtiene el contenido COMPLETO del dataset más reciente para cargarlo en la grilla.
+    Si se envían 'offset' y/o 'limit' devuelve solo esa página (ver _preview_page_response).
+    Con format=arrow|parquet devuelve el dataset en binario (ver _preview_binary_response).
+    Con 'columns', 'filter', 'search' o 'sort' devuelve solo las filas que
+    cumplen, también paginadas (ver _preview_page_response).
     """
+    import pandas as pd
+
     env_id = request.args.get('env_id')
     bucket_name = request.args.get('bucket_name')
 
     if not all([env_id, bucket_name]):
         raise InvalidUsage("Faltan parámetros.", status_code=400)
 
+    query = any(param in request.args for param in PREVIEW_QUERY_PARAMS)
+    paginated = query or 'limit' in request.args or 'offset' in request.args
+    output_format = request.args.get('format', 'json').lower()
+
     try:
         project_id = get_project_id_for_bucket(env_id, bucket_name)
 
+        if output_format in BINARY_PREVIEW_FORMATS:
+            if paginated:
+                raise InvalidUsage(
+                    f"El formato '{output_format}' no admite paginación ni búsqueda.", status_code=400)
+            return _preview_binary_response(project_id, bucket_name, product_path, output_format)
+
+        if paginated:
+            return _preview_page_response(project_id, bucket_name, product_path, query=query)
+
         # Usamos la función modificada que trae TODO
         filename, df = storage_service.read_latest_dataset_content(
             project_id, bucket_name, product_path)
@@ -551,19 +665,15 @@ def get_latest_dataset_preview_api(product_path):
         columnas = [{"nombre": col, "tipo": map_dtype(
             dtype)} for col, dtype in df.dtypes.items()]
 
-        # 2. Convertir DataFrame completo a Diccionario
-        # IMPORTANTE: Reemplazar NaN por None es crucial para JSON válido
-        # orient='records' crea una lista de objetos: [{col1: val1}, {col1: val2}...]
-        full_data = df.replace({np.nan: None}).to_dict(orient='records')
-
-        return jsonify({
+        # 2. Serializar TODAS las filas como [{col1: val1}, {col1: val2}...]
+        # directo desde las columnas, sin armar un dict por fila (NaN -> null)
+        return dataframe_json_response({
             "exists": True,
             "fileName": filename,
             # Lista simple de nombres
             "columns": [c['nombre'] for c in columnas],
-            "rows": full_data,                          # TODAS las filas
             "total_registros": len(df)
-        })
+        }, "rows", df)
 
     except InvalidUsage as e:
         raise e
@@ -574,115 +684,322 @@ def get_latest_dataset_preview_api(product_path):
             f"Error al leer dataset completo: {e}", status_code=500)
 
 
+def _preview_page_response(project_id, bucket_name, product_path, query=False):
+    """
+    Modo paginado de preview-latest.
+
+    Query params:
+        offset (int): Primera fila (default 0).
+        limit (int): Filas de la página (default PREVIEW_DEFAULT_LIMIT).
+        format (str): 'json' (default) devuelve un objeto con la página;
+                      'ndjson' transmite una línea de metadata y luego una fila por línea.
+
+    Búsqueda (query=True): el filtrado se hace en el servidor sobre el scan del
+    Parquet y offset/limit/total_registros se refieren a las filas que cumplen;
+    'row_ids' trae la posición de cada fila en el archivo (row_id del delta).
+        columns (str): Columnas a devolver, separadas por coma.
+        filter (str, repetible): 'columna:operador:valor' con operador eq, ne,
+                      lt, le, gt, ge, in (valores separados por '|') o contains.
+        search (str): Texto a buscar en cualquier columna de texto.
+        sort (str): Columnas de orden separadas por coma ('-col' = descendente).
+    """
+    offset = request.args.get('offset', default=0, type=int)
+    limit = request.args.get('limit', default=PREVIEW_DEFAULT_LIMIT, type=int)
+    output_format = request.args.get('format', 'json').lower()
+
+    if offset is None or offset < 0 or limit is None or limit <= 0:
+        raise InvalidUsage(
+            "'offset' y 'limit' deben ser enteros (offset >= 0, limit > 0).", status_code=400)
+    if output_format not in ('json', 'ndjson'):
+        raise InvalidUsage(
+            f"Formato '{output_format}' no soportado. Use 'json' o 'ndjson'.", status_code=400)
+    if output_format == 'json':
+        # En JSON la página completa vive en memoria: la acotamos
+        limit = min(limit, PREVIEW_MAX_JSON_LIMIT)
+
+    if query:
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+        try:
+            filename, page = storage_service.query_latest_dataset(
+                project_id, bucket_name, product_path, columns=columns or None,
+                filters=request.args.getlist('filter'), search=request.args.get('search'),
+                sort=request.args.get('sort'), offset=offset, limit=limit)
+        except ValueError as e:
+            raise InvalidUsage(str(e), status_code=400)
+    else:
+        filename, page = storage_service.read_latest_dataset_page(
+            project_id, bucket_name, product_path, offset=offset, limit=limit)
+
+    if filename is None:
+        return jsonify({"exists": False, "message": "No se encontraron archivos."})
+
+    if page is None:
+        return jsonify({"exists": True, "fileName": filename, "error": "Formato ilegible."})
+
+    total = page["total_rows"]
+    next_offset = offset + limit if offset + limit < total else None
+    header = {
+        "exists": True,
+        "fileName": filename,
+        "columns": page["columns"],
+        "total_registros": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": next_offset,
+    }
+    if "dataset_rows" in page:
+        header["dataset_rows"] = page["dataset_rows"]
+        header["row_ids"] = page["row_ids"]
+
+    if output_format == 'ndjson':
+        def generate():
+            yield json.dumps(header, ensure_ascii=False) + "\n"
+            for records in page["chunks"]:
+                for record in records:
+                    yield json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    rows = [record for records in page["chunks"] for record in records]
+    return jsonify({**header, "rows": rows})
+
+
+def _preview_binary_response(project_id, bucket_name, product_path, output_format):
+    """
+    Modo binario de preview-latest: el Parquet más reciente se transmite desde
+    GCS sin pasar por pandas ni por JSON.
+
+    Query params:
+        format (str): 'parquet' devuelve los bytes del objeto tal cual;
+                      'arrow' devuelve un stream Arrow IPC (un batch por bloque de filas).
+        batch_rows (int): Filas por record batch en modo 'arrow' (default: row group).
+        compression (str): 'lz4' o 'zstd' para comprimir los buffers del IPC.
+    """
+    batch_rows = request.args.get('batch_rows', type=int)
+    compression = request.args.get('compression')
+
+    if output_format == 'arrow':
+        if batch_rows is not None and batch_rows <= 0:
+            raise InvalidUsage("'batch_rows' debe ser un entero mayor a 0.", status_code=400)
+        if compression is not None and compression not in ARROW_IPC_COMPRESSIONS:
+            raise InvalidUsage(
+                f"Compresión '{compression}' no soportada. Use 'lz4' o 'zstd'.", status_code=400)
+
+    filename, stream = storage_service.stream_latest_dataset(
+        project_id, bucket_name, product_path, output_format=output_format,
+        batch_rows=batch_rows, compression=compression)
+
+    if filename is None:
+        return jsonify({"exists": False, "message": "No se encontraron archivos."}), 404
+
+    if stream is None:
+        raise InvalidUsage(
+            f"El archivo más reciente ({filename}) no es Parquet: use format=json.", status_code=415)
+
+    headers = {"X-File-Name": filename}
+    if output_format == 'parquet':
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        if stream["size"] is not None:
+            headers["Content-Length"] = str(stream["size"])
+        mimetype = PARQUET_MIMETYPE
+    else:
+        headers["X-Total-Rows"] = str(stream["total_rows"])
+        mimetype = ARROW_STREAM_MIMETYPE
+
+    return Response(stream_with_context(stream["chunks"]), mimetype=mimetype, headers=headers)
+
+
 # --- NUEVA RUTA (WRITE) ---
-@storage_bp.route("/products/save-data", methods=["POST"])
-def save_full_data_api():
+def _request_body_stream():
     """
-    Recibe data del front -> Sube a GCS -> Actualiza BQ.
+    Cuerpo de la request como stream de Arrow, descomprimido al vuelo si trae
+    Content-Encoding gzip o zstd (nunca se arma el cuerpo completo comprimido).
     """
-    data = request.get_json()
+    import pyarrow as pa
 
-    # ... (Validaciones existentes) ...
-    if not data:
-        raise InvalidUsage("No payload.", status_code=400)
+    encoding = (request.headers.get("Content-Encoding") or "identity").strip().lower()
+    source = pa.PythonFile(request.stream, mode="r")
+    if encoding == "identity":
+        return source
+    if encoding not in SUPPORTED_CONTENT_ENCODINGS:
+        raise InvalidUsage(
+            f"Content-Encoding '{encoding}' no soportado (use gzip o zstd).", status_code=415)
+    return pa.CompressedInputStream(source, encoding)
 
-    # Extraemos datos
-    env_id = data['env_id']
-    bucket_name = data['bucket_name']
-    product_name = data['product_name']
-    table_name = data['table_name']
-    rows = data['rows']
-    user = data.get('user', 'anonymous')
 
+def _columnar_json_to_table(columns, arrays):
+    """
+    Tabla Arrow desde el formato JSON columnar (una lista de valores por columna).
+    """
+    import pyarrow as pa
+
+    if len(columns) != len(arrays):
+        raise InvalidUsage("'columns' y 'arrays' deben tener el mismo largo.", status_code=400)
+
+    converted = []
+    for values in arrays:
+        try:
+            converted.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Tipos mezclados en una misma columna: todo a texto
+            converted.append(pa.array([None if v is None else str(v) for v in values], type=pa.string()))
     try:
-        # 1. Subir a GCS (Ya lo tienes listo)
-        project_id = get_project_id_for_bucket(env_id, bucket_name)
-        product_path = f"{product_name}/{table_name}"
+        return pa.Table.from_arrays(converted, names=[str(c) for c in columns])
+    except pa.ArrowInvalid as e:
+        raise InvalidUsage(f"Payload columnar inválido: {e}", status_code=400)
 
-        # gcs_path es relativo (ej: producto/tabla/year=.../data.parquet)
-        gcs_relative_path = storage_service.save_full_dataset(
-            project_id, bucket_name, product_path, rows
-        )
 
-        # Construimos la URI completa gs://...
-        gcs_uri = f"gs://{bucket_name}/{gcs_relative_path}"
+def _read_save_payload():
+    """
+    Lee el cuerpo de save-data en cualquiera de sus formatos.
 
-        # ------------------------------------------------------------------
-        # 2. SINCRONIZACIÓN CON BIGQUERY
-        # ------------------------------------------------------------------
+    Returns:
+        tuple: (campos, tabla Arrow o None). Con "rows" (formato original) la
+        tabla es None y las filas quedan en los campos.
+    """
+    import pyarrow as pa
+
+    if request.mimetype == ARROW_STREAM_MIMETYPE:
+        data = request.args.to_dict()
+        data['sync'] = data.get('sync', '').lower() == 'true'
+        try:
+            with _request_body_stream() as body:
+                table = pa.ipc.open_stream(body).read_all()
+        except (pa.ArrowInvalid, OSError) as e:
+            raise InvalidUsage(f"Cuerpo Arrow IPC inválido: {e}", status_code=400)
+        return data, table
+
+    if request.headers.get("Content-Encoding"):
+        try:
+            with _request_body_stream() as body:
+                data = json.loads(body.read())
+        except (OSError, ValueError) as e:
+            raise InvalidUsage(f"Cuerpo comprimido inválido: {e}", status_code=400)
+    else:
+        data = request.get_json()
+
+    if isinstance(data, dict) and 'arrays' in data and 'rows' not in data:
+        table = _columnar_json_to_table(data.get('columns') or [], data.pop('arrays'))
+        return data, table
+    return data, None
 
-        # A. Resolver coordenadas BQ (Project, Dataset, Table)
-        # Usamos tu utilidad existente o lógica ad-hoc
-        bq_project, bq_dataset, bq_table_clean, _ = resolve_bq_coordinates(
-            project_id, product_name, table_name, bucket_name
-        )
 
-        # Ajuste de nombres según tu lógica de entornos (SAP vs PD)
-        target_dataset = ""
-        target_table = f"tbl_{bq_table_clean}"  # Convención usual
-
-        if env_id == 'sap':
-            # Lógica para extraer módulo del bucket (ej: raw-dev-ddo-mm-bucket -> mm)
-            parts = bucket_name.split('-')
-            module = parts[3] if len(parts) > 3 else 'manual'
-            target_dataset = f"sdp_{module}_ddo"
-        elif env_id == 'pd':
-            # bq_dataset suele ser el nombre del producto
-            target_dataset = f"sdp_{bq_dataset}"
-        else:
-            # Fallback genérico
-            target_dataset = f"sdp_{product_name.replace('-', '_')}"
-
-        print(f"Destino BQ: {bq_project}.{target_dataset}.{target_table}")
-
-        # B. Asegurar que la tabla existe (Create if not exists)
-        # Extraemos nombres de columnas de la primera fila para crear esquema básico
-        if rows and len(rows) > 0:
-            sample_row = rows[0]
-            # Formato simple para create_table_entity: [{'nombre': 'col1'}, ...]
-            simple_schema = [{'nombre': k} for k in sample_row.keys()]
-
-            bq_service.create_table_entity(
-                bq_project,
-                target_dataset,
-                target_table,
-                simple_schema,
-                metadata={
-                    'tableDescription': f"Tabla Raw actualizada manualmente por {user}"}
-            )
-
-        # C. Cargar datos desde GCS a BQ
-        filas_cargadas = bq_service.load_parquet_from_gcs_to_bq(
-            bq_project,
-            target_dataset,
-            target_table,
-            gcs_uri
-        )
+@storage_bp.route("/products/save-data", methods=["POST"])
+def save_full_data_api():
+    """
+    Recibe data del front -> Sube a GCS -> Actualiza BQ.
 
-        # ------------------------------------------------------------------
+    El trabajo se encola y se responde 202 con el id del job; su estado se
+    consulta en /jobs/<job_id>. Con "sync": true en el payload se hace en la
+    misma request (puede exceder el timeout con tablas grandes).
+
+    Con "mode": "delta" el front envía solo los cambios en lugar de 'rows':
+        - "inserted": filas nuevas.
+        - "updated": [{"row_id": n, "values": {columna: valor}}] (solo lo editado).
+        - "deleted": [row_id, ...].
+        - "key_columns" (opcional): columnas que identifican cada fila en BQ;
+          con ellas se hace MERGE en lugar de recargar la tabla completa. Si
+          no son únicas (antes o después del delta) se responde 400.
+        - "base_file" (opcional): archivo que se editó (fileName de preview-latest).
+    El row_id es la posición de la fila en el archivo: offset + índice del
+    preview, o el valor de 'row_ids' si la página viene de una búsqueda (query=True).
+
+    Formatos del guardado completo (además de "rows" como lista de objetos):
+        - JSON columnar: "columns": [nombres] + "arrays": [[valores de cada columna]].
+        - Arrow IPC (Content-Type application/vnd.apache.arrow.stream): la tabla
+          en el cuerpo y el resto de los campos en la query string.
+    Cualquiera de ellos puede venir comprimido (Content-Encoding gzip o zstd).
+    """
+    data, table = _read_save_payload()
 
-        # Logging
-        logging_service.log_info(
-            "Dataset guardado y sincronizado con BQ",
-            user=user,
-            product=product_name,
-            dataset=table_name,
-            bucket=bucket_name,
-            gcs_path=gcs_relative_path,
-            rows_processed=len(rows),
-            bq_table=f"{target_dataset}.{target_table}",
-            bq_rows_loaded=filas_cargadas
-        )
+    # ... (Validaciones existentes) ...
+    if not data:
+        raise InvalidUsage("No payload.", status_code=400)
 
-        return jsonify({
+    user = data.get('user', 'anonymous')
+    is_delta = data.get('mode') == 'delta'
+    run_sync = bool(data.get('sync'))
+
+    required = ['env_id', 'bucket_name', 'product_name', 'table_name']
+    if not is_delta and table is None:
+        required.append('rows')
+    if not all(k in data for k in required):
+        raise InvalidUsage(
+            f"Los campos {required} son requeridos.", status_code=400)
+
+    payload = {k: data[k] for k in required}
+    payload['user'] = user
+    if table is not None and not is_delta:
+        # Los jobs guardan su payload como JSON: la tabla va a disco
+        if run_sync:
+            payload['table'] = table
+        else:
+            payload['table_path'] = dataset_service.spool_table(table)
+    if is_delta:
+        payload.update({
+            'mode': 'delta',
+            'inserted': data.get('inserted') or [],
+            'updated': data.get('updated') or [],
+            'deleted': data.get('deleted') or [],
+            'key_columns': data.get('key_columns') or None,
+            'base_file': data.get('base_file'),
+            'base_generation': data.get('base_generation'),
+        })
+
+    try:
+        if not run_sync:
+            if is_delta:
+                # Un delta inválido se rechaza aquí (400/409) y no como job fallido.
+                # Se fija la versión validada: si el job se reintenta tras aplicar
+                # el delta, detecta el cambio en vez de aplicarlo dos veces
+                project_id = get_project_id_for_bucket(data['env_id'], data['bucket_name'])
+                payload['base_generation'] = storage_service.validate_dataset_delta(
+                    project_id, data['bucket_name'], f"{data['product_name']}/{data['table_name']}",
+                    **{k: payload[k] for k in (
+                        'inserted', 'updated', 'deleted', 'key_columns', 'base_file', 'base_generation')})
+
+            job_id = job_service.submit_job(dataset_service.SAVE_DATASET_JOB, payload)
+            return jsonify({
+                "success": True,
+                "message": "Guardado encolado.",
+                "job_id": job_id,
+                "status_url": url_for("storage.get_job_status_api", job_id=job_id),
+            }), 202
+
+        result = dataset_service.run_save_dataset_job(payload, lambda *args, **kwargs: None)
+        response = {
             "success": True,
             "message": "Datos guardados en GCS y actualizados en BigQuery.",
-            "path": gcs_relative_path,
-            "bq_loaded": filas_cargadas
-        })
+            "path": result["path"],
+            "bq_loaded": result["bq_loaded"]
+        }
+        if is_delta:
+            response.update({k: result[k] for k in (
+                "bq_mode", "output_rows", "inserted", "updated", "deleted",
+                "row_groups", "row_groups_rewritten")})
+        return jsonify(response)
 
+    except InvalidUsage as e:
+        raise e
+    except storage_service.DatasetConflictError as e:
+        raise InvalidUsage(str(e), status_code=409)
+    except FileNotFoundError as e:
+        raise InvalidUsage(str(e), status_code=404)
+    except (ValueError, KeyError, TypeError) as e:
+        if not is_delta:
+            raise InvalidUsage(f"Error guardando/sincronizando: {e}", status_code=500)
+        raise InvalidUsage(f"Delta inválido: {e}", status_code=400)
     except Exception as e:
-        # ... Log de error ...
-        logging_service.log_error("Error saving data", user=user, error=str(e))
         raise InvalidUsage(
             f"Error guardando/sincronizando: {e}", status_code=500)
+
+
+@storage_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status_api(job_id):
+    """
+    Estado de un job en segundo plano: etapa, progreso, filas y resultado.
+    """
+    job = job_service.get_job(job_id)
+    if job is None:
+        raise InvalidUsage(f"Job '{job_id}' no encontrado.", status_code=404)
+    return jsonify(job)
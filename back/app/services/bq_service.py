@@ -1,26 +1,65 @@
-from google.cloud import bigquery
-import pandas as pd
+import logging
+from google.api_core.exceptions import NotFound
+from app.config import Config
+from app.core.gcp import get_bigquery_client
+from app.utils import metrics
+from app.utils.cache import SharedTTLCache
+
+# Esquemas por "project.dataset.table". Las tablas raw cambian muy poco.
+_schema_cache = SharedTTLCache(
+    maxsize=512, ttl=Config.BQ_SCHEMA_CACHE_TTL, name="bq_schema")
+# Tablas que NO existen (caché negativa, TTL corto)
+_missing_tables = SharedTTLCache(
+    maxsize=512, ttl=Config.BQ_SCHEMA_NEGATIVE_TTL, name="bq_schema_missing")
+
+logger = logging.getLogger(__name__)
+
+
+def invalidate_table_schema(project_id, dataset_id, table_id):
+    """
+    Olvida el esquema cacheado (y la marca de "no existe") de una tabla.
+    """
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+    _schema_cache.invalidate(lambda key: key == table_ref)
+    _missing_tables.invalidate(lambda key: key == table_ref)
+
+
+@metrics.timed("bq_schema_fetch")
+def _fetch_table_schema(project_id, table_ref):
+    client = get_bigquery_client(project_id)
+    table = client.get_table(table_ref)
+
+    schema_map = {}
+    for field in table.schema:
+        schema_map[field.name] = {
+            'type': field.field_type,
+            'mode': field.mode  # 'NULLABLE', 'REQUIRED'
+        }
+    return schema_map
 
 
 def get_table_schema(project_id, dataset_id, table_id):
     """
     Obtiene el esquema de una tabla de BigQuery.
+    El resultado se cachea por tabla; las tablas inexistentes también, con TTL corto.
     """
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+
+    if _missing_tables.get(table_ref):
+        return None
+
     try:
-        client = bigquery.Client(project=project_id)
-        table_ref = f"{project_id}.{dataset_id}.{table_id}"
-        table = client.get_table(table_ref)
-
-        schema_map = {}
-        for field in table.schema:
-            schema_map[field.name] = {
-                'type': field.field_type,
-                'mode': field.mode  # 'NULLABLE', 'REQUIRED'
-            }
-        return schema_map
+        schema_map = _schema_cache.get_or_load(
+            table_ref, lambda: _fetch_table_schema(project_id, table_ref))
+        # Copia: quien llama no debe poder modificar la entrada cacheada
+        return dict(schema_map)
+    except NotFound as e:
+        logger.info("Tabla BQ inexistente (%s): %s", table_ref, e)
+        _missing_tables.set(table_ref, True)
+        return None
     except Exception as e:
-        # Si la tabla no existe o no hay permisos
-        print(f"BQ Error ({project_id}.{dataset_id}.{table_id}): {e}")
+        # Si no hay permisos u otro error: no se cachea
+        logger.warning("BQ Error (%s): %s", table_ref, e)
         return None
 
 
@@ -61,8 +100,11 @@ def create_table_entity(project_id, dataset_id, table_id, schema_data, metadata=
     """
     Crea una nueva tabla en BigQuery con esquema STRING + Columnas de Partición.
     """
+    # Import diferido: google.cloud.bigquery es pesado y solo lo usan algunas rutas
+    from google.cloud import bigquery
+
     try:
-        client = bigquery.Client(project=project_id)
+        client = get_bigquery_client(project_id)
         table_ref = f"{project_id}.{dataset_id}.{table_id}"
 
         schema = []
@@ -103,13 +145,15 @@ def create_table_entity(project_id, dataset_id, table_id, schema_data, metadata=
         # table.clustering_fields = ["year", "month"]
         # (El particionamiento real por columna string es limitado, suele usarse clustering)
 
-        table = client.create_table(table, exists_ok=True)
+        with metrics.span("bq_create_table"):
+            table = client.create_table(table, exists_ok=True)
+        invalidate_table_schema(project_id, dataset_id, table_id)
 
-        print(f"Tabla creada con columnas de partición: {table_ref}")
+        logger.info("Tabla creada con columnas de partición: %s", table_ref)
         return table
 
     except Exception as e:
-        print(f"Error creando tabla BQ: {e}")
+        logger.error("Error creando tabla BQ: %s", e)
         raise e
 
 
@@ -123,7 +167,9 @@ def load_parquet_from_gcs_to_bq(project_id, dataset_id, table_id, gcs_uri):
     Dado que tu flujo es 'Actualizar Dataset', asumiremos que quieres que la 
     tabla en BQ refleje exactamente lo que el usuario ve y guardó.
     """
-    client = bigquery.Client(project=project_id)
+    from google.cloud import bigquery
+
+    client = get_bigquery_client(project_id)
     table_ref = f"{project_id}.{dataset_id}.{table_id}"
 
     job_config = bigquery.LoadJobConfig(
@@ -143,19 +189,114 @@ def load_parquet_from_gcs_to_bq(project_id, dataset_id, table_id, gcs_uri):
     )
 
     try:
-        load_job = client.load_table_from_uri(
-            gcs_uri, table_ref, job_config=job_config
-        )
+        with metrics.span("bq_load") as span:
+            load_job = client.load_table_from_uri(
+                gcs_uri, table_ref, job_config=job_config
+            )
 
-        print(
-            f"Iniciando job de carga {load_job.job_id} desde {gcs_uri} a {table_ref}...")
+            logger.info("Iniciando job de carga %s desde %s a %s...", load_job.job_id, gcs_uri, table_ref)
 
-        load_job.result()  # Espera a que termine
+            load_job.result()  # Espera a que termine
+            span.add(rows=load_job.output_rows)
 
-        print(f"Job terminado. Filas cargadas: {load_job.output_rows}")
+        # Con autodetect la carga puede alterar el esquema de la tabla
+        invalidate_table_schema(project_id, dataset_id, table_id)
+
+        logger.info("Job terminado. Filas cargadas: %s", load_job.output_rows)
         return load_job.output_rows
 
     except Exception as e:
-        print(f"Error cargando datos a BQ: {e}")
+        logger.error("Error cargando datos a BQ: %s", e)
         # Es vital propagar el error para que el endpoint sepa que falló la carga
         raise e
+
+
+def merge_rows_into_table(project_id, dataset_id, table_id, columns, key_columns, changes,
+                          partition_values=None):
+    """
+    Aplica un delta sobre la tabla con MERGE, en lugar de recargarla completa.
+
+    Las filas de 'changes' se cargan a una tabla temporal (expira en 1 hora y
+    se borra al terminar) y luego se hace un único MERGE contra la tabla final.
+    Cada fila trae:
+        - "_op": "insert", "update" o "delete".
+        - "_key_<col>": valor ORIGINAL de cada columna clave (la edición
+          puede haber cambiado la clave).
+        - Las columnas de 'columns' con los valores nuevos.
+
+    Las columnas de 'key_columns' deben identificar cada fila de forma única
+    (storage_service lo valida sobre el Parquet antes de llegar aquí).
+
+    'partition_values' ({columna: valor}, ej: year/month/day de hoy) se fija
+    también en las filas que el delta no toca, como en el Parquet reescrito;
+    las que ya lo tienen no se modifican.
+
+    Returns:
+        int: Filas afectadas por el MERGE.
+    """
+    import uuid
+    from datetime import datetime, timedelta, timezone
+    from google.cloud import bigquery
+
+    client = get_bigquery_client(project_id)
+    table_ref = f"{project_id}.{dataset_id}.{table_id}"
+    staging_ref = f"{project_id}.{dataset_id}._delta_{table_id}_{uuid.uuid4().hex[:12]}"
+
+    key_fields = [f"_key_{k}" for k in key_columns]
+    schema = [bigquery.SchemaField(name, "STRING") for name in ["_op", *key_fields, *columns]]
+
+    staging = bigquery.Table(staging_ref, schema=schema)
+    staging.expires = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    on = " AND ".join(
+        f"T.`{k}` IS NOT DISTINCT FROM S.`_key_{k}`" for k in key_columns)
+    assignments = ", ".join(f"`{c}` = S.`{c}`" for c in columns)
+    column_list = ", ".join(f"`{c}`" for c in columns)
+    values = ", ".join(f"S.`{c}`" for c in columns)
+
+    partition_values = partition_values or {}
+    restamp = ""
+    if partition_values:
+        differs = " OR ".join(f"T.`{c}` IS DISTINCT FROM @{c}" for c in partition_values)
+        stamps = ", ".join(f"`{c}` = @{c}" for c in partition_values)
+        restamp = f"WHEN NOT MATCHED BY SOURCE AND ({differs}) THEN UPDATE SET {stamps}"
+    query_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter(c, "STRING", v) for c, v in partition_values.items()])
+
+    # Las inserciones nunca "calzan": se agregan aunque la clave ya exista,
+    # igual que en el Parquet
+    query = f"""
+        MERGE `{table_ref}` T
+        USING `{staging_ref}` S
+        ON S._op != 'insert' AND {on}
+        WHEN MATCHED AND S._op = 'delete' THEN DELETE
+        WHEN MATCHED AND S._op = 'update' THEN UPDATE SET {assignments}
+        WHEN NOT MATCHED AND S._op = 'insert' THEN INSERT ({column_list}) VALUES ({values})
+        {restamp}
+    """
+
+    try:
+        with metrics.span("bq_load", rows=len(changes)):
+            client.create_table(staging)
+            if changes:
+                load_job = client.load_table_from_json(
+                    changes, staging_ref,
+                    job_config=bigquery.LoadJobConfig(
+                        schema=schema, write_disposition=bigquery.WriteDisposition.WRITE_APPEND),
+                )
+                load_job.result()
+
+        with metrics.span("bq_merge") as span:
+            merge_job = client.query(query, job_config=query_config)
+            merge_job.result()
+            span.add(rows=merge_job.num_dml_affected_rows)
+
+        logger.info("MERGE sobre %s: %s filas afectadas", table_ref, merge_job.num_dml_affected_rows)
+        return merge_job.num_dml_affected_rows
+
+    except Exception as e:
+        logger.error("Error aplicando delta en BQ: %s", e)
+        raise e
+
+    finally:
+        client.delete_table(staging_ref, not_found_ok=True)
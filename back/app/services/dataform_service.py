@@ -1,4 +1,5 @@
-from google.cloud import dataform_v1beta1
+from app.core.gcp import get_dataform_client
+from app.utils import metrics
 
 
 def run_dataform_workspace_all(project_id, location, repository_name, workspace="development"):
@@ -9,7 +10,10 @@ def run_dataform_workspace_all(project_id, location, repository_name, workspace=
         repository_name (str): Nombre del repo (ej: 'df-notificaciones').
         workspace (str): Nombre del workspace (ej: 'development').
     """
-    client = dataform_v1beta1.DataformClient()
+    # Import diferido: el cliente gRPC de Dataform solo se usa en esta ruta
+    from google.cloud import dataform_v1beta1
+
+    client = get_dataform_client()
 
     # Rutas base
     repo_path = f"projects/{project_id}/locations/{location}/repositories/{repository_name}"
@@ -21,10 +25,11 @@ def run_dataform_workspace_all(project_id, location, repository_name, workspace=
         compilation_result_req = dataform_v1beta1.CompilationResult()
         compilation_result_req.workspace = workspace_path
 
-        compilation_result = client.create_compilation_result(
-            parent=repo_path,
-            compilation_result=compilation_result_req
-        )
+        with metrics.span("dataform_compile"):
+            compilation_result = client.create_compilation_result(
+                parent=repo_path,
+                compilation_result=compilation_result_req
+            )
         print(f"Compilación exitosa: {compilation_result.name}")
 
         # 2. INVOCACIÓN (EJECUCIÓN)
@@ -37,10 +42,11 @@ def run_dataform_workspace_all(project_id, location, repository_name, workspace=
         #    fully_refresh_incremental_tables_enabled=False
         # )
 
-        invocation = client.create_workflow_invocation(
-            parent=repo_path,
-            workflow_invocation=invocation_req
-        )
+        with metrics.span("dataform_invoke"):
+            invocation = client.create_workflow_invocation(
+                parent=repo_path,
+                workflow_invocation=invocation_req
+            )
 
         return {
             "invocation_id": invocation.name.split('/')[-1],
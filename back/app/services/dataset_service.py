@@ -0,0 +1,315 @@
+import logging
+import os
+import uuid
+from app.config import Config
+from app.services import storage_service, bq_service, logging_service
+from app.services.job_service import register_handler
+from app.utils.gcp_utils import get_project_id_for_bucket
+from app.utils.bq_mapping import resolve_bq_coordinates
+
+# Tipo de job para la escritura en GCS + carga en BigQuery
+SAVE_DATASET_JOB = "save_dataset"
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_raw_table(env_id, project_id, bucket_name, product_name, table_name):
+    """
+    Resuelve el destino en BigQuery (proyecto, dataset, tabla) de una tabla raw
+    según la convención de cada entorno (SAP vs PD).
+    """
+    bq_project, bq_dataset, bq_table_clean, _ = resolve_bq_coordinates(
+        project_id, product_name, table_name, bucket_name
+    )
+
+    target_table = f"tbl_{bq_table_clean}"  # Convención usual
+
+    if env_id == 'sap':
+        # Lógica para extraer módulo del bucket (ej: raw-dev-ddo-mm-bucket -> mm)
+        parts = bucket_name.split('-')
+        module = parts[3] if len(parts) > 3 else 'manual'
+        target_dataset = f"sdp_{module}_ddo"
+    elif env_id == 'pd':
+        # bq_dataset suele ser el nombre del producto
+        target_dataset = f"sdp_{bq_dataset}"
+    else:
+        # Fallback genérico
+        target_dataset = f"sdp_{product_name.replace('-', '_')}"
+
+    return bq_project, target_dataset, target_table
+
+
+def spool_table(table) -> str:
+    """
+    Guarda una tabla Arrow (payload columnar) en disco para un job encolado:
+    el store de jobs solo guarda JSON. Devuelve la ruta del archivo IPC.
+    """
+    import pyarrow as pa
+
+    os.makedirs(Config.JOBS_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(Config.JOBS_SPOOL_DIR, f"{uuid.uuid4().hex}.arrow")
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return path
+
+
+def _load_spooled_table(path):
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def save_and_sync_dataset(env_id, bucket_name, product_name, table_name, rows, user, progress=None,
+                          table=None):
+    """
+    Sube las filas a GCS (Parquet particionado) y sincroniza la tabla en BigQuery.
+
+    Las filas llegan como lista de dicts ('rows') o como tabla Arrow ('table',
+    del payload columnar / Arrow IPC), que se escribe sin pasar por pandas.
+
+    'progress(stage, fraction, output_rows=None)' es opcional y permite a un job
+    reportar en qué etapa va.
+
+    Returns:
+        dict: {"path", "bq_table", "bq_loaded", "output_rows"}
+    """
+    report = progress or (lambda *args, **kwargs: None)
+
+    # 1. Subir a GCS
+    report("gcs_write", 0.1)
+    project_id = get_project_id_for_bucket(env_id, bucket_name)
+    product_path = f"{product_name}/{table_name}"
+
+    # gcs_path es relativo (ej: producto/tabla/year=.../data.parquet)
+    if table is not None:
+        from app.utils.file_converter import clean_column_name
+
+        gcs_relative_path = storage_service.save_dataset_table(
+            project_id, bucket_name, product_path, table
+        )
+        columns = [clean_column_name(c) for c in table.column_names]
+        output_rows = table.num_rows
+    else:
+        gcs_relative_path = storage_service.save_full_dataset(
+            project_id, bucket_name, product_path, rows
+        )
+        columns = list(rows[0].keys()) if rows else []
+        output_rows = len(rows)
+    gcs_uri = f"gs://{bucket_name}/{gcs_relative_path}"
+
+    # 2. Sincronización con BigQuery
+    report("bq_table", 0.5, output_rows=output_rows)
+    bq_project, target_dataset, target_table = resolve_raw_table(
+        env_id, project_id, bucket_name, product_name, table_name
+    )
+    logger.info("Destino BQ: %s.%s.%s", bq_project, target_dataset, target_table)
+
+    # A. Asegurar que la tabla existe (Create if not exists)
+    # Extraemos nombres de columnas (primera fila o esquema) para crear esquema básico
+    if columns and output_rows:
+        # Formato simple para create_table_entity: [{'nombre': 'col1'}, ...]
+        simple_schema = [{'nombre': k} for k in columns]
+
+        bq_service.create_table_entity(
+            bq_project,
+            target_dataset,
+            target_table,
+            simple_schema,
+            metadata={
+                'tableDescription': f"Tabla Raw actualizada manualmente por {user}"}
+        )
+
+    # B. Cargar datos desde GCS a BQ
+    report("bq_load", 0.6)
+    filas_cargadas = bq_service.load_parquet_from_gcs_to_bq(
+        bq_project,
+        target_dataset,
+        target_table,
+        gcs_uri
+    )
+
+    return {
+        "path": gcs_relative_path,
+        "bq_table": f"{target_dataset}.{target_table}",
+        "bq_loaded": filas_cargadas,
+        "output_rows": output_rows,
+    }
+
+
+def _delta_bq_changes(delta, key_columns):
+    """
+    Filas para la tabla temporal del MERGE (ver bq_service.merge_rows_into_table).
+    La clave de updates/deletes se toma de la fila ORIGINAL del Parquet.
+    """
+    def keys_of(row):
+        return {f"_key_{k}": row.get(k) for k in key_columns}
+
+    changes = []
+    for row_id, row in delta["after"].items():
+        changes.append({"_op": "update", **keys_of(delta["before"][row_id]), **row})
+    for row_id, row in delta["before"].items():
+        if row_id not in delta["after"]:
+            changes.append({"_op": "delete", **keys_of(row)})
+    for row in delta["inserted"]:
+        changes.append({"_op": "insert", **keys_of(row), **row})
+    return changes
+
+
+def apply_delta_and_sync(env_id, bucket_name, product_name, table_name, inserted, updated, deleted,
+                         user, key_columns=None, base_file=None, base_generation=None, progress=None,
+                         checkpoint=None):
+    """
+    Guardado por delta: aplica solo las filas nuevas/editadas/borradas sobre el
+    Parquet más reciente y sincroniza BigQuery.
+
+    - Con 'key_columns': MERGE de las filas cambiadas (no se recarga la tabla);
+      las demás solo reciben year/month/day de hoy, igual que en el archivo.
+    - Sin 'key_columns': no hay cómo ubicar las filas en BQ, se recarga el
+      archivo nuevo completo (WRITE_TRUNCATE), como el guardado normal.
+
+    El delta no se puede aplicar dos veces (el job fija base_generation): al
+    terminar la escritura en GCS se reporta un checkpoint con lo necesario
+    para BigQuery, y otro al terminar BigQuery. Si el job se recupera con un
+    'checkpoint', se retoma en el paso pendiente sin volver a escribir en
+    GCS, siempre que el archivo escrito siga siendo el más reciente.
+
+    Returns:
+        dict: {"path", "bq_table", "bq_loaded", "output_rows", "row_groups_rewritten", ...}
+    """
+    report = progress or (lambda *args, **kwargs: None)
+
+    project_id = get_project_id_for_bucket(env_id, bucket_name)
+    product_path = f"{product_name}/{table_name}"
+
+    if checkpoint is None:
+        report("gcs_write", 0.1)
+        delta = storage_service.apply_dataset_delta(
+            project_id, bucket_name, product_path,
+            inserted=inserted, updated=updated, deleted=deleted,
+            base_file=base_file, base_generation=base_generation, key_columns=key_columns,
+        )
+        checkpoint = {
+            "path": delta["path"],
+            "generation": delta["generation"],
+            "columns": delta["columns"],
+            "partition_values": delta["partition_values"],
+            "changes": _delta_bq_changes(delta, key_columns) if key_columns else None,
+            "output_rows": delta["rows"],
+            "inserted": len(delta["inserted"]),
+            "updated": len(delta["after"]),
+            "deleted": len(delta["before"]) - len(delta["after"]),
+            "row_groups": delta["row_groups"],
+            "row_groups_rewritten": delta["row_groups_rewritten"],
+        }
+        report("gcs_written", 0.5, output_rows=delta["rows"], checkpoint=checkpoint)
+    elif "bq_loaded" not in checkpoint:
+        try:
+            storage_service.check_latest_dataset(
+                project_id, bucket_name, product_path, checkpoint["generation"])
+        except storage_service.DatasetConflictError as e:
+            raise storage_service.DatasetConflictError(
+                f"El delta se escribió en GCS ({checkpoint['path']}) pero BigQuery no se "
+                f"sincronizó, y el dataset cambió después: {e}")
+        logger.info("Delta ya escrito en %s: se retoma en BigQuery.", checkpoint["path"])
+
+    bq_project, target_dataset, target_table = resolve_raw_table(
+        env_id, project_id, bucket_name, product_name, table_name
+    )
+    # El MERGE no es repetible (las filas nuevas se insertarían dos veces):
+    # si ya terminó en un intento anterior no se vuelve a correr
+    if "bq_loaded" not in checkpoint:
+        report("bq_table", 0.5, output_rows=checkpoint["output_rows"])
+        logger.info("Destino BQ: %s.%s.%s", bq_project, target_dataset, target_table)
+
+        bq_service.create_table_entity(
+            bq_project,
+            target_dataset,
+            target_table,
+            [{'nombre': c} for c in checkpoint["columns"]],
+            metadata={
+                'tableDescription': f"Tabla Raw actualizada manualmente por {user}"}
+        )
+
+        report("bq_load", 0.6)
+        if key_columns:
+            bq_loaded = bq_service.merge_rows_into_table(
+                bq_project, target_dataset, target_table,
+                checkpoint["columns"], key_columns, checkpoint["changes"],
+                partition_values=checkpoint["partition_values"],
+            )
+            bq_mode = "merge"
+        else:
+            bq_loaded = bq_service.load_parquet_from_gcs_to_bq(
+                bq_project, target_dataset, target_table, f"gs://{bucket_name}/{checkpoint['path']}"
+            )
+            bq_mode = "load"
+        checkpoint = {**checkpoint, "bq_loaded": bq_loaded, "bq_mode": bq_mode}
+        report("bq_done", 0.9, checkpoint=checkpoint)
+
+    return {
+        "bq_table": f"{target_dataset}.{target_table}",
+        **{k: checkpoint[k] for k in (
+            "path", "bq_loaded", "bq_mode", "output_rows", "inserted", "updated", "deleted",
+            "row_groups", "row_groups_rewritten")},
+    }
+
+
+@register_handler(SAVE_DATASET_JOB)
+def run_save_dataset_job(payload, report):
+    """
+    Ejecuta save-data (completo o por delta) en segundo plano (ver job_service)
+    y deja el log de auditoría.
+    """
+    user = payload.get('user', 'anonymous')
+    try:
+        if payload.get('mode') == 'delta':
+            result = apply_delta_and_sync(
+                payload['env_id'],
+                payload['bucket_name'],
+                payload['product_name'],
+                payload['table_name'],
+                payload.get('inserted'),
+                payload.get('updated'),
+                payload.get('deleted'),
+                user,
+                key_columns=payload.get('key_columns'),
+                base_file=payload.get('base_file'),
+                base_generation=payload.get('base_generation'),
+                progress=report,
+                checkpoint=payload.get('checkpoint'),
+            )
+        else:
+            table = payload.get('table')
+            if table is None and payload.get('table_path'):
+                table = _load_spooled_table(payload['table_path'])
+            result = save_and_sync_dataset(
+                payload['env_id'],
+                payload['bucket_name'],
+                payload['product_name'],
+                payload['table_name'],
+                payload.get('rows'),
+                user,
+                progress=report,
+                table=table,
+            )
+    except Exception as e:
+        logging_service.log_error("Error saving data", user=user, error=str(e))
+        raise
+    finally:
+        # El job terminó (bien o mal): ya no se va a reintentar
+        if payload.get('table_path') and os.path.exists(payload['table_path']):
+            os.remove(payload['table_path'])
+
+    logging_service.log_info(
+        "Dataset guardado y sincronizado con BQ",
+        user=user,
+        product=payload['product_name'],
+        dataset=payload['table_name'],
+        bucket=payload['bucket_name'],
+        gcs_path=result["path"],
+        rows_processed=result["output_rows"],
+        bq_table=result["bq_table"],
+        bq_rows_loaded=result["bq_loaded"]
+    )
+    return result
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from app.config import Config
+
+# El store es local al contenedor salvo que JOBS_DB_PATH apunte a un volumen
+# montado (ver Config)
+
+logger = logging.getLogger(__name__)
+
+# Estados posibles de un job
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+_handlers = {}
+_executor = None
+_executor_lock = threading.Lock()
+# Identidad del proceso dueño de los jobs (un pid se repite entre contenedores)
+_owner = None
+
+
+def register_handler(job_type):
+    """
+    Decorador: registra la función que ejecuta los jobs de un tipo.
+    La función recibe (payload, report) y devuelve un dict con el resultado;
+    report(stage, progress, output_rows=None, checkpoint=None) actualiza el
+    estado visible. 'checkpoint' (dict JSON) guarda un punto de reanudación:
+    si el job se recupera de un worker caído, el handler lo recibe en
+    payload["checkpoint"] y puede saltarse los pasos ya hechos.
+    """
+    def decorator(func):
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def _connect():
+    conn = sqlite3.connect(Config.JOBS_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _init_store():
+    directory = os.path.dirname(Config.JOBS_DB_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with closing(_connect()) as conn, conn:
+        # WAL: los workers de gunicorn pueden leer mientras otro escribe
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                output_rows INTEGER,
+                result TEXT,
+                error TEXT,
+                payload TEXT,
+                checkpoint TEXT,
+                owner TEXT,
+                lease_expires_at REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # Stores creados antes del lease (tenían owner_pid) o del checkpoint
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+        for name, column_type in (("owner", "TEXT"), ("lease_expires_at", "REAL"), ("checkpoint", "TEXT")):
+            if name not in existing:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {column_type}")
+
+
+def _update(job_id, **fields):
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{name} = ?" for name in fields)
+    with closing(_connect()) as conn, conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _lease_deadline():
+    return time.time() + Config.JOB_LEASE_SECONDS
+
+
+def _renew_leases():
+    """
+    Extiende el lease de los jobs pendientes de este proceso: mientras el
+    proceso viva, nadie más los considera huérfanos.
+    """
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE owner = ? AND status IN (?, ?)",
+            (_lease_deadline(), _owner, QUEUED, RUNNING))
+
+
+def _recover_orphaned_jobs(executor):
+    """
+    Re-encola los jobs que quedaron a medias porque su worker murió
+    (reciclaje de gunicorn, OOM, redeploy): los que siguen pendientes con el
+    lease vencido. El handler se vuelve a ejecutar desde el principio, con el
+    último checkpoint que haya reportado (ver register_handler): cada tipo de
+    job decide qué pasos puede repetir y cuáles retoma.
+    """
+    now = time.time()
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT id, owner, lease_expires_at FROM jobs "
+            "WHERE status IN (?, ?) AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+            (QUEUED, RUNNING, now)).fetchall()
+
+    for row in rows:
+        # Solo un worker gana el "claim": el UPDATE compara el lease que se leyó
+        with closing(_connect()) as conn, conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET owner = ?, lease_expires_at = ?, status = ?, stage = ?, updated_at = ? "
+                "WHERE id = ? AND owner IS ? AND lease_expires_at IS ?",
+                (_owner, _lease_deadline(), QUEUED, "recovered", time.time(),
+                 row["id"], row["owner"], row["lease_expires_at"]),
+            ).rowcount
+        if claimed:
+            logger.warning("Job %s recuperado de un worker caído (%s).", row["id"], row["owner"])
+            executor.submit(_run_job, row["id"])
+
+
+def _heartbeat(executor):
+    """
+    Thread de fondo: renueva los leases propios y recupera los jobs de
+    procesos que dejaron de renovarlos.
+    """
+    while True:
+        time.sleep(Config.JOB_HEARTBEAT_INTERVAL)
+        try:
+            _renew_leases()
+            _recover_orphaned_jobs(executor)
+        except Exception:
+            logger.exception("Fallo el heartbeat de jobs.")
+
+
+def _purge_old_jobs():
+    cutoff = time.time() - Config.JOB_RETENTION_SECONDS
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (SUCCEEDED, FAILED, cutoff))
+
+
+def _get_executor():
+    """
+    Crea (una vez por proceso) el pool de threads de jobs, recupera huérfanos
+    y arranca el heartbeat de los leases.
+    """
+    global _executor, _owner
+    if _executor is not None:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+            _init_store()
+            executor = ThreadPoolExecutor(
+                max_workers=Config.JOB_WORKERS, thread_name_prefix="jobs")
+            _recover_orphaned_jobs(executor)
+            threading.Thread(
+                target=_heartbeat, args=(executor,), name="jobs-heartbeat", daemon=True).start()
+            _executor = executor
+        return _executor
+
+
+def _run_job(job_id):
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT type, payload, checkpoint FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return
+
+    handler = _handlers.get(row["type"])
+    if handler is None:
+        _update(job_id, status=FAILED, error=f"Tipo de job desconocido: {row['type']}")
+        return
+
+    def report(stage, progress, output_rows=None, checkpoint=None):
+        fields = {"stage": stage, "progress": progress}
+        if output_rows is not None:
+            fields["output_rows"] = output_rows
+        if checkpoint is not None:
+            fields["checkpoint"] = json.dumps(checkpoint, default=str)
+        _update(job_id, **fields)
+
+    with closing(_connect()) as conn, conn:
+        started = conn.execute(
+            "UPDATE jobs SET status = ?, stage = ?, updated_at = ? WHERE id = ? AND owner = ?",
+            (RUNNING, "started", time.time(), job_id, _owner)).rowcount
+    if not started:
+        # Otro proceso lo reclamó (este dejó vencer el lease): que lo corra él
+        return
+
+    payload = json.loads(row["payload"])
+    if row["checkpoint"]:
+        payload["checkpoint"] = json.loads(row["checkpoint"])
+
+    try:
+        result = handler(payload, report) or {}
+        # El payload (las filas) ya no se necesita: se libera espacio
+        _update(
+            job_id,
+            status=SUCCEEDED,
+            stage="done",
+            progress=1.0,
+            result=json.dumps(result, default=str),
+            output_rows=result.get("output_rows"),
+            payload=None,
+            checkpoint=None,
+        )
+    except Exception as e:
+        logger.exception("Job %s (%s) falló.", job_id, row["type"])
+        _update(job_id, status=FAILED, error=str(e), payload=None, checkpoint=None)
+
+
+def submit_job(job_type, payload) -> str:
+    """
+    Guarda el job en el store local y lo encola en el pool de threads.
+
+    Returns:
+        str: El id del job, para consultar su estado con get_job().
+    """
+    if job_type not in _handlers:
+        raise ValueError(f"Tipo de job desconocido: {job_type}")
+
+    executor = _get_executor()
+    _purge_old_jobs()
+
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with closing(_connect()) as conn, conn:
+        conn.execute(
+            "INSERT INTO jobs (id, type, status, stage, progress, payload, owner, lease_expires_at, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, ?)",
+            (job_id, job_type, QUEUED, QUEUED, json.dumps(payload), _owner, _lease_deadline(), now, now),
+        )
+
+    executor.submit(_run_job, job_id)
+    return job_id
+
+
+def get_job(job_id):
+    """
+    Estado de un job (sin el payload), o None si no existe.
+    """
+    _get_executor()
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT id, type, status, stage, progress, output_rows, result, error, created_at, updated_at "
+            "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
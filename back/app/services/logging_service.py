@@ -1,19 +1,239 @@
-from google.cloud.logging import DESCENDING
-from app.core.gcp import logging_client
+import atexit
+import base64
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from app.core.gcp import get_logging_client
 from app.config import Config
-from cachetools import cached, TTLCache
+from app.utils import metrics
+from app.utils.cache import SharedTTLCache
 
-log_cache = TTLCache(maxsize=100, ttl=60)
+# Resultados de consultas a Cloud Logging, por (filtro, límite)
+log_cache = SharedTTLCache(
+    maxsize=Config.LOG_QUERY_CACHE_MAX_ENTRIES, ttl=Config.LOG_QUERY_CACHE_TTL, name="log_queries")
 
-logger = logging_client.logger(Config.GCP_LOGGER_NAME)
+# Orden descendente por timestamp (equivale a google.cloud.logging.DESCENDING)
+DESCENDING = "timestamp desc"
+
+# Mensajes propios del proceso (stderr/gunicorn), no la auditoría en Cloud Logging
+logger = logging.getLogger(__name__)
+
+_logger = None
+
+
+def get_logger():
+    """
+    Logger de Cloud Logging de la app, creado al primer uso.
+    """
+    global _logger
+    if _logger is None:
+        _logger = get_logging_client().logger(Config.GCP_LOGGER_NAME)
+    return _logger
+
+
+class BatchLogTransport:
+    """
+    Envío de logs en segundo plano: las entradas se encolan (cola acotada) y un
+    thread las manda a Cloud Logging en lotes, cuando se junta LOG_BATCH_SIZE
+    entradas o pasa LOG_FLUSH_INTERVAL segundos.
+
+    Si la cola está llena la entrada se descarta (y se cuenta en 'dropped'):
+    una request nunca espera a Cloud Logging.
+    """
+
+    # Marca en la cola que despierta al thread para que termine (ver close)
+    _STOP = object()
+
+    def __init__(self, logger_factory, batch_size, flush_interval, max_queue, on_sent=None):
+        self._logger_factory = logger_factory
+        self._on_sent = on_sent
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        # Los contadores se actualizan desde las requests y desde el thread
+        self._stats_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def _ensure_worker(self):
+        # Gunicorn hace fork después de importar: cada worker arranca su propio thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="log-transport", daemon=True)
+                self._thread.start()
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def enqueue(self, payload, severity):
+        self._ensure_worker()
+        # El timestamp se fija al encolar, no al enviar el lote
+        entry = (payload, severity, datetime.now(timezone.utc))
+        try:
+            self._queue.put_nowait(entry)
+            self._count(enqueued=1)
+        except queue.Full:
+            self._count(dropped=1)
+
+    def _drain(self):
+        entries = []
+        while len(entries) < self._batch_size:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not self._STOP:
+                entries.append(entry)
+        return entries
+
+    def _send(self, entries):
+        if not entries:
+            return
+        try:
+            batch = self._logger_factory().batch()
+            for payload, severity, timestamp in entries:
+                batch.log_struct(payload, severity=severity, timestamp=timestamp)
+            batch.commit()
+            self._count(sent=len(entries), batches=1)
+            if self._on_sent is not None:
+                for payload, _, _ in entries:
+                    self._on_sent(payload)
+        except Exception as e:
+            self._count(failed=len(entries))
+            logger.error("No se pudo enviar un lote de %d logs: %s", len(entries), e)
+
+    def _next_batch(self):
+        """
+        Bloquea hasta la primera entrada y luego junta más hasta completar el
+        lote o cumplir LOG_FLUSH_INTERVAL. Devuelve (entradas, hay_que_terminar).
+        """
+        try:
+            first = self._queue.get(timeout=self._flush_interval)
+        except queue.Empty:
+            return [], self._stopping.is_set()
+        if first is self._STOP:
+            return [], True
+
+        entries = [first]
+        deadline = time.monotonic() + self._flush_interval
+        while len(entries) < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is self._STOP:
+                return entries, True
+            entries.append(entry)
+        return entries, False
+
+    def _run(self):
+        while True:
+            entries, stop = self._next_batch()
+            self._send(entries)
+            if stop:
+                return
+
+    def close(self, timeout=10.0):
+        """
+        Detiene el thread (espera el lote en curso) y envía lo que quede en la
+        cola desde el thread actual. Se registra con atexit.
+        """
+        self._stopping.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            try:
+                self._queue.put_nowait(self._STOP)
+            except queue.Full:
+                pass  # El thread está ocupado enviando: verá _stopping al vaciar la cola
+            thread.join(timeout)
+            if thread.is_alive():
+                # Cloud Logging no responde: no se envía en paralelo con ese lote
+                logger.warning("El envío de logs no terminó al apagar; quedan %d en cola.",
+                               self._queue.qsize())
+                return
+        while True:
+            entries = self._drain()
+            if not entries:
+                return
+            self._send(entries)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "enqueued": self.enqueued,
+                "sent": self.sent,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+                "pending": self._queue.qsize(),
+            }
+
+
+def _invalidate_log_queries(payload):
+    """
+    Tras escribir una entrada, descarta las consultas cacheadas que podrían
+    incluirla: las sin filtro de campo y las de su usuario, producto o bucket.
+    """
+    fields = [f'jsonPayload.{name}="{payload[name]}"'
+              for name in ("user", "product", "bucket") if payload.get(name)]
+
+    def affected(key):
+        query = key[0]
+        return "jsonPayload." not in query or any(field in query for field in fields)
+
+    log_cache.invalidate(affected)
+
+
+_transport = None
+if Config.LOGGING_MODE == "async":
+    _transport = BatchLogTransport(
+        get_logger, Config.LOG_BATCH_SIZE, Config.LOG_FLUSH_INTERVAL, Config.LOG_QUEUE_MAX_ENTRIES,
+        on_sent=_invalidate_log_queries)
+    atexit.register(_transport.close)
+
+
+@metrics.registry.register_collector
+def _logging_samples():
+    if _transport is None:
+        return
+    stats = _transport.stats()
+    for state in ("sent", "dropped", "failed"):
+        yield (f"{metrics.PREFIX}_log_entries_total", "counter", "Logs por estado del envío a Cloud Logging.",
+               {"state": state}, stats[state])
+    yield f"{metrics.PREFIX}_log_queue_pending", "gauge", "Logs en cola sin enviar.", {}, stats["pending"]
 
 
 def log_structured(level: str, message: str, **kwargs):
     """
     Registra un log estructurado en Google Cloud Logging.
+    En modo async (por defecto) solo encola; el envío lo hace BatchLogTransport.
     """
     log_entry = {"message": message, **kwargs}
-    logger.log_struct(log_entry, severity=level.upper())
+    if _transport is not None:
+        _transport.enqueue(log_entry, level.upper())
+    else:
+        get_logger().log_struct(log_entry, severity=level.upper())
+        _invalidate_log_queries(log_entry)
 
 
 def log_info(message: str, **kwargs):
@@ -37,18 +257,98 @@ def log_error(message: str, **kwargs):
     log_structured("ERROR", message, **kwargs)
 
 
-def _query_logs(query: str, limit: int):
+def _format_timestamp(value: datetime) -> str:
+    """
+    RFC 3339 en UTC, como lo espera el filtro de Cloud Logging.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _encode_page_token(timestamp: datetime, skip: int) -> str:
+    raw = json.dumps({"ts": _format_timestamp(timestamp), "skip": skip})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_page_token(page_token: str):
+    """
+    Returns:
+        tuple: (timestamp, skip) de la última entrada entregada.
+
+    Raises:
+        ValueError: Si el token no es válido.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(page_token.encode()))
+        timestamp = datetime.strptime(data["ts"], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+        return timestamp, int(data["skip"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"page_token inválido: {e}")
+
+
+def _time_range_filter(start: datetime = None, end: datetime = None) -> str:
+    """
+    Condiciones de rango de tiempo para agregar al filtro (vacío si no hay).
+    """
+    conditions = []
+    if start is not None:
+        conditions.append(f'timestamp>="{_format_timestamp(start)}"')
+    if end is not None:
+        conditions.append(f'timestamp<="{_format_timestamp(end)}"')
+    return "".join(f" AND {condition}" for condition in conditions)
+
+
+def _query_logs(query: str, limit: int, page_token: str = None):
+    """
+    Devuelve una página de logs de la consulta, desde log_cache si está fresca.
+    Peticiones simultáneas con la misma consulta comparten una sola llamada a la API.
+
+    Returns:
+        dict: {"logs": [...], "next_page_token": str | None}
+
+    Raises:
+        ValueError: Si el page_token no es válido.
+    """
+    cursor = _decode_page_token(page_token) if page_token else None
+    return log_cache.get_or_load(
+        (query, limit, page_token), lambda: _fetch_logs(query, limit, cursor))
+
+
+def _fetch_logs(query: str, limit: int, cursor=None):
     """
     Función interna que realiza la consulta real a la API de Google Cloud Logging.
-    Los resultados de esta función son cacheados.
+
+    Paginación por cursor (keyset): el token guarda el timestamp de la última
+    entrada entregada y cuántas entradas con ese mismo timestamp ya se
+    entregaron. La página siguiente filtra por timestamp en el servidor, así
+    que su costo depende del tamaño de página y no del historial total.
     """
+    skip = 0
+    if cursor is not None:
+        cursor_ts, skip = cursor
+        # Python trunca a microsegundos: se incluye el microsegundo completo
+        # y se saltan las entradas de ese instante ya entregadas
+        query = f'{query} AND timestamp<"{_format_timestamp(cursor_ts + timedelta(microseconds=1))}"'
+
     print(query)
-    entries = logging_client.list_entries(
-        order_by=DESCENDING, filter_=query, page_size=limit)
+    # Una entrada extra para saber si hay página siguiente
+    entries = get_logging_client().list_entries(
+        order_by=DESCENDING, filter_=query, page_size=min(limit + skip + 1, 1000),
+        max_results=limit + skip + 1)
     logs = []
+    last_ts = None
+    same_ts = 0
+    has_more = False
 
     for entry in entries:
+        if skip:
+            skip -= 1
+            same_ts += 1
+            last_ts = entry.timestamp
+            continue
         if len(logs) >= limit:
+            has_more = True
             break
 
         payload = entry.payload if isinstance(entry.payload, dict) else {
@@ -66,35 +366,50 @@ def _query_logs(query: str, limit: int):
             "timestamp": entry.timestamp.isoformat(),
         })
 
-    return logs
+        # Cuántas entradas seguidas comparten el timestamp de la última
+        if entry.timestamp == last_ts:
+            same_ts += 1
+        else:
+            last_ts = entry.timestamp
+            same_ts = 1
+
+    next_page_token = _encode_page_token(last_ts, same_ts) if has_more else None
+    return {"logs": logs, "next_page_token": next_page_token}
+
+
+def _base_log_filter() -> str:
+    return f'logName="projects/{Config.GCP_PROJECT_ID}/logs/{Config.GCP_LOGGER_NAME}"'
 
 
-def get_all_logs_service(limit: int = 50):
+def get_all_logs_service(limit: int = 50, page_token: str = None, start: datetime = None,
+                         end: datetime = None):
     """
     Obtiene los logs más recientes sin ningún filtro.
     Utiliza la función cacheada _query_logs.
     """
-    query_filter = f'logName="projects/{Config.GCP_PROJECT_ID}/logs/{Config.GCP_LOGGER_NAME}"'
-    return _query_logs(query=query_filter, limit=limit)
+    query_filter = _base_log_filter() + _time_range_filter(start, end)
+    return _query_logs(query=query_filter, limit=limit, page_token=page_token)
 
 
-def get_logs_by_user(user: str, limit: int = 5):
+def get_logs_by_user(user: str, limit: int = 5, page_token: str = None, start: datetime = None,
+                     end: datetime = None):
     """
     Obtiene los logs más recientes para un usuario específico.
     Utiliza la función cacheada _query_logs.
     """
-    query_filter = f'logName="projects/{Config.GCP_PROJECT_ID}/logs/{Config.GCP_LOGGER_NAME}" AND jsonPayload.user="{user}"'
-    return _query_logs(query=query_filter, limit=limit)
+    query_filter = f'{_base_log_filter()} AND jsonPayload.user="{user}"' + _time_range_filter(start, end)
+    return _query_logs(query=query_filter, limit=limit, page_token=page_token)
 
 
-def get_logs_by_product(product: str, limit: int = 50):
+def get_logs_by_product(product: str, limit: int = 50, page_token: str = None, start: datetime = None,
+                        end: datetime = None):
     """
     Obtiene los logs más recientes para un producto específico.
     - Si el nombre empieza con "raw", busca por jsonPayload.bucket.
     - En caso contrario, busca por jsonPayload.product.
     """
     # 1. Base del log
-    base_log = f'logName="projects/{Config.GCP_PROJECT_ID}/logs/{Config.GCP_LOGGER_NAME}"'
+    base_log = _base_log_filter()
     
     # 2. Condicional: Si empieza con "raw" es un bucket, si no, es un producto
     if product.startswith("raw"):
@@ -104,7 +419,7 @@ def get_logs_by_product(product: str, limit: int = 50):
         
     print("field_filter",field_filter)
 
-    # 3. Construcción final de la query
-    query_filter = f'{base_log} AND {field_filter}'
+    # 3. Construcción final de la query (con el rango de tiempo, si viene)
+    query_filter = f'{base_log} AND {field_filter}' + _time_range_filter(start, end)
     
-    return _query_logs(query=query_filter, limit=limit)
+    return _query_logs(query=query_filter, limit=limit, page_token=page_token)
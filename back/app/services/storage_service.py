@@ -1,11 +1,53 @@
 from app.core.gcp import get_storage_client
 from datetime import datetime
-from app.utils.file_converter import dataframe_to_parquet_tempfile
-import pandas as pd
+from app.config import Config
+from app.utils import metrics
+from app.utils.cache import SharedTTLCache
+import functools
 import io
-import os
 
+# pandas/pyarrow y las utilidades de archivos se importan dentro de las funciones
+# que los usan: las rutas de navegación no pagan su carga en el arranque.
 
+# Tamaño de cada lectura por rangos al paginar un Parquet desde GCS
+PREVIEW_READ_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Niveles de partición estilo Hive que escribimos: year=YYYY/month=MM/day=DD
+PARTITION_LEVELS = ("year", "month", "day")
+
+# Caché de listados: clave (tipo, project_id, bucket, prefijo)
+_listing_cache = SharedTTLCache(
+    maxsize=Config.LISTING_CACHE_MAX_ENTRIES, ttl=Config.LISTING_CACHE_TTL, name="gcs_listing")
+
+
+def _cached_listing(kind, prefix_of):
+    """
+    Decorador: cachea el resultado de un listado de GCS por (project, bucket, prefijo).
+    'prefix_of' recibe los argumentos restantes y devuelve el prefijo listado.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(project_id, bucket_name, *args):
+            key = (kind, project_id, bucket_name, prefix_of(*args))
+
+            def load():
+                with metrics.span("gcs_list"):
+                    return func(project_id, bucket_name, *args)
+            return _listing_cache.get_or_load(key, load)
+        return wrapper
+    return decorator
+
+
+def _invalidate_listings(project_id, bucket_name, blob_name):
+    """
+    Invalida los listados afectados por una escritura propia en 'blob_name':
+    todos los prefijos del mismo bucket que contienen a ese objeto.
+    """
+    _listing_cache.invalidate(
+        lambda key: key[1] == project_id and key[2] == bucket_name and blob_name.startswith(key[3]))
+
+
+@_cached_listing("products", lambda: "")
 def list_data_products(project_id, bucket_name):
     """
     Lista las "carpetas" de nivel superior en un bucket de GCS.
@@ -23,6 +65,7 @@ def list_data_products(project_id, bucket_name):
     return products
 
 
+@_cached_listing("datasets", lambda product_name: f"{product_name}/")
 def list_datasets_in_product(project_id, bucket_name, product_name):
     """
     Lista los archivos (datasets) dentro de una "carpeta" (Producto de Datos) específica.
@@ -40,6 +83,7 @@ def list_datasets_in_product(project_id, bucket_name, product_name):
     return datasets
 
 
+@_cached_listing("subfolders", lambda path: f"{path}/" if path else "")
 def list_subfolders_in_path(project_id, bucket_name, path):
     """
     Lista las subcarpetas directas dentro de una 
@@ -77,6 +121,99 @@ def list_subfolders_in_path(project_id, bucket_name, path):
     return subfolders
 
 
+def _find_latest_blob_full_scan(bucket, prefix):
+    """
+    Lista TODOS los objetos bajo el prefijo y devuelve el de 'time_created' más alto.
+    """
+    blobs_iterator = bucket.list_blobs(prefix=prefix)
+
+    # Filtramos para ignorar "carpetas" vacías que terminan en '/'
+    all_files = [
+        blob for blob in blobs_iterator if not blob.name.endswith('/')]
+
+    if not all_files:
+        return None
+
+    # max() encontrará el blob que tenga el valor más alto en 'time_created'.
+    return max(all_files, key=lambda blob: blob.time_created)
+
+
+def _list_level(bucket, prefix):
+    """
+    Lista un solo nivel (delimiter='/'): devuelve (archivos, subcarpetas).
+    """
+    blobs_iterator = bucket.list_blobs(prefix=prefix, delimiter="/")
+    # Es necesario consumir el iterador para que la propiedad .prefixes se llene
+    files = [blob for blob in blobs_iterator if not blob.name.endswith('/')]
+    return files, list(blobs_iterator.prefixes)
+
+
+def _partition_sort_key(prefix, level):
+    """
+    'tabla/year=2025/' -> (1, 2025): valores numéricos primero, luego texto.
+    """
+    value = prefix.rstrip('/').rsplit('/', 1)[-1][len(level) + 1:]
+    return (1, int(value), "") if value.isdigit() else (0, 0, value)
+
+
+def _latest_in_partitions(bucket, prefixes, level_index):
+    """
+    Recorre las particiones de un nivel de la más nueva a la más antigua y se
+    detiene en la primera que tenga archivos.
+    """
+    level = PARTITION_LEVELS[level_index]
+    for prefix in sorted(prefixes, key=lambda p: _partition_sort_key(p, level), reverse=True):
+        if level_index == len(PARTITION_LEVELS) - 1:
+            # Último nivel (day=): lo que haya adentro, a cualquier profundidad
+            latest = _find_latest_blob_full_scan(bucket, prefix)
+        else:
+            files, children = _list_level(bucket, prefix)
+            next_level = PARTITION_LEVELS[level_index + 1]
+            child_partitions = [
+                c for c in children if c[len(prefix):].startswith(f"{next_level}=")]
+            latest = _latest_in_partitions(bucket, child_partitions, level_index + 1)
+            # Archivos sueltos en este nivel también compiten
+            if files:
+                latest = max(files + ([latest] if latest else []),
+                             key=lambda blob: blob.time_created)
+
+        if latest is not None:
+            return latest
+
+    return None
+
+
+def _find_latest_blob(bucket, product_path):
+    """
+    Devuelve el blob más reciente (por fecha de creación) bajo una ruta,
+    o None si la carpeta está vacía.
+
+    Si la tabla usa particiones estilo Hive (year=/month=/day=), recorre las
+    carpetas en orden descendente y se detiene en la primera partición con
+    archivos: son unas pocas llamadas pequeñas en lugar de paginar todo el
+    historial. Nuestras escrituras siempre van a la partición de hoy, por lo que
+    el objeto más nuevo está en la partición más alta. Para cualquier otra
+    estructura se usa el escaneo completo.
+    """
+    # El prefijo asegura que solo busquemos dentro de la carpeta deseada
+    prefix = f"{product_path}/"
+
+    files, subfolders = _list_level(bucket, prefix)
+    first_level = f"{PARTITION_LEVELS[0]}="
+    partitions = [p for p in subfolders if p[len(prefix):].startswith(first_level)]
+
+    # Sin particiones, o mezclado con otras carpetas: no podemos acotar la búsqueda
+    if not partitions or len(partitions) != len(subfolders):
+        return _find_latest_blob_full_scan(bucket, prefix)
+
+    latest = _latest_in_partitions(bucket, partitions, 0)
+    candidates = files + ([latest] if latest else [])
+    if not candidates:
+        return None
+    return max(candidates, key=lambda blob: blob.time_created)
+
+
+@_cached_listing("latest", lambda product_path: f"{product_path}/")
 def get_latest_dataset_in_product(project_id, bucket_name, product_path):
     """
     Encuentra y devuelve el nombre del archivo (dataset) más reciente dentro de una ruta.
@@ -93,25 +230,12 @@ def get_latest_dataset_in_product(project_id, bucket_name, product_path):
     storage_client = get_storage_client(project_id)
     bucket = storage_client.bucket(bucket_name)
 
-    # El prefijo asegura que solo busquemos dentro de la carpeta deseada
-    prefix = f"{product_path}/"
-
-    # Obtenemos el iterador de blobs (archivos)
-    blobs_iterator = bucket.list_blobs(prefix=prefix)
-
-    # Filtramos para ignorar "carpetas" vacías que terminan en '/'
-    all_files = [
-        blob for blob in blobs_iterator if not blob.name.endswith('/')]
+    latest_blob = _find_latest_blob(bucket, product_path)
 
     # Si no se encontraron archivos, devolvemos None
-    if not all_files:
+    if latest_blob is None:
         return None
 
-    # Usamos la función max() de Python con una clave personalizada.
-    # Para cada 'blob' en la lista, miramos su atributo 'time_created'.
-    # max() encontrará el blob que tenga el valor más alto en ese atributo.
-    latest_blob = max(all_files, key=lambda blob: blob.time_created)
-
     # Extraemos solo el nombre del archivo de la ruta completa (blob.name)
     latest_filename = latest_blob.name.split('/')[-1]
 
@@ -130,67 +254,168 @@ def create_resumable_upload_session(project_id, bucket_name, destination_blob_na
     url = blob.create_resumable_upload_session(
         origin=origin_url
     )
+    _invalidate_listings(project_id, bucket_name, destination_blob_name)
     return url
 
 
-def upload_file(project_id, bucket_name, local_path, table_path):
+def _partition_blob_name(table_path, filename="data.parquet", today=None):
     """
-    Sube un archivo a una ruta particionada por fecha (año/mes/día).
-    El nombre del archivo final será siempre "data.parquet".
-
-    Args:
-        project_id (str): El ID del proyecto de GCP.
-        bucket_name (str): El nombre del bucket.
-        local_path (str): La ruta al archivo temporal local que se va a subir.
-        table_path (str): La ruta base de la tabla. Ej: "sap/stxh".
-
-    Returns:
-        str: La ruta completa del blob creado en GCS.
+    Construye la ruta particionada por fecha (estilo Hive, por defecto hoy):
+    <table_path>/year=YYYY/month=MM/day=DD/<filename>
     """
-    # 1. Obtener la fecha actual en UTC para evitar problemas de zona horaria.
-    today = datetime.now()
+    today = today or datetime.now()
 
-    # 2. Formatear las partes de la fecha con cero a la izquierda donde sea necesario.
     # %Y -> 2025, %m -> 11, %d -> 08
     year = today.strftime('%Y')
     month = today.strftime('%m')
     day = today.strftime('%d')
 
-    # 3. Definir el nombre de archivo fijo.
-    filename = "data.parquet"
+    return f"{table_path}/year={year}/month={month}/day={day}/{filename}"
+
+
+def _open_parquet_writer(bucket, destination_blob_name):
+    """
+    Abre un escritor en streaming (subida reanudable) hacia un blob de GCS.
+    Si ocurre una excepción dentro del 'with', la subida se cancela y el
+    objeto a medias nunca queda publicado.
+    """
+    blob = bucket.blob(destination_blob_name)
+    return metrics.TimedStream(blob.open(
+        "wb",
+        chunk_size=Config.GCS_UPLOAD_CHUNK_SIZE,
+        content_type="application/octet-stream",
+        ignore_flush=True,
+    ), "gcs_upload")
+
+
+def upload_dataframe(project_id, bucket_name, df, table_path):
+    """
+    Limpia el DataFrame y lo escribe como "data.parquet" directo en GCS, en la
+    ruta particionada de hoy, SIN pasar por un archivo temporal local.
+
+    Se escribe row group por row group sobre una subida reanudable, así que la
+    memoria extra queda acotada a un row group más el buffer de subida.
+
+    Returns:
+        str: La ruta completa del blob creado en GCS.
+    """
+    from app.utils.file_converter import write_clean_parquet, iter_dataframe_slices
+
+    destination_blob_name = _partition_blob_name(table_path)
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+
+    with _open_parquet_writer(bucket, destination_blob_name) as sink:
+        write_clean_parquet(
+            iter_dataframe_slices(df, Config.PARQUET_ROW_GROUP_SIZE), sink)
+    _invalidate_listings(project_id, bucket_name, destination_blob_name)
 
-    # 4. Construir la ruta final del blob con el particionamiento.
-    destination_blob_name = f"{table_path}/year={year}/month={month}/day={day}/{filename}"
+    return destination_blob_name
+
+
+def upload_parquet_stream(project_id, bucket_name, source, table_path):
+    """
+    Camino rápido para archivos Parquet: se leen en lotes Arrow, se limpian
+    (todo a texto, nulos como "") y se escriben a GCS sin pasar por pandas.
+
+    Returns:
+        str: La ruta completa del blob creado en GCS.
+    """
+    from app.utils.file_converter import write_clean_arrow_parquet
+    from app.utils.file_processing import iter_parquet_tables
+
+    destination_blob_name = _partition_blob_name(table_path)
 
-    # 5. Subir el archivo como antes.
     storage_client = get_storage_client(project_id)
     bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(local_path)
 
-    # 6. Devolver la ruta completa del archivo creado.
+    with _open_parquet_writer(bucket, destination_blob_name) as sink:
+        write_clean_arrow_parquet(
+            iter_parquet_tables(source, Config.PARQUET_ROW_GROUP_SIZE), sink)
+    _invalidate_listings(project_id, bucket_name, destination_blob_name)
+
     return destination_blob_name
 
 
+def process_landed_upload(project_id, bucket_name, gcs_path, delete_source=False,
+                          sheet_name=None, header_row=None):
+    """
+    Convierte a Parquet limpio un archivo que el navegador ya subió a GCS
+    (subida reanudable), sin cargarlo completo en memoria.
+
+    El archivo original se lee en bloques desde GCS, cada bloque pasa por la
+    misma limpieza que /upload y se escribe como row group de un
+    "data.parquet" en la MISMA carpeta particionada (year=/month=/day=).
+
+    Args:
+        gcs_path (str): Ruta del objeto subido. Ej: "producto/tabla/year=2025/month=01/day=08/archivo.csv".
+        delete_source (bool): Si es True, borra el archivo original al terminar.
+        sheet_name, header_row: Hoja y fila de encabezado para Excel (ver
+            file_processing.iter_excel_chunks).
+
+    Returns:
+        dict: 'path' (Parquet generado), 'rows' (filas escritas) y 'source'.
+    """
+    from app.utils.file_converter import write_clean_arrow_parquet, write_clean_parquet
+    from app.utils.file_processing import iter_file_chunks, iter_parquet_tables
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+
+    source_blob = bucket.get_blob(gcs_path)
+    if source_blob is None:
+        raise FileNotFoundError(f"No existe el objeto '{gcs_path}' en el bucket '{bucket_name}'.")
+
+    folder, _, file_name = gcs_path.rpartition('/')
+    destination_blob_name = f"{folder}/data.parquet" if folder else "data.parquet"
+    if destination_blob_name == gcs_path:
+        raise ValueError("El archivo subido ya es el 'data.parquet' final de la partición.")
+
+    def convert(encoding=None):
+        with metrics.TimedStream(source_blob.open("rb", chunk_size=PREVIEW_READ_CHUNK_SIZE),
+                                 "gcs_download") as source, \
+                _open_parquet_writer(bucket, destination_blob_name) as sink:
+            if file_name.lower().endswith('.parquet'):
+                # Parquet -> Arrow -> Parquet limpio, sin pasar por pandas
+                return write_clean_arrow_parquet(
+                    iter_parquet_tables(source, Config.PARQUET_ROW_GROUP_SIZE), sink)
+            return write_clean_parquet(
+                iter_file_chunks(source, file_name, encoding=encoding,
+                                 sheet_name=sheet_name, header_row=header_row), sink)
+
+    try:
+        rows = convert()
+    except UnicodeDecodeError:
+        # La muestra era UTF-8 pero el resto del archivo no: es Latin-1.
+        # La subida fallida ya se canceló, se reintenta desde el inicio.
+        rows = convert(encoding='latin-1')
+
+    if delete_source:
+        source_blob.delete()
+    _invalidate_listings(project_id, bucket_name, destination_blob_name)
+
+    return {"path": destination_blob_name, "rows": rows, "source": gcs_path}
+
+
 def read_latest_dataset_content(project_id, bucket_name, product_path):
     """
     Busca el archivo más reciente y devuelve SU CONTENIDO COMPLETO.
     """
+    import pandas as pd
+
     storage_client = get_storage_client(project_id)
     bucket = storage_client.bucket(bucket_name)
 
-    prefix = f"{product_path}/"
-    blobs_iterator = bucket.list_blobs(prefix=prefix)
-    all_files = [
-        blob for blob in blobs_iterator if not blob.name.endswith('/')]
-
-    if not all_files:
+    latest_blob = _find_latest_blob(bucket, product_path)
+    if latest_blob is None:
         return None, None
 
-    latest_blob = max(all_files, key=lambda blob: blob.time_created)
     filename = latest_blob.name.split('/')[-1]
 
-    data_bytes = latest_blob.download_as_bytes()
+    with metrics.span("gcs_download") as span:
+        data_bytes = latest_blob.download_as_bytes()
+        span.add(nbytes=len(data_bytes))
 
     try:
         # Usamos engine='python' y dtype=str para leer todo como texto y evitar inferencias
@@ -204,7 +429,8 @@ def read_latest_dataset_content(project_id, bucket_name, product_path):
                 df = pd.read_csv(io.BytesIO(data_bytes), sep=None, engine='python',
                                  encoding='latin-1', on_bad_lines='skip', dtype=str)
         elif filename.endswith('.xlsx'):
-            df = pd.read_excel(io.BytesIO(data_bytes), dtype=str)
+            from app.utils.file_processing import read_excel_to_dataframe
+            df = read_excel_to_dataframe(io.BytesIO(data_bytes))
         else:
             return filename, None
 
@@ -215,11 +441,233 @@ def read_latest_dataset_content(project_id, bucket_name, product_path):
         return filename, None
 
 
+def read_latest_dataset_page(project_id, bucket_name, product_path, offset=0, limit=1000):
+    """
+    Devuelve UNA PÁGINA del archivo más reciente sin cargarlo completo.
+
+    Para Parquet se leen solo los row groups que cubren [offset, offset + limit)
+    y el total de filas sale del footer (metadata), no de contar el DataFrame.
+    Para otros formatos se usa la lectura completa como respaldo.
+
+    Returns:
+        tuple: (filename, page) donde page es None si el formato es ilegible, o un
+        dict con 'columns', 'total_rows' y 'chunks' (generador de listas de filas).
+        (None, None) si la carpeta está vacía.
+    """
+    import pyarrow.parquet as pq
+    from app.utils.parquet_utils import iter_parquet_page, json_safe_value
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+
+    latest_blob = _find_latest_blob(bucket, product_path)
+    if latest_blob is None:
+        return None, None
+
+    filename = latest_blob.name.split('/')[-1]
+
+    if not filename.endswith('.parquet'):
+        # Respaldo para CSV/Excel: no tienen row groups, se lee y se recorta
+        _, df = read_latest_dataset_content(project_id, bucket_name, product_path)
+        if df is None:
+            return filename, None
+
+        page_df = df.iloc[offset:offset + limit]
+        records = page_df.astype(object).where(page_df.notna(), None)\
+            .to_dict(orient='records')
+        return filename, {
+            "columns": [str(c) for c in df.columns],
+            "total_rows": len(df),
+            "chunks": iter([records]),
+        }
+
+    # El lector de GCS es "seekable": pyarrow solo descarga el footer
+    # y los rangos de bytes de los row groups que necesita.
+    reader = metrics.TimedStream(
+        latest_blob.open("rb", chunk_size=PREVIEW_READ_CHUNK_SIZE), "gcs_download")
+    try:
+        parquet_file = pq.ParquetFile(reader)
+    except Exception as e:
+        reader.close()
+        print(f"Error leyendo archivo {filename}: {e}")
+        return filename, None
+
+    def chunks():
+        try:
+            for table in iter_parquet_page(parquet_file, offset, limit):
+                yield [
+                    {k: json_safe_value(v) for k, v in row.items()}
+                    for row in table.to_pylist()
+                ]
+        finally:
+            reader.close()
+
+    return filename, {
+        "columns": parquet_file.schema_arrow.names,
+        "total_rows": parquet_file.metadata.num_rows,
+        "chunks": chunks(),
+    }
+
+
+def query_latest_dataset(project_id, bucket_name, product_path, columns=None, filters=None,
+                         search=None, sort=None, offset=0, limit=1000):
+    """
+    Búsqueda sobre el archivo más reciente: proyección, filtros, orden y
+    página se resuelven en un scan de pyarrow.dataset, sin bajar el dataset
+    completo. En Parquet el filtro usa las estadísticas de los row groups
+    para no descargar los que no pueden tener coincidencias; CSV/Excel se
+    leen completos y se filtran igual en memoria.
+
+    Args:
+        columns (list): Columnas a devolver (None = todas).
+        filters (list): Filtros 'columna:operador:valor' (ver parse_filter).
+        search (str): Texto a buscar en cualquier columna de texto.
+        sort (str): Orden 'col1,-col2'.
+
+    Returns:
+        tuple: (filename, page) con la misma forma que read_latest_dataset_page
+        ('total_rows' son las filas que cumplen) más 'dataset_rows' y
+        'row_ids' (posición de cada fila en el archivo, el row_id del delta).
+        (None, None) si la carpeta está vacía.
+
+    Raises:
+        ValueError: Si una columna, filtro u orden no es válido.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from app.utils.parquet_utils import (build_scan_filter, parse_sort, scan_page,
+                                         json_safe_value)
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+
+    latest_blob = _find_latest_blob(bucket, product_path)
+    if latest_blob is None:
+        return None, None
+
+    filename = latest_blob.name.split('/')[-1]
+    reader = None
+
+    if filename.endswith('.parquet'):
+        reader = metrics.TimedStream(
+            latest_blob.open("rb", chunk_size=PREVIEW_READ_CHUNK_SIZE), "gcs_download")
+        source = ds.ParquetFileFormat().make_fragment(reader)
+    else:
+        _, df = read_latest_dataset_content(project_id, bucket_name, product_path)
+        if df is None:
+            return filename, None
+        source = pa.Table.from_pandas(df, preserve_index=False)
+
+    try:
+        schema = source.physical_schema if reader is not None else source.schema
+        for name in columns or []:
+            if schema.get_field_index(name) < 0:
+                raise ValueError(f"Columna inexistente: '{name}'.")
+        expression = build_scan_filter(filters, search, schema)
+        sort_keys = parse_sort(sort, schema)
+
+        with metrics.span("query_scan") as span:
+            total, page, row_ids = scan_page(source, offset, limit, columns=columns,
+                                    expression=expression, sort_keys=sort_keys)
+            span.add(rows=total)
+        dataset_rows = source.metadata.num_rows if reader is not None else source.num_rows
+    finally:
+        if reader is not None:
+            reader.close()
+
+    records = [{k: json_safe_value(v) for k, v in row.items()} for row in page.to_pylist()]
+    return filename, {
+        "columns": page.column_names,
+        "total_rows": total,
+        "dataset_rows": dataset_rows,
+        "row_ids": row_ids,
+        "chunks": iter([records]),
+    }
+
+
+def stream_latest_dataset(project_id, bucket_name, product_path, output_format="parquet",
+                          batch_rows=None, compression=None):
+    """
+    Transmite el archivo más reciente en binario, sin decodificarlo a pandas.
+
+    output_format:
+        'parquet': los bytes del objeto tal cual, leídos de GCS por bloques.
+        'arrow': Arrow IPC (stream), un record batch por bloque de 'batch_rows'
+                 filas leído del Parquet; 'compression' ('lz4' o 'zstd')
+                 comprime los buffers del IPC.
+
+    Returns:
+        tuple: (filename, stream) donde stream es None si el archivo no es Parquet,
+        o un dict con 'chunks' (generador de bytes), 'size' (solo 'parquet') y
+        'total_rows' (solo 'arrow', sale del footer).
+        (None, None) si la carpeta está vacía.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+
+    latest_blob = _find_latest_blob(bucket, product_path)
+    if latest_blob is None:
+        return None, None
+
+    filename = latest_blob.name.split('/')[-1]
+    if not filename.endswith('.parquet'):
+        return filename, None
+
+    reader = metrics.TimedStream(
+        latest_blob.open("rb", chunk_size=PREVIEW_READ_CHUNK_SIZE), "gcs_download")
+
+    if output_format == "parquet":
+        def raw_chunks():
+            try:
+                while True:
+                    data = reader.read(PREVIEW_READ_CHUNK_SIZE)
+                    if not data:
+                        break
+                    yield data
+            finally:
+                reader.close()
+
+        return filename, {"chunks": raw_chunks(), "size": latest_blob.size}
+
+    try:
+        parquet_file = pq.ParquetFile(reader)
+    except Exception as e:
+        reader.close()
+        print(f"Error leyendo archivo {filename}: {e}")
+        return filename, None
+
+    def ipc_chunks():
+        # El writer escribe en un buffer que se vacía después de cada batch:
+        # en memoria queda como mucho un row group decodificado.
+        sink = io.BytesIO()
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        try:
+            with pa.ipc.new_stream(sink, parquet_file.schema_arrow, options=options) as writer:
+                for batch in parquet_file.iter_batches(
+                        batch_size=batch_rows or Config.PARQUET_ROW_GROUP_SIZE):
+                    writer.write_batch(batch)
+                    yield sink.getvalue()
+                    sink.seek(0)
+                    sink.truncate()
+            # Marca de fin de stream que agrega el writer al cerrarse
+            yield sink.getvalue()
+        finally:
+            reader.close()
+
+    return filename, {"chunks": ipc_chunks(), "total_rows": parquet_file.metadata.num_rows}
+
+
 def save_full_dataset(project_id, bucket_name, product_path, rows):
     """
     Recibe las filas, agrega columnas de partición (year, month, day),
     convierte a Parquet y sube a GCS.
     """
+    import pandas as pd
+    from app.utils.file_converter import write_clean_parquet, iter_dataframe_slices
+
     # 1. Definir fecha de partición (UTC o Local según prefieras)
     today = datetime.now()
     year = today.strftime('%Y')
@@ -235,25 +683,300 @@ def save_full_dataset(project_id, bucket_name, product_path, rows):
     df['month'] = month
     df['day'] = day
 
-    # 3. PROCESAMIENTO Y LIMPIEZA
+    # 3. PROCESAMIENTO, LIMPIEZA Y SUBIDA A GCS (en streaming, sin archivo temporal)
+    # Ruta estilo Hive: year=2023/month=12/day=29
+    destination_blob_name = _partition_blob_name(product_path, today=today)
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+
     try:
-        temp_parquet_path = dataframe_to_parquet_tempfile(
-            df, "data_editada.parquet")
+        with _open_parquet_writer(bucket, destination_blob_name) as sink:
+            write_clean_parquet(
+                iter_dataframe_slices(df, Config.PARQUET_ROW_GROUP_SIZE), sink)
     except Exception as e:
         raise Exception(f"Error en la transformación de datos: {e}")
+    _invalidate_listings(project_id, bucket_name, destination_blob_name)
 
-    filename = "data.parquet"
-    # Ruta estilo Hive: year=2023/month=12/day=29
-    destination_blob_name = f"{product_path}/year={year}/month={month}/day={day}/{filename}"
+    return destination_blob_name
+
+
+def save_dataset_table(project_id, bucket_name, product_path, table):
+    """
+    Igual que save_full_dataset, pero recibe una tabla Arrow (payload columnar
+    o Arrow IPC): se limpia y se escribe sin pasar por pandas ni por dicts.
+
+    Returns:
+        str: Ruta del Parquet escrito.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from app.utils.file_converter import clean_arrow_table
+
+    today = datetime.now()
+    table = clean_arrow_table(table)
+
+    # Columnas de partición (si ya venían en la data se reemplazan, como con pandas)
+    for name, value in (("year", today.strftime('%Y')), ("month", today.strftime('%m')),
+                        ("day", today.strftime('%d'))):
+        column = pa.array([value] * table.num_rows, type=pa.string())
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, column)
+        else:
+            table = table.append_column(name, column)
+
+    destination_blob_name = _partition_blob_name(product_path, today=today)
 
-    # 4. Subir a GCS
     storage_client = get_storage_client(project_id)
     bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(destination_blob_name)
-
-    blob.upload_from_filename(temp_parquet_path)
 
-    if os.path.exists(temp_parquet_path):
-        os.remove(temp_parquet_path)
+    try:
+        with _open_parquet_writer(bucket, destination_blob_name) as sink:
+            with pq.ParquetWriter(sink, table.schema, compression=Config.PARQUET_COMPRESSION) as writer:
+                writer.write_table(table, row_group_size=Config.PARQUET_ROW_GROUP_SIZE)
+    except Exception as e:
+        raise Exception(f"Error en la transformación de datos: {e}")
+    _invalidate_listings(project_id, bucket_name, destination_blob_name)
 
     return destination_blob_name
+
+
+class DatasetConflictError(Exception):
+    """
+    El archivo más reciente ya no es el que el usuario editó (otra escritura
+    entremedio): los row_id del delta no serían válidos.
+    """
+
+
+def _partition_values(today):
+    return {"year": today.strftime('%Y'), "month": today.strftime('%m'), "day": today.strftime('%d')}
+
+
+def _clean_delta_rows(rows, schema, today):
+    """
+    Limpia filas del front (igual que save_full_dataset) y las alinea al esquema
+    del archivo. Columnas que no vienen quedan vacías; year/month/day son los de hoy.
+    """
+    import pandas as pd
+    import pyarrow as pa
+    from app.utils.file_converter import dataframe_to_clean_table
+
+    table = dataframe_to_clean_table(pd.DataFrame(rows))
+    unknown = set(table.column_names) - set(schema.names)
+    if unknown:
+        raise ValueError(f"Columnas desconocidas en el delta: {sorted(unknown)}")
+
+    partition_values = _partition_values(today)
+    arrays = []
+    for field in schema:
+        if field.name in table.column_names:
+            arrays.append(table.column(field.name))
+        else:
+            arrays.append(pa.array([partition_values.get(field.name, "")] * table.num_rows))
+    return pa.Table.from_arrays(arrays, names=schema.names).cast(schema)
+
+
+def _raise_on_duplicate_keys(keys, key_columns, where):
+    import pyarrow.compute as pc
+
+    counts = keys.group_by(key_columns).aggregate([([], "count_all")])
+    duplicated = counts.filter(pc.greater(counts["count_all"], 1))
+    if duplicated.num_rows:
+        examples = duplicated.select(key_columns).slice(0, 5).to_pylist()
+        raise ValueError(
+            f"Las columnas clave {key_columns} no identifican cada fila de forma única {where}: {examples}")
+
+
+def _check_unique_keys(parquet_file, key_columns, updates, deleted, inserted_table):
+    """
+    El MERGE ubica cada fila en BQ por sus columnas clave: tienen que ser únicas
+    en el archivo actual y seguir siéndolo con el delta aplicado. Solo se leen
+    las columnas clave.
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    keys = parquet_file.read(columns=key_columns)
+    _raise_on_duplicate_keys(keys, key_columns, "en el dataset")
+
+    mask = np.ones(keys.num_rows, dtype=bool)
+    mask[list(set(updates) | deleted)] = False
+    edited = []
+    for row_id, values in updates.items():
+        row = keys.slice(row_id, 1).to_pylist()[0]
+        row.update({k: v for k, v in values.items() if k in row})
+        edited.append(row)
+
+    pieces = [keys.filter(pa.array(mask)), pa.Table.from_pylist(edited, schema=keys.schema)]
+    if inserted_table is not None:
+        pieces.append(inserted_table.select(key_columns))
+    _raise_on_duplicate_keys(pa.concat_tables(pieces), key_columns, "después de aplicar los cambios")
+
+
+def _latest_delta_blob(bucket, product_path, base_file=None, base_generation=None):
+    """
+    Archivo más reciente sobre el que se aplica un delta.
+
+    Raises:
+        FileNotFoundError: Si no hay un Parquet previo.
+        DatasetConflictError: Si ya no es el archivo (o la versión) que se editó.
+    """
+    latest_blob = _find_latest_blob(bucket, product_path)
+    if latest_blob is None or not latest_blob.name.endswith('.parquet'):
+        raise FileNotFoundError(f"No hay un Parquet previo en '{product_path}' sobre el cual aplicar cambios.")
+    if base_file and base_file not in (latest_blob.name, latest_blob.name.split('/')[-1]):
+        raise DatasetConflictError(
+            f"El dataset cambió desde que se abrió para editar (último archivo: {latest_blob.name}).")
+    if base_generation is not None and int(base_generation) != latest_blob.generation:
+        raise DatasetConflictError(
+            f"El dataset cambió desde que se encoló el guardado (último archivo: {latest_blob.name}).")
+    return latest_blob
+
+
+def _prepare_delta(parquet_file, inserted, updated, deleted, key_columns, today):
+    """
+    Valida el delta contra el archivo y limpia sus valores.
+
+    Returns:
+        tuple: (updates: row_id -> {columna: valor limpio}, deleted: set de
+        row_id, inserted_table: pyarrow.Table o None).
+
+    Raises:
+        ValueError: Columnas o row_id inexistentes, o claves repetidas.
+    """
+    from app.utils.file_converter import clean_column_name
+
+    schema = parquet_file.schema_arrow
+    total_rows = parquet_file.metadata.num_rows
+    deleted = set(deleted or [])
+
+    missing = [c for c in (key_columns or []) if c not in schema.names]
+    if missing:
+        raise ValueError(f"Columnas inexistentes en el dataset: {missing}")
+
+    updates = {}
+    for change in updated or []:
+        updates.setdefault(int(change["row_id"]), {}).update(change.get("values") or {})
+    invalid = [r for r in set(updates) | deleted if not 0 <= r < total_rows]
+    if invalid:
+        raise ValueError(f"row_id fuera de rango (0-{total_rows - 1}): {sorted(invalid)[:10]}")
+    updates = {r: v for r, v in updates.items() if r not in deleted}
+
+    # Valores editados: misma limpieza que el guardado completo
+    if updates:
+        row_ids = list(updates)
+        cleaned = _clean_delta_rows([updates[r] for r in row_ids], schema, today).to_pylist()
+        updates = {r: {name: cleaned[i][name] for name in map(clean_column_name, updates[r])}
+                   for i, r in enumerate(row_ids)}
+    inserted_table = _clean_delta_rows(inserted, schema, today) if inserted else None
+
+    if key_columns:
+        _check_unique_keys(parquet_file, key_columns, updates, deleted, inserted_table)
+    return updates, deleted, inserted_table
+
+
+def check_latest_dataset(project_id, bucket_name, product_path, base_generation):
+    """
+    Verifica que el archivo más reciente siga siendo la generación 'base_generation'.
+
+    Raises:
+        FileNotFoundError: Si no hay un Parquet en la carpeta.
+        DatasetConflictError: Si hay una versión más nueva.
+    """
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+    _latest_delta_blob(bucket, product_path, base_generation=base_generation)
+
+
+def validate_dataset_delta(project_id, bucket_name, product_path, inserted=None, updated=None,
+                           deleted=None, base_file=None, base_generation=None, key_columns=None):
+    """
+    Valida un delta contra el archivo más reciente sin escribir nada, para
+    rechazarlo en la request antes de encolar el job (mismos errores que
+    apply_dataset_delta).
+
+    Returns:
+        int: Generación del archivo validado; el job la usa como base_generation
+        para no aplicar el delta sobre otra versión.
+    """
+    import pyarrow.parquet as pq
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+    latest_blob = _latest_delta_blob(bucket, product_path, base_file, base_generation)
+
+    with metrics.TimedStream(latest_blob.open("rb", chunk_size=PREVIEW_READ_CHUNK_SIZE),
+                             "gcs_download") as reader:
+        _prepare_delta(pq.ParquetFile(reader), inserted, updated, deleted, key_columns, datetime.now())
+    return latest_blob.generation
+
+
+def apply_dataset_delta(project_id, bucket_name, product_path, inserted=None, updated=None,
+                        deleted=None, base_file=None, base_generation=None, key_columns=None):
+    """
+    Aplica un delta (filas nuevas, editadas y borradas) sobre el Parquet más
+    reciente y sube el resultado a la partición de hoy, sin que el front tenga
+    que reenviar la tabla completa. Como en el guardado completo, todas las
+    filas del archivo nuevo quedan con year/month/day de hoy.
+
+    Args:
+        inserted (list): Filas nuevas ({columna: valor}), se agregan al final.
+        updated (list): [{"row_id": int, "values": {columna: valor}}] (solo lo editado).
+        deleted (list): row_id de las filas a eliminar.
+        base_file (str): Ruta del archivo que el usuario editó (opcional). Si ya
+            no es el más reciente se lanza DatasetConflictError.
+        base_generation (int): Igual que base_file pero por generación de GCS;
+            evita aplicar dos veces el mismo delta si un job se reintenta.
+        key_columns (list): Columnas clave del MERGE: deben existir e
+            identificar cada fila, antes y después del delta.
+
+    El row_id es la posición de la fila (0-based) en el archivo más reciente,
+    la misma que entrega preview-latest (offset + índice, o 'row_ids' en búsquedas).
+
+    Returns:
+        dict: path, generation (la del archivo escrito), rows, row_groups,
+        row_groups_rewritten, columns, before/after (filas originales y editadas por row_id), inserted (filas
+        limpias) y partition_values (year/month/day fijados en todas las filas).
+    """
+    import pyarrow.parquet as pq
+    from app.utils.parquet_utils import apply_parquet_delta
+
+    storage_client = get_storage_client(project_id)
+    bucket = storage_client.bucket(bucket_name)
+    latest_blob = _latest_delta_blob(bucket, product_path, base_file, base_generation)
+
+    today = datetime.now()
+    destination_blob_name = _partition_blob_name(product_path, today=today)
+
+    # Se lee la generación listada: aunque el destino sea el mismo objeto,
+    # la nueva versión solo se publica al cerrar el escritor.
+    with metrics.TimedStream(latest_blob.open("rb", chunk_size=PREVIEW_READ_CHUNK_SIZE),
+                             "gcs_download") as reader:
+        parquet_file = pq.ParquetFile(reader)
+        schema = parquet_file.schema_arrow
+        updates, deleted, inserted_table = _prepare_delta(
+            parquet_file, inserted, updated, deleted, key_columns, today)
+        partition_values = {k: v for k, v in _partition_values(today).items() if k in schema.names}
+
+        try:
+            with _open_parquet_writer(bucket, destination_blob_name) as sink:
+                writer = pq.ParquetWriter(sink, schema, compression=Config.PARQUET_COMPRESSION)
+                try:
+                    result = apply_parquet_delta(parquet_file, writer, updates, deleted, inserted_table,
+                                                 constant_columns=partition_values)
+                finally:
+                    writer.close()
+        except Exception as e:
+            raise Exception(f"Error aplicando los cambios: {e}")
+
+    _invalidate_listings(project_id, bucket_name, destination_blob_name)
+    written = bucket.get_blob(destination_blob_name)
+
+    result.update({
+        "path": destination_blob_name,
+        "generation": written.generation if written is not None else None,
+        "columns": schema.names,
+        "inserted": inserted_table.to_pylist() if inserted_table is not None else [],
+        "partition_values": partition_values,
+    })
+    return result
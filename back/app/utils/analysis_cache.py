@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from cachetools import TTLCache
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Carpeta compartida por todos los workers del contenedor
+ANALYSIS_CACHE_DIR = os.path.join(tempfile.gettempdir(), "analysis-cache")
+
+# Tamaño de cada lectura al calcular el hash del archivo
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class _ArtifactCache(TTLCache):
+    """
+    TTLCache (hash -> ruta del artefacto) que borra el archivo en disco
+    cuando una entrada sale por LRU o por expiración.
+    """
+
+    def popitem(self):
+        key, path = super().popitem()
+        _remove_quietly(path)
+        return key, path
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, path in expired:
+            _remove_quietly(path)
+        return expired
+
+
+_artifacts = _ArtifactCache(
+    maxsize=Config.ANALYSIS_CACHE_MAX_ENTRIES, ttl=Config.ANALYSIS_CACHE_TTL)
+_lock = threading.Lock()
+
+
+def file_size_bytes(file) -> int:
+    """
+    Tamaño del archivo subido sin leerlo (solo posiciona el cursor al final).
+    """
+    stream = getattr(file, 'stream', file)
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def compute_content_hash(file) -> str:
+    """
+    SHA-256 del contenido, leído por bloques para no duplicar el archivo en memoria.
+    """
+    stream = getattr(file, 'stream', file)
+    stream.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _artifact_path(key):
+    return os.path.join(ANALYSIS_CACHE_DIR, f"{key}.parquet")
+
+
+def _sweep_stale_files(now):
+    """
+    Borra artefactos vencidos que dejaron otros workers (o reinicios) en la carpeta.
+    """
+    try:
+        names = os.listdir(ANALYSIS_CACHE_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(ANALYSIS_CACHE_DIR, name)
+        try:
+            if now - os.path.getmtime(path) > Config.ANALYSIS_CACHE_TTL:
+                _remove_quietly(path)
+        except OSError:
+            continue
+
+
+def _lookup(key):
+    """
+    Devuelve la ruta del artefacto si existe y está vigente (propio o de otro worker).
+    """
+    with _lock:
+        path = _artifacts.get(key)
+        if path and os.path.exists(path):
+            return path
+
+        path = _artifact_path(key)
+        try:
+            fresh = time.time() - os.path.getmtime(path) <= Config.ANALYSIS_CACHE_TTL
+        except OSError:
+            return None
+        if not fresh:
+            return None
+        _artifacts[key] = path
+        return path
+
+
+def _store(key, df):
+    """
+    Escribe el DataFrame como Parquet de forma atómica y lo registra en la caché.
+    """
+    os.makedirs(ANALYSIS_CACHE_DIR, exist_ok=True)
+    path = _artifact_path(key)
+
+    # Escribimos a un temporal y lo renombramos: otro worker nunca ve un archivo a medias
+    fd, tmp_path = tempfile.mkstemp(dir=ANALYSIS_CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, engine="pyarrow", index=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        _remove_quietly(tmp_path)
+        raise
+
+    with _lock:
+        _sweep_stale_files(time.time())
+        _artifacts[key] = path
+
+
+def read_file_cached(file, sheet_name=None, header_row=None):
+    """
+    Igual que read_file_to_dataframe, pero parsea cada contenido UNA sola vez.
+    En Excel la hoja y la fila de encabezado elegidas son parte de la llave.
+
+    La primera llamada calcula el hash del contenido, parsea el archivo y deja
+    un artefacto Parquet en una carpeta temporal. Las llamadas siguientes con el
+    mismo contenido (pasos 2 y 3 de /analyze y el /upload final) leen ese
+    artefacto en lugar de volver a parsear el CSV/Excel.
+    """
+    # Import diferido: pandas solo se carga cuando hay que leer un archivo
+    import pandas as pd
+    from app.utils.file_processing import read_file_to_dataframe
+
+    extension = os.path.splitext(file.filename.lower())[1].lstrip('.')
+    key = f"{compute_content_hash(file)}-{extension}"
+    if sheet_name is not None or header_row is not None:
+        key = f"{key}-{sheet_name}-{header_row}"
+
+    path = _lookup(key)
+    if path:
+        try:
+            return pd.read_parquet(path)
+        except Exception as e:
+            # Artefacto dañado o borrado entre medio: se vuelve a parsear
+            logger.warning("Artefacto de análisis ilegible (%s): %s", path, e)
+
+    df = read_file_to_dataframe(file, sheet_name=sheet_name, header_row=header_row)
+
+    try:
+        _store(key, df)
+    except Exception as e:
+        # Ej: columnas con nombres no string. No es bloqueante: solo no se cachea.
+        logger.warning("No se pudo cachear el análisis del archivo '%s': %s", file.filename, e)
+
+    return df
@@ -0,0 +1,124 @@
+import threading
+import weakref
+from concurrent.futures import Future
+from cachetools import TTLCache
+
+# Todas las cachés vivas (las expone /metrics)
+_instances = weakref.WeakSet()
+
+
+def all_caches():
+    return list(_instances)
+
+
+class SharedTTLCache:
+    """
+    Caché en memoria con TTL y tope LRU, segura entre threads de gunicorn.
+
+    - get_or_load(): devuelve el valor cacheado o lo calcula con 'loader'.
+    - invalidate(): borra entradas (todas o las que cumplan un predicado).
+    - Lleva contadores de aciertos (hits) y fallos (misses).
+
+    Single-flight: si varios threads piden la misma clave a la vez, solo uno
+    ejecuta 'loader' y el resto espera su resultado (cuenta como 'coalesced').
+
+    Si hay una invalidación mientras se calcula un valor, ese valor no se
+    guarda (podría reflejar el estado anterior a la escritura).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = ""):
+        self.name = name
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        _instances.add(self)
+
+    def get_or_load(self, key, loader):
+        leader = False
+        with self._lock:
+            try:
+                value = self._cache[key]
+                self.hits += 1
+                return value
+            except KeyError:
+                pending = self._inflight.get(key)
+                if pending is not None:
+                    self.coalesced += 1
+                else:
+                    self.misses += 1
+                    generation = self._generation
+                    pending = self._inflight[key] = Future()
+                    leader = True
+
+        if not leader:
+            # Otro thread ya está cargando esta clave: se espera su resultado
+            return pending.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._release(key, pending)
+            pending.set_exception(e)
+            raise
+
+        with self._lock:
+            self._release(key, pending)
+            if generation == self._generation:
+                self._cache[key] = value
+        pending.set_result(value)
+        return value
+
+    def _release(self, key, pending):
+        # Una invalidación pudo haber dado paso a otra carga de la misma clave
+        if self._inflight.get(key) is pending:
+            del self._inflight[key]
+
+    def get(self, key, default=None):
+        """
+        Lectura directa (cuenta como hit/miss igual que get_or_load).
+        """
+        with self._lock:
+            try:
+                value = self._cache[key]
+                self.hits += 1
+                return value
+            except KeyError:
+                self.misses += 1
+                return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._cache[key] = value
+
+    def invalidate(self, predicate=None):
+        """
+        Borra todas las entradas, o solo aquellas cuya clave cumpla 'predicate(key)'.
+        """
+        with self._lock:
+            self._generation += 1
+            if predicate is None:
+                self._cache.clear()
+                # Las cargas en curso pueden traer datos previos a la escritura
+                self._inflight.clear()
+                return
+            for key in [k for k in list(self._cache.keys()) if predicate(k)]:
+                self._cache.pop(key, None)
+            for key in [k for k in self._inflight if predicate(k)]:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl": self._cache.ttl,
+            }
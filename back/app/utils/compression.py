@@ -0,0 +1,81 @@
+import gzip
+import time
+from app.utils import metrics
+
+# Tipos de contenido que vale la pena comprimir (texto / JSON)
+COMPRESSIBLE_MIMETYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def _zstd_available():
+    try:
+        import pyarrow as pa
+        return pa.Codec.is_available("zstd")
+    except ImportError:
+        return False
+
+
+def _accepted_encodings(header):
+    """
+    Codificaciones aceptadas por el cliente según Accept-Encoding (q=0 excluye).
+    """
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+def compress_body(data: bytes, encoding: str, level=None) -> bytes:
+    if encoding == "zstd":
+        import pyarrow as pa
+        return pa.Codec("zstd", compression_level=level or 3).compress(data, asbytes=True)
+    return gzip.compress(data, compresslevel=level or 5)
+
+
+def init_app(app, min_bytes):
+    """
+    Comprime las respuestas grandes (>= 'min_bytes') según Accept-Encoding:
+    zstd si el cliente lo acepta (y pyarrow trae el codec), si no gzip.
+    Las respuestas en streaming (ndjson por páginas) se dejan sin comprimir.
+    """
+    from flask import request
+
+    zstd_available = _zstd_available()
+
+    @app.after_request
+    def _compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code >= 300
+                or "Content-Encoding" in response.headers
+                or not response.mimetype.startswith(COMPRESSIBLE_MIMETYPES)):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+
+        accepted = _accepted_encodings(request.headers.get("Accept-Encoding"))
+        if zstd_available and "zstd" in accepted:
+            encoding = "zstd"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            return response
+
+        started = time.perf_counter()
+        compressed = compress_body(data, encoding)
+        metrics.record("compress", time.perf_counter() - started, nbytes=len(data))
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        return response
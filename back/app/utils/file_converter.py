@@ -1,33 +1,186 @@
 import os
 import tempfile
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import time
 import unicodedata
+from app.config import Config
+from app.utils import metrics
 
-def clean_text_series(series: pd.Series) -> pd.Series:
+# Cualquier carácter fuera de ASCII (lo que encode('ascii', 'ignore') descartaba)
+NON_ASCII_PATTERN = r"[^\x00-\x7F]"
+
+
+def normalize_text_array(arr):
     """
-    Limpia una serie: 
+    Limpia un arreglo Arrow de strings (Array o ChunkedArray) en operaciones vectorizadas:
     1. Rellena nulos con "" (vacío).
-    2. Convierte a string.
-    3. ñ->ni, elimina tildes, normaliza a ASCII.
-    """
-    
-    # --- CAMBIO IMPORTANTE ---
-    # 1. Primero rellenamos los NaN/None con cadena vacía.
-    # Si no hacemos esto, astype(str) convierte el NaN en la palabra literal "nan".
-    series = series.fillna("")
-    
-    # 2. Ahora convertimos todo a string (asegura que números sean texto)
-    series = series.astype(str)
-    
-    # 3. Reemplazo de ñ/Ñ
-    series = series.str.replace('ñ', 'ni', case=False, regex=False)
-    series = series.str.replace('Ñ', 'Ni', case=False, regex=False)
-
-    # 4. Normalización (quitar tildes y caracteres raros)
-    return (series
-            .str.normalize('NFKD')
-            .str.encode('ascii', errors='ignore')
-            .str.decode('utf-8'))
+    2. ñ/Ñ -> ni (igual que el reemplazo sin distinción de mayúsculas anterior).
+    3. Normaliza NFKD y elimina todo lo que no sea ASCII (tildes, símbolos raros).
+
+    Si la columna ya es 100% ASCII se devuelve tal cual (solo con nulos rellenados).
+    """
+    arr = pc.fill_null(arr, "")
+
+    # Chequeo barato: la gran mayoría de las columnas (códigos, números, fechas) son ASCII
+    if len(arr) == 0 or pc.all(pc.string_is_ascii(arr)).as_py():
+        return arr
+
+    arr = pc.replace_substring(arr, 'ñ', 'ni')
+    arr = pc.replace_substring(arr, 'Ñ', 'ni')
+    arr = pc.utf8_normalize(arr, form='NFKD')
+    return pc.replace_substring_regex(arr, NON_ASCII_PATTERN, '')
+
+
+def series_to_string_array(series: pd.Series):
+    """
+    Convierte una serie de pandas a un arreglo Arrow de strings (nulos como null).
+    """
+    if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+        try:
+            # Camino rápido: columnas de texto (lo normal con dtype=str)
+            return pa.array(series.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Objetos mezclados (Decimal, bytes, etc.): se pasan a texto como antes
+            pass
+
+    # Números, fechas, booleanos: se respeta el formato de texto de pandas
+    # (fillna("") primero para que el NaN no se vuelva la palabra literal "nan")
+    return pa.array(series.fillna("").astype(str).to_numpy(dtype=object), type=pa.string())
+
+
+def clean_column_name(col) -> str:
+    """
+    Limpia un encabezado: ñ->ni, sin tildes, solo ASCII.
+    """
+    clean_col = str(col).replace('ñ', 'ni').replace('Ñ', 'Ni')
+    return unicodedata.normalize('NFKD', clean_col)\
+        .encode('ascii', 'ignore')\
+        .decode('utf-8')
+
+
+def dataframe_to_clean_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Convierte el DataFrame a una tabla Arrow limpia SIN copiar el DataFrame:
+    cada columna se transforma directamente a un arreglo Arrow de strings.
+    - Todo dato se vuelve texto (string).
+    - Los nulos se vuelven vacíos "".
+    - Se limpian tildes y ñ (en datos y encabezados).
+    """
+    with metrics.span("clean", rows=len(df)):
+        arrays = []
+        names = []
+        for i in range(df.shape[1]):
+            # iloc por posición: tolera nombres de columna duplicados
+            arrays.append(normalize_text_array(series_to_string_array(df.iloc[:, i])))
+            names.append(clean_column_name(df.columns[i]))
+
+        return pa.Table.from_arrays(arrays, names=names)
+
+
+def _arrow_column_to_string(column):
+    """
+    Pasa una columna Arrow de cualquier tipo a strings (nulos se mantienen null).
+    """
+    if column.type == pa.string():
+        return column
+    if pa.types.is_boolean(column.type):
+        # Mismo texto que pandas/Python
+        return pc.if_else(column, "True", "False")
+    if pa.types.is_floating(column.type):
+        # Arrow escribe 3.0 como "3"; pandas/Python como "3.0" (formato histórico).
+        # NaN se trata como nulo, igual que en pandas.
+        return pa.array([None if v is None or v != v else str(v) for v in column.to_pylist()],
+                        type=pa.string())
+    try:
+        return pc.cast(column, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        # Tipos anidados (listas, structs): se pasan a texto valor a valor
+        return pa.array([None if v is None else str(v) for v in column.to_pylist()], type=pa.string())
+
+
+def clean_arrow_table(table: pa.Table) -> pa.Table:
+    """
+    Igual que dataframe_to_clean_table, pero partiendo de una tabla Arrow
+    (payload columnar o Arrow IPC): no pasa por pandas.
+    """
+    with metrics.span("clean", rows=table.num_rows):
+        arrays = [normalize_text_array(_arrow_column_to_string(column)) for column in table.columns]
+        names = [clean_column_name(name) for name in table.column_names]
+        return pa.Table.from_arrays(arrays, names=names)
+
+
+def iter_dataframe_slices(df: pd.DataFrame, rows: int):
+    """
+    Recorre el DataFrame en bloques de 'rows' filas (vistas, sin copiar).
+    Un DataFrame vacío se entrega una vez para que igual se escriba el esquema.
+    """
+    if len(df) == 0:
+        yield df
+        return
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def write_clean_parquet(frames, sink, row_group_size=None, compression=None) -> int:
+    """
+    Limpia y escribe una secuencia de DataFrames como UN archivo Parquet.
+
+    Cada bloque se limpia y se escribe como row group apenas llega, así que la
+    memoria extra queda acotada a un bloque. 'sink' puede ser una ruta o cualquier
+    objeto tipo archivo escribible (ej: blob.open('wb') de GCS).
+
+    Returns:
+        int: Total de filas escritas.
+    """
+    return _write_tables(
+        (dataframe_to_clean_table(frame) for frame in frames), sink, row_group_size, compression)
+
+
+def write_clean_arrow_parquet(tables, sink, row_group_size=None, compression=None) -> int:
+    """
+    Igual que write_clean_parquet, pero recibe tablas Arrow (ej: lotes de un
+    Parquet subido): todo el camino queda en Arrow, sin pasar por pandas.
+
+    Returns:
+        int: Total de filas escritas.
+    """
+    return _write_tables(
+        (clean_arrow_table(table) for table in tables), sink, row_group_size, compression)
+
+
+def _write_tables(tables, sink, row_group_size=None, compression=None) -> int:
+    row_group_size = row_group_size or Config.PARQUET_ROW_GROUP_SIZE
+    compression = compression or Config.PARQUET_COMPRESSION
+
+    writer = None
+    total_rows = 0
+    # Solo la codificación/escritura (incluye el tiempo del 'sink'): la
+    # limpieza de cada bloque se mide aparte como "clean"
+    write_seconds = 0.0
+    failed = True
+    try:
+        for table in tables:
+            started = time.perf_counter()
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema, compression=compression)
+            writer.write_table(table, row_group_size=row_group_size)
+            write_seconds += time.perf_counter() - started
+            total_rows += table.num_rows
+        failed = False
+    finally:
+        if writer is not None:
+            started = time.perf_counter()
+            writer.close()
+            write_seconds += time.perf_counter() - started
+            metrics.record("parquet_write", write_seconds, rows=total_rows, error=failed)
+
+    if writer is None:
+        raise ValueError("No hay datos para escribir en Parquet.")
+
+    return total_rows
 
 
 def dataframe_to_parquet_tempfile(df: pd.DataFrame, original_filename: str) -> str:
@@ -41,41 +194,22 @@ def dataframe_to_parquet_tempfile(df: pd.DataFrame, original_filename: str) -> s
         raise TypeError("La entrada debe ser un DataFrame de pandas.")
 
     try:
-        # Trabajamos con una copia
-        df_limpio = df.copy()
-
-        # --- FASE 1: Limpieza de DATOS (Filas) ---
-        # Iteramos sobre TODAS las columnas sin importar su tipo original
-        for col in df_limpio.columns:
-            # Aplicamos la limpieza que incluye fillna("") -> astype(str)
-            df_limpio[col] = clean_text_series(df_limpio[col])
-
-        # --- FASE 2: Limpieza de COLUMNAS (Encabezados) ---
-        new_columns = []
-        for col in df_limpio.columns:
-            # Convertimos el nombre de la columna a string y limpiamos
-            clean_col = str(col).replace('ñ', 'ni').replace('Ñ', 'Ni')
-            clean_col = unicodedata.normalize('NFKD', clean_col)\
-                .encode('ascii', 'ignore')\
-                .decode('utf-8')
-            new_columns.append(clean_col)
-
-        df_limpio.columns = new_columns
-
-        print("[INFO] Limpieza completa: Todo es texto, nulos son vacíos, sin tildes.")
-
-        # --- FASE 3: Guardado ---
-        tmp_dir = tempfile.gettempdir()
         base_name = os.path.splitext(original_filename)[0]
         base_name_clean = unicodedata.normalize('NFKD', base_name)\
             .encode('ascii', 'ignore').decode('utf-8')
 
-        parquet_path = os.path.join(tmp_dir, f"{base_name_clean}.parquet")
+        # Nombre único: dos subidas simultáneas del mismo archivo no se pisan
+        fd, parquet_path = tempfile.mkstemp(
+            prefix=f"{base_name_clean}-", suffix=".parquet")
+        os.close(fd)
+
+        # --- Limpieza de DATOS y COLUMNAS + Guardado, bloque a bloque ---
+        write_clean_parquet(
+            iter_dataframe_slices(df, Config.PARQUET_ROW_GROUP_SIZE), parquet_path)
 
-        df_limpio.to_parquet(parquet_path, engine="pyarrow", index=False)
+        print("[INFO] Limpieza completa: Todo es texto, nulos son vacíos, sin tildes.")
 
         return parquet_path
 
     except Exception as e:
         raise IOError(f"Error al convertir DataFrame a Parquet: {str(e)}")
-    
\ No newline at end of file
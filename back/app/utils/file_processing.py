@@ -1,69 +1,371 @@
 import pandas as pd
+import pyarrow.parquet as pq
+import codecs
 import io
+import math
 from pandas.errors import ParserError
+from app.utils import metrics
 
-def read_file_to_dataframe(file):
+# Bytes iniciales que se usan para detectar encoding y separador del CSV
+CSV_SNIFF_BYTES = 64 * 1024
+# Filas por bloque al recorrer un archivo en streaming (iter_*_chunks)
+CSV_CHUNK_ROWS = 100_000
+# Filas iniciales de una hoja Excel donde se busca el encabezado (los exports
+# de SAP suelen traer título, filtros o filas vacías antes de la tabla) y se
+# mide el ancho de la tabla
+EXCEL_HEADER_SCAN_ROWS = 20
+
+
+def sniff_csv_format(sample: bytes):
+    """
+    Detecta encoding y separador a partir de una muestra del inicio del archivo.
+
+    - Encoding: si la muestra es UTF-8 válido se usa 'utf-8-sig' (quita el BOM),
+      si no, 'latin-1'.
+    - Separador: el que más se repite en el encabezado (',' o ';'), ignorando
+      lo que está entre comillas. En empate gana ','.
+
+    Returns:
+        tuple: (encoding, separador)
+    """
+    # El decoder incremental tolera que la muestra corte un carácter multibyte al final
+    try:
+        text = codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=False)
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError:
+        text = sample.decode('latin-1')
+        encoding = 'latin-1'
+
+    header = text.splitlines()[0] if text else ""
+
+    counts = {',': 0, ';': 0}
+    in_quotes = False
+    for char in header:
+        if char == '"':
+            in_quotes = not in_quotes
+        elif not in_quotes and char in counts:
+            counts[char] += 1
+
+    sep = ';' if counts[';'] > counts[','] else ','
+    return encoding, sep
+
+
+def _read_csv(file, encoding, sep, error_mode, engine):
+    """
+    Parsea el CSV completo en una sola llamada con los parámetros ya detectados.
+    (Leerlo por bloques y concatenarlos tendría en memoria los bloques y la
+    copia final a la vez: para acotar memoria está iter_csv_chunks.)
+    """
+    file.seek(0)
+    return pd.read_csv(
+        file,
+        sep=sep,
+        encoding=encoding,
+        dtype=str,
+        encoding_errors=error_mode,
+        on_bad_lines='skip',
+        engine=engine,
+    )
+
+
+def read_csv_to_dataframe(file):
+    """
+    Lee un CSV detectando encoding y separador UNA sola vez sobre una muestra,
+    y luego lo parsea con el motor C.
+    """
+    # Usamos el stream binario subyacente (FileStorage no declara 'mode' y pandas
+    # lo trataría como texto UTF-8 ignorando el encoding detectado)
+    stream = getattr(file, 'stream', file)
+    stream.seek(0)
+    sample = stream.read(CSV_SNIFF_BYTES)
+    encoding, sep = sniff_csv_format(sample)
+
+    # 1. Lo detectado, con el motor C (el caso normal: una sola pasada).
+    # 2. Si UTF-8 falla más allá de la muestra, el archivo es Latin-1.
+    # 3. El "Salvavidas" para archivos corruptos (como el del 0x8d): cp1252 con
+    #    'replace' y el motor python, que es más tolerante con filas mal formadas.
+    attempts = [(encoding, sep, 'strict', 'c')]
+    if encoding != 'latin-1':
+        attempts.append(('latin-1', sep, 'strict', 'c'))
+    attempts.append(('cp1252', sep, 'replace', 'python'))
+
+    last_error = None
+
+    for attempt_encoding, attempt_sep, error_mode, engine in attempts:
+        try:
+            return _read_csv(stream, attempt_encoding, attempt_sep, error_mode, engine)
+        except (UnicodeDecodeError, ParserError, Exception) as e:
+            last_error = e
+            continue
+
+    raise ValueError(f"No se pudo leer el archivo CSV. Último error: {last_error}")
+
+
+def iter_csv_chunks(stream, chunk_rows=CSV_CHUNK_ROWS, encoding=None):
+    """
+    Recorre un CSV en bloques de DataFrames (dtype=str) sin cargarlo completo.
+    El separador (y el encoding, si no se indica) se detectan sobre una muestra.
+    """
+    stream.seek(0)
+    sample = stream.read(CSV_SNIFF_BYTES)
+    stream.seek(0)
+    sniffed_encoding, sep = sniff_csv_format(sample)
+
+    reader = pd.read_csv(
+        stream,
+        sep=sep,
+        encoding=encoding or sniffed_encoding,
+        dtype=str,
+        on_bad_lines='skip',
+        engine='c',
+        chunksize=chunk_rows,
+    )
+    with reader:
+        yield from reader
+
+
+def iter_parquet_tables(stream, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Recorre un Parquet en tablas Arrow de hasta 'chunk_rows' filas, sin pandas.
+    Un archivo sin filas entrega una tabla vacía para que igual se escriba el esquema.
+    """
+    import pyarrow as pa
+
+    parquet_file = pq.ParquetFile(stream)
+    empty = True
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        empty = False
+        yield pa.Table.from_batches([batch])
+    if empty:
+        yield parquet_file.schema_arrow.empty_table()
+
+
+def _excel_cell_to_str(value):
+    """
+    Convierte una celda de openpyxl al mismo texto que pd.read_excel(dtype=str):
+    los números enteros guardados como float quedan sin ".0" y las celdas
+    vacías quedan como NaN.
+    """
+    if value is None:
+        return math.nan
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _filled_width(row):
+    """
+    Ancho de la fila sin las celdas vacías del final.
+    """
+    width = len(row)
+    while width and row[width - 1] in (None, ""):
+        width -= 1
+    return width
+
+
+def _excel_header(cells, width):
+    """
+    Nombres de columna como los arma pandas: celdas vacías -> "Unnamed: i" y
+    repetidos con sufijo (".1", ".2", ...).
+    """
+    cells = list(cells) + [None] * (width - len(cells))
+    header = []
+    seen = {}
+    for i, value in enumerate(cells[:width]):
+        name = f"Unnamed: {i}" if value in (None, "") else _excel_cell_to_str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        header.append(name)
+    return header
+
+
+def _detect_excel_header(rows):
+    """
+    Elige la fila de encabezado entre las primeras filas de la hoja: la primera
+    fila con valores, como pd.read_excel. Solo se saltan las filas iniciales
+    claramente más angostas que la siguiente (un título o una fila de filtros:
+    a lo sumo la mitad de celdas con valor y al menos dos menos), para no
+    perder un encabezado real con alguna columna sin nombre.
+
+    Returns:
+        int: Índice (0-based) dentro de 'rows', o None si todas están vacías.
+    """
+    filled = [(i, sum(1 for value in row if value not in (None, "")))
+              for i, row in enumerate(rows)]
+    filled = [(i, count) for i, count in filled if count]
+    for (i, count), (_, next_count) in zip(filled, filled[1:]):
+        if not (count * 2 <= next_count and count <= next_count - 2):
+            return i
+    return filled[-1][0] if filled else None
+
+
+def iter_excel_chunks(stream, chunk_rows=CSV_CHUNK_ROWS, sheet_name=None, header_row=None):
+    """
+    Recorre una hoja .xlsx en bloques de DataFrames (texto, como dtype=str)
+    usando openpyxl en modo read_only: las filas se leen en streaming desde el
+    XML, sin construir el modelo de objetos del libro completo.
+
+    Args:
+        sheet_name (str): Hoja a leer. Por defecto, la primera.
+        header_row (int): Fila del encabezado tal como se ve en Excel (1 = primera).
+            Si no se indica, es la primera fila con valores, salvo títulos o
+            filtros más angostos que la fila siguiente (ver _detect_excel_header).
+
+    Las filas totalmente vacías se omiten. El ancho de la tabla se fija con el
+    encabezado y las EXCEL_HEADER_SCAN_ROWS filas siguientes; celdas más a la
+    derecha en filas posteriores se ignoran.
+    """
+    from openpyxl import load_workbook
+
+    stream.seek(0)
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        if sheet_name is None:
+            worksheet = workbook.worksheets[0]
+        elif sheet_name in workbook.sheetnames:
+            worksheet = workbook[sheet_name]
+        else:
+            raise ValueError(
+                f"La hoja '{sheet_name}' no existe. Hojas disponibles: {', '.join(workbook.sheetnames)}")
+
+        # Muchos exports traen mal la dimensión declarada (ej: "A1"): se ignora
+        # y se recorre la hoja hasta la última fila real
+        worksheet.reset_dimensions()
+        rows = worksheet.iter_rows(values_only=True)
+
+        if header_row is not None:
+            for _ in range(header_row - 1):
+                next(rows, None)
+            header_cells = next(rows, None) or ()
+            pending = [row for _, row in zip(range(EXCEL_HEADER_SCAN_ROWS), rows)]
+        else:
+            scanned = [row for _, row in zip(range(EXCEL_HEADER_SCAN_ROWS), rows)]
+            index = _detect_excel_header(scanned)
+            header_cells = scanned[index] if index is not None else ()
+            pending = scanned[index + 1:] if index is not None else []
+
+        # El ancho sale del encabezado y de las primeras filas de datos: una
+        # columna con datos pero sin nombre queda como "Unnamed: i"
+        width = max([_filled_width(header_cells), *map(_filled_width, pending)])
+        columns = _excel_header(header_cells, width)
+
+        def data_rows():
+            for row in pending:
+                yield row
+            yield from rows
+
+        batch = []
+        yielded = False
+        for row in data_rows():
+            row = row[:width]
+            if all(value in (None, "") for value in row):
+                continue
+            values = [_excel_cell_to_str(value) for value in row]
+            values.extend([math.nan] * (width - len(values)))
+            batch.append(values)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+                yielded = True
+                batch = []
+
+        # Una hoja con solo encabezado igual entrega un bloque (vacío) con las columnas
+        if batch or not yielded:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+
+def _read_xls(stream, sheet_name=None, header_row=None):
+    stream.seek(0)
+    return pd.read_excel(
+        stream, dtype=str,
+        sheet_name=sheet_name if sheet_name is not None else 0,
+        header=header_row - 1 if header_row is not None else 0)
+
+
+def read_excel_to_dataframe(file, sheet_name=None, header_row=None):
+    """
+    Lee un Excel completo a un DataFrame de texto.
+    .xlsx usa el lector en streaming (iter_excel_chunks); el formato antiguo
+    .xls no lo soporta openpyxl y sigue por pd.read_excel.
+    """
+    stream = getattr(file, 'stream', file)
+    filename = getattr(file, 'filename', '') or ''
+
+    if filename.lower().endswith('.xls'):
+        return _read_xls(stream, sheet_name, header_row)
+
+    chunks = list(iter_excel_chunks(stream, sheet_name=sheet_name, header_row=header_row))
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def iter_file_chunks(stream, filename, chunk_rows=CSV_CHUNK_ROWS, encoding=None,
+                     sheet_name=None, header_row=None):
+    """
+    Recorre un archivo (CSV, Excel, Parquet) en bloques de DataFrames.
+
+    Pensado para archivos que ya están en GCS (stream = blob.open('rb')):
+    - CSV: bloques de 'chunk_rows' filas.
+    - Parquet: lotes de 'chunk_rows' filas leídos row group a row group.
+    - Excel (.xlsx): bloques de 'chunk_rows' filas en streaming; 'sheet_name' y
+      'header_row' eligen hoja y encabezado (ver iter_excel_chunks).
+      El formato antiguo .xls se entrega en un solo bloque.
+    """
+    name = filename.lower()
+
+    if name.endswith('.csv'):
+        yield from iter_csv_chunks(stream, chunk_rows=chunk_rows, encoding=encoding)
+
+    elif name.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(stream)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+
+    elif name.endswith('.xlsx'):
+        yield from iter_excel_chunks(
+            stream, chunk_rows=chunk_rows, sheet_name=sheet_name, header_row=header_row)
+
+    elif name.endswith('.xls'):
+        yield _read_xls(stream, sheet_name, header_row)
+
+    else:
+        raise ValueError("Formato de archivo no soportado.")
+
+
+def read_file_to_dataframe(file, sheet_name=None, header_row=None):
     """
     Lee un archivo (CSV, Excel, Parquet) devolviendo un DataFrame.
     Maneja errores de encoding y filas mal formadas.
+    'sheet_name' y 'header_row' solo aplican a Excel (ver iter_excel_chunks).
     """
     file.seek(0)
     filename = file.filename.lower()
 
     try:
-        if filename.endswith('.csv'):
-            # Modificamos la lista para incluir el 'modo de error'.
-            # 1. Intentamos STRICT primero. Si es Latin-1, UTF-8 strict fallará (que es lo que queremos)
-            #    y pasará al siguiente.
-            # 2. Dejamos una opción final con 'replace' por si es un archivo basura (como el del error 0x8d).
-            attempts = [
-                # (encoding, separador, comportamiento_error)
-                ('utf-8-sig', ',', 'strict'),
-                ('utf-8-sig', ';', 'strict'),
-                ('latin-1', ',', 'strict'),
-                ('latin-1', ';', 'strict'),
-                # El "Salvavidas" para tu archivo corrupto anterior (el del 0x8d):
-                ('cp1252', ';', 'replace'), 
-                ('cp1252', ',', 'replace')
-            ]
-
-            last_error = None
-
-            for encoding, sep, error_mode in attempts:
-                try:
-                    file.seek(0)
-                    
-                    df = pd.read_csv(
-                        file, 
-                        sep=sep, 
-                        encoding=encoding, 
-                        dtype=str,
-                        encoding_errors=error_mode,
-                        on_bad_lines='skip', 
-                        engine='python' 
-                    )
-
-                    # Validación de falso positivo con coma
-                    if sep == ',':
-                        if len(df.columns) > 0 and ';' in str(df.columns[0]):
-                            raise ParserError("Falso positivo con coma: El encabezado contiene ';'")
-
-                    return df
-
-                except (UnicodeDecodeError, ParserError, Exception) as e:
-                    last_error = e
-                    continue 
-
-            raise ValueError(f"No se pudo leer el archivo CSV. Último error: {last_error}")
-
-        elif filename.endswith(('.xls', '.xlsx')):
-            return pd.read_excel(file, dtype=str)
-
-        elif filename.endswith('.parquet'):
-            return pd.read_parquet(file)
+        with metrics.span("parse") as span:
+            if filename.endswith('.csv'):
+                df = read_csv_to_dataframe(file)
 
-        else:
-            raise ValueError("Formato de archivo no soportado.")
+            elif filename.endswith(('.xls', '.xlsx')):
+                df = read_excel_to_dataframe(file, sheet_name=sheet_name, header_row=header_row)
+
+            elif filename.endswith('.parquet'):
+                df = pd.read_parquet(file)
+
+            else:
+                raise ValueError("Formato de archivo no soportado.")
+
+            span.add(rows=len(df))
+            return df
 
     except Exception as e:
-        raise ValueError(f"Error procesando el archivo: {str(e)}")
\ No newline at end of file
+        raise ValueError(f"Error procesando el archivo: {str(e)}")
@@ -0,0 +1,84 @@
+import decimal
+import uuid
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: sin ella se usa el encoder de la stdlib
+    orjson = None
+
+
+def _default(value):
+    """
+    Tipos que orjson no serializa solo. Mismo resultado que el provider de
+    Flask (fechas en formato HTTP), más NaT/NA de pandas como null.
+    """
+    if isinstance(value, date):
+        if value != value:  # pd.NaT
+            return None
+        return http_date(value)
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+    if value is not None and type(value).__name__ == "NAType":  # pd.NA
+        return None
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Provider JSON de la app basado en orjson: bastante más rápido que la
+    stdlib y entiende numpy (escalares y arreglos) y NaN (-> null) sin
+    preprocesar los datos. Si orjson no está instalado se comporta igual que
+    el provider por defecto de Flask.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self._dump_bytes(obj).decode()
+
+    def _dump_bytes(self, obj):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_default, option=option)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dump_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+
+def dataframe_records_json(df) -> bytes:
+    """
+    Serializa el DataFrame como lista de objetos ([{col: valor}, ...]) en C,
+    columna a columna, sin armar un dict de Python por fila. NaN/NaT/None e
+    infinitos quedan como null y las fechas en ISO 8601.
+
+    Con columnas repetidas (to_json no las admite) queda la última, igual que
+    con to_dict(orient="records").
+    """
+    if not df.columns.is_unique:
+        df = df.loc[:, ~df.columns.duplicated(keep="last")]
+    return df.to_json(
+        orient="records", force_ascii=False, double_precision=15, date_format="iso"
+    ).encode()
+
+
+def dataframe_json_response(payload: dict, key: str, df):
+    """
+    Respuesta JSON con 'payload' y, en 'key', las filas del DataFrame
+    serializadas con dataframe_records_json (se insertan ya codificadas).
+    """
+    from flask import current_app
+
+    head = current_app.json.dumps(payload).encode().rstrip()
+    separator = b"," if payload else b""
+    body = b"".join([head[:-1], separator, current_app.json.dumps(key).encode(),
+                     b":", dataframe_records_json(df), b"}\n"])
+    return current_app.response_class(body, mimetype="application/json")
@@ -0,0 +1,338 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Límites (segundos) de los histogramas de latencia. +Inf se agrega al exponer.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+PREFIX = "llevar"
+
+logger = logging.getLogger(__name__)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.sum += seconds
+        self.count += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """
+    Registro en memoria de histogramas de latencia y contadores por etiqueta.
+
+    Es por proceso: con varios workers de gunicorn cada uno expone lo suyo
+    (igual que las cachés en memoria).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (nombre, etiquetas) -> _Histogram
+        self._counters = {}    # (nombre, etiquetas) -> float
+        self._help = {}
+        self._collectors = []
+
+    def observe(self, name, seconds, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+                self._help.setdefault(name, help_text)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._help.setdefault(name, help_text)
+
+    def register_collector(self, func):
+        """
+        Agrega una fuente de métricas que se lee al exponer (ej: cachés, cola
+        de logs). 'func()' devuelve tuplas (nombre, tipo, ayuda, etiquetas, valor).
+        """
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        """
+        Texto en el formato de exposición de Prometheus (text/plain 0.0.4).
+        """
+        families = {}  # nombre -> (tipo, ayuda, [líneas])
+
+        def family(name, kind, help_text):
+            return families.setdefault(name, (kind, help_text, []))[2]
+
+        with self._lock:
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                lines = family(name, "histogram", self._help.get(name, ""))
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {histogram.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self._counters.items()):
+                family(name, "counter", self._help.get(name, "")).append(
+                    f"{name}{_labels(labels)} {_number(value)}")
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                # Una fuente rota no debe tumbar /metrics
+                logger.exception("Colector de métricas falló.")
+                continue
+            for name, kind, help_text, labels, value in samples:
+                family(name, kind, help_text).append(
+                    f"{name}{_labels(tuple(sorted(labels.items())))} {_number(value)}")
+
+        out = []
+        for name, (kind, help_text, lines) in families.items():
+            if help_text:
+                out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in items)
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = MetricsRegistry()
+
+
+# ---------------------------------------------------------------------------
+# Etapas (spans)
+# ---------------------------------------------------------------------------
+
+STAGE_SECONDS = f"{PREFIX}_stage_duration_seconds"
+STAGE_ROWS = f"{PREFIX}_stage_rows_total"
+STAGE_BYTES = f"{PREFIX}_stage_bytes_total"
+STAGE_ERRORS = f"{PREFIX}_stage_errors_total"
+
+
+def _request_timings():
+    """
+    Lista de (etapa, segundos) de la request actual, o None fuera de una
+    request (ej: jobs en segundo plano).
+    """
+    from flask import g, has_request_context
+
+    if not has_request_context():
+        return None
+    timings = g.get("_stage_timings")
+    if timings is None:
+        timings = g._stage_timings = []
+    return timings
+
+
+def record(stage, seconds, rows=None, nbytes=None, error=False):
+    """
+    Registra una etapa ya medida: histograma de latencia, contadores de filas
+    y bytes, y su aporte al header Server-Timing de la request en curso.
+    """
+    registry.observe(STAGE_SECONDS, seconds, "Duración de cada etapa del backend.", stage=stage)
+    if rows:
+        registry.inc(STAGE_ROWS, rows, "Filas procesadas por etapa.", stage=stage)
+    if nbytes:
+        registry.inc(STAGE_BYTES, nbytes, "Bytes procesados por etapa.", stage=stage)
+    if error:
+        registry.inc(STAGE_ERRORS, 1, "Etapas que terminaron con excepción.", stage=stage)
+
+    timings = _request_timings()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+class Span:
+    """
+    Etapa en curso (ver span()). 'add' suma filas/bytes que se reportan al cerrar.
+    """
+    __slots__ = ("stage", "rows", "nbytes")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.rows = 0
+        self.nbytes = 0
+
+    def add(self, rows=0, nbytes=0):
+        self.rows += rows or 0
+        self.nbytes += nbytes or 0
+
+
+@contextmanager
+def span(stage, rows=None, nbytes=None):
+    """
+    Mide un bloque como una etapa:
+
+        with metrics.span("parse") as s:
+            df = ...
+            s.add(rows=len(df))
+    """
+    current = Span(stage)
+    current.add(rows, nbytes)
+    started = time.perf_counter()
+    error = False
+    try:
+        yield current
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(stage, time.perf_counter() - started, current.rows, current.nbytes, error)
+
+
+def timed(stage):
+    """
+    Decorador: mide cada llamada a la función como la etapa 'stage'.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TimedStream:
+    """
+    Envuelve un archivo (ej: blob.open('wb'/'rb') de GCS) y acumula el tiempo
+    y los bytes de sus read/write/close. Al cerrarse registra UNA observación
+    de 'stage': así la subida/descarga se separa del trabajo de CPU que la
+    intercala (codificar o decodificar Parquet).
+    """
+
+    def __init__(self, stream, stage):
+        self._stream = stream
+        self._stage = stage
+        self._seconds = 0.0
+        self._bytes = 0
+        self._recorded = False
+
+    def _timed(self, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    def read(self, *args):
+        data = self._timed(self._stream.read, *args)
+        self._bytes += len(data or b"")
+        return data
+
+    def readinto(self, buffer):
+        count = self._timed(self._stream.readinto, buffer)
+        self._bytes += count or 0
+        return count
+
+    def write(self, data):
+        written = self._timed(self._stream.write, data)
+        self._bytes += len(data)
+        return written
+
+    def _record(self, error=False):
+        if not self._recorded:
+            self._recorded = True
+            record(self._stage, self._seconds, nbytes=self._bytes, error=error)
+
+    def close(self):
+        try:
+            self._timed(self._stream.close)
+        finally:
+            self._record()
+
+    def __enter__(self):
+        self._stream.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            return self._timed(self._stream.__exit__, exc_type, exc_val, exc_tb)
+        finally:
+            self._record(error=exc_type is not None)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+# ---------------------------------------------------------------------------
+# Integración con Flask
+# ---------------------------------------------------------------------------
+
+HTTP_SECONDS = f"{PREFIX}_http_request_duration_seconds"
+
+
+def init_app(app, server_timing=True):
+    """
+    Registra la medición de cada request (histograma por endpoint) y, si
+    'server_timing', el header Server-Timing con las etapas de la request.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_timer(response):
+        started = g.get("_request_started")
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+
+        # La regla (no la URL) mantiene acotada la cantidad de series
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        registry.observe(HTTP_SECONDS, elapsed, "Duración de las requests HTTP.",
+                         method=request.method, endpoint=endpoint,
+                         status=str(response.status_code))
+
+        if server_timing:
+            totals = {}
+            for stage, seconds in g.get("_stage_timings") or ():
+                totals[stage] = totals.get(stage, 0.0) + seconds
+            entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in totals.items()]
+            entries.append(f"total;dur={elapsed * 1000:.1f}")
+            response.headers.add("Server-Timing", ", ".join(entries))
+        return response
+
+
+@registry.register_collector
+def _cache_samples():
+    from app.utils.cache import all_caches
+
+    for cache in all_caches():
+        stats = cache.stats()
+        labels = {"cache": stats["name"] or "unnamed"}
+        yield f"{PREFIX}_cache_hits_total", "counter", "Aciertos de caché.", labels, stats["hits"]
+        yield f"{PREFIX}_cache_misses_total", "counter", "Fallos de caché.", labels, stats["misses"]
+        yield (f"{PREFIX}_cache_coalesced_total", "counter",
+               "Cargas que esperaron a otra en curso (single-flight).", labels, stats["coalesced"])
+        yield f"{PREFIX}_cache_entries", "gauge", "Entradas en caché.", labels, stats["size"]
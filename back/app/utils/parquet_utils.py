@@ -0,0 +1,333 @@
+import functools
+import math
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Operadores de los filtros "columna:operador:valor" de la búsqueda en preview-latest
+FILTER_OPERATORS = {
+    "eq": lambda field, value: field == value,
+    "ne": lambda field, value: field != value,
+    "lt": lambda field, value: field < value,
+    "le": lambda field, value: field <= value,
+    "gt": lambda field, value: field > value,
+    "ge": lambda field, value: field >= value,
+}
+# Separador de valores del operador 'in' (ej: 'estado:in:A|B|C')
+IN_SEPARATOR = "|"
+
+
+def plan_row_groups(metadata, offset: int, limit: int):
+    """
+    Calcula qué row groups de un Parquet cubren el rango [offset, offset + limit).
+
+    Args:
+        metadata (pyarrow.parquet.FileMetaData): Metadata del archivo (footer).
+        offset (int): Fila inicial (0-based).
+        limit (int): Cantidad máxima de filas.
+
+    Returns:
+        list: Tuplas (indice_row_group, inicio_dentro_del_grupo, largo).
+    """
+    plan = []
+    if limit <= 0:
+        return plan
+
+    end = offset + limit
+    group_start = 0
+
+    for i in range(metadata.num_row_groups):
+        group_rows = metadata.row_group(i).num_rows
+        group_end = group_start + group_rows
+
+        # Solo nos interesan los grupos que se cruzan con el rango pedido
+        if group_end > offset and group_start < end:
+            start_in_group = max(offset - group_start, 0)
+            stop_in_group = min(end, group_end) - group_start
+            plan.append((i, start_in_group, stop_in_group - start_in_group))
+
+        if group_end >= end:
+            break
+        group_start = group_end
+
+    return plan
+
+
+def iter_parquet_page(parquet_file: pq.ParquetFile, offset: int, limit: int, columns=None):
+    """
+    Lee SOLO los row groups necesarios para devolver la página pedida.
+    Entrega un pyarrow.Table por cada row group tocado (ya recortado).
+    """
+    for index, start, length in plan_row_groups(parquet_file.metadata, offset, limit):
+        table = parquet_file.read_row_group(index, columns=columns)
+        yield table.slice(start, length)
+
+
+def _check_column(schema, name):
+    if schema.get_field_index(name) < 0:
+        raise ValueError(f"Columna inexistente: '{name}'.")
+    return schema.field(name)
+
+
+def _cast_value(value, field):
+    try:
+        return pa.scalar(value).cast(field.type)
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+        raise ValueError(f"El valor '{value}' no es válido para la columna '{field.name}' ({field.type}).")
+
+
+def _contains(field, value, dtype):
+    # contains compara como texto, sin distinguir mayúsculas
+    if not pa.types.is_string(dtype) and not pa.types.is_large_string(dtype):
+        field = field.cast(pa.string())
+    return pc.match_substring(field, value, ignore_case=True)
+
+
+def parse_filter(spec: str, schema: pa.Schema) -> pc.Expression:
+    """
+    Convierte un filtro 'columna:operador:valor' en una expresión de pyarrow.
+
+    Operadores: eq, ne, lt, le, gt, ge (el valor se castea al tipo de la
+    columna; en columnas de texto el rango es lexicográfico), in (valores
+    separados por '|') y contains (subcadena, sin distinguir mayúsculas).
+    Las comparaciones (no 'contains') aprovechan las estadísticas de los
+    row groups para saltarse los que no pueden cumplirse.
+
+    Raises:
+        ValueError: Si el filtro está mal formado o la columna no existe.
+    """
+    name, _, rest = spec.partition(":")
+    operator, sep, value = rest.partition(":")
+    if not name or not sep:
+        raise ValueError(f"Filtro inválido '{spec}': use 'columna:operador:valor'.")
+    field = _check_column(schema, name)
+    operator = operator.lower()
+
+    if operator == "contains":
+        return _contains(pc.field(name), value, field.type)
+    if operator == "in":
+        values = pa.array([_cast_value(v, field).as_py() for v in value.split(IN_SEPARATOR)], type=field.type)
+        return pc.field(name).isin(values)
+    if operator not in FILTER_OPERATORS:
+        raise ValueError(
+            f"Operador '{operator}' no soportado. Use: {', '.join([*FILTER_OPERATORS, 'in', 'contains'])}.")
+    return FILTER_OPERATORS[operator](pc.field(name), _cast_value(value, field))
+
+
+def build_scan_filter(filters, search, schema: pa.Schema):
+    """
+    Combina (AND) los filtros 'columna:operador:valor' y la búsqueda libre
+    'search' (contains en cualquier columna de texto). None si no hay nada.
+    """
+    expressions = [parse_filter(spec, schema) for spec in filters or []]
+    if search:
+        text_columns = [f.name for f in schema
+                        if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)]
+        matches = [_contains(pc.field(name), search, schema.field(name).type) for name in text_columns]
+        if not matches:
+            return pc.scalar(False)
+        expressions.append(functools.reduce(lambda a, b: a | b, matches))
+    if not expressions:
+        return None
+    return functools.reduce(lambda a, b: a & b, expressions)
+
+
+def parse_sort(spec: str, schema: pa.Schema):
+    """
+    'col1,-col2' -> [('col1', 'ascending'), ('col2', 'descending')].
+    """
+    keys = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        order = "descending" if item.startswith("-") else "ascending"
+        name = item.lstrip("+-")
+        _check_column(schema, name)
+        keys.append((name, order))
+    return keys
+
+
+# Columna interna con la posición de cada fila en el archivo (ver scan_page)
+ROW_ID_COLUMN = "__row_id"
+_MATCH_COLUMN = "__match"
+
+
+def _scan_with_row_ids(source, columns, expression, batch_size):
+    """
+    Recorre 'source' y entrega tablas con 'columns' más ROW_ID_COLUMN, solo
+    con las filas que cumplen 'expression'.
+
+    El filtro se evalúa como una columna más de la proyección (no en el scan)
+    para no perder la posición de cada fila. En Parquet se recorre row group
+    por row group y los que las estadísticas descartan no se leen.
+    """
+    projection = {name: pc.field(name) for name in columns}
+    if expression is not None:
+        projection[_MATCH_COLUMN] = expression
+    # Un solo thread: el lector de GCS es un archivo de Python, no admite lecturas en paralelo
+    options = dict(columns=projection, batch_size=batch_size, use_threads=False)
+
+    if isinstance(source, ds.Fragment):
+        metadata = source.metadata
+        starts = np.cumsum([0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)])
+        scans = [(ds.Scanner.from_fragment(piece, **options), int(starts[piece.row_groups[0].id]))
+                 for piece in source.split_by_row_group(expression)]
+    else:
+        scans = [(ds.dataset(source).scanner(**options), 0)]
+
+    for scanner, start in scans:
+        for batch in scanner.to_batches():
+            table = pa.Table.from_batches([batch]).append_column(
+                ROW_ID_COLUMN, pa.array(np.arange(start, start + batch.num_rows)))
+            start += batch.num_rows
+            if expression is not None:
+                table = table.filter(table.column(_MATCH_COLUMN)).drop_columns(_MATCH_COLUMN)
+            yield table
+
+
+def scan_page(source, offset: int, limit: int, columns=None, expression=None, sort_keys=None,
+              batch_size=64_000):
+    """
+    Recorre 'source' (fragmento Parquet o pyarrow.Table) aplicando proyección
+    y filtro, y devuelve la página [offset, offset + limit) de las filas que
+    cumplen. Solo se leen las columnas pedidas, las del filtro y las del
+    orden; los row groups descartados por estadísticas no se descargan.
+
+    Sin orden se guardan solo las filas de la página. Con orden se mantiene
+    un top-(offset + limit) acumulado batch a batch (nunca todo el resultado);
+    los empates se resuelven por posición en el archivo.
+
+    Returns:
+        tuple: (total de filas que cumplen, pyarrow.Table con la página,
+        row_ids: posición en el archivo de cada fila de la página).
+    """
+    schema = source.physical_schema if isinstance(source, ds.Fragment) else source.schema
+    columns = list(columns or schema.names)
+    sort_keys = sort_keys or []
+    scan_columns = columns + [name for name, _ in sort_keys if name not in columns]
+    empty = pa.schema([schema.field(name) for name in scan_columns]
+                      + [pa.field(ROW_ID_COLUMN, pa.int64())]).empty_table()
+
+    total = 0
+    end = offset + limit
+    tables = _scan_with_row_ids(source, scan_columns, expression, batch_size)
+    if not sort_keys:
+        pieces = [empty]
+        for table in tables:
+            start = total
+            total += table.num_rows
+            if total > offset and start < end:
+                lo = max(offset - start, 0)
+                pieces.append(table.slice(lo, min(end, total) - start - lo))
+        page = pa.concat_tables(pieces)
+    else:
+        keys = sort_keys + [(ROW_ID_COLUMN, "ascending")]
+        best = empty
+        for table in tables:
+            if not table.num_rows:
+                continue
+            total += table.num_rows
+            table = pa.concat_tables([best, table])
+            if table.num_rows > end:
+                table = table.take(pc.select_k_unstable(table, k=end, sort_keys=keys))
+            best = table
+        page = best.sort_by(keys).slice(offset, limit)
+
+    return total, page.select(columns), page.column(ROW_ID_COLUMN).to_pylist()
+
+
+def json_safe_value(value):
+    """
+    Convierte valores que JSON no soporta (NaN/Infinity) en None.
+    """
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    return value
+
+
+def _set_constant_columns(table: pa.Table, values: dict) -> pa.Table:
+    for name, value in values.items():
+        index = table.schema.get_field_index(name)
+        field = table.schema.field(index)
+        table = table.set_column(index, field, pa.repeat(pa.scalar(value, type=field.type), table.num_rows))
+    return table
+
+
+def apply_parquet_delta(parquet_file: pq.ParquetFile, writer: pq.ParquetWriter, updates: dict,
+                        deletes: set, inserted=None, constant_columns=None) -> dict:
+    """
+    Escribe en 'writer' una nueva versión del Parquet con los cambios aplicados.
+
+    Los row groups sin cambios se copian en Arrow (sin pasar por pandas ni por
+    la limpieza); solo los grupos con filas editadas o borradas se modifican.
+    Las filas nuevas se agregan al final.
+
+    Args:
+        updates (dict): row_id -> {columna: valor} (valores ya limpios).
+        deletes (set): row_id de las filas a eliminar.
+        inserted (pyarrow.Table): Filas nuevas con el esquema del archivo, o None.
+        constant_columns (dict): columna -> valor que se fija en TODAS las filas
+            escritas (ej: year/month/day de la partición de destino).
+
+    Returns:
+        dict: rows (filas escritas), row_groups, row_groups_rewritten,
+        before (row_id -> fila original) y after (row_id -> fila editada).
+    """
+    schema = parquet_file.schema_arrow
+    constant_columns = constant_columns or {}
+    before, after = {}, {}
+    rows = rewritten = 0
+    group_start = 0
+
+    for i in range(parquet_file.metadata.num_row_groups):
+        group_rows = parquet_file.metadata.row_group(i).num_rows
+        group_end = group_start + group_rows
+        group_updates = {r - group_start: v for r, v in updates.items() if group_start <= r < group_end}
+        group_deletes = [r - group_start for r in deletes if group_start <= r < group_end]
+
+        table = parquet_file.read_row_group(i)
+
+        if group_updates or group_deletes:
+            rewritten += 1
+            for local in list(group_updates) + group_deletes:
+                before[group_start + local] = table.slice(local, 1).to_pylist()[0]
+
+            # Solo se materializan en Python las columnas que se editaron
+            touched = {col for values in group_updates.values() for col in values}
+            for col in touched:
+                index = schema.get_field_index(col)
+                values = table.column(index).to_pylist()
+                for local, changes in group_updates.items():
+                    if col in changes:
+                        values[local] = changes[col]
+                table = table.set_column(index, schema.field(index), pa.array(values, type=schema.field(index).type))
+
+            table = _set_constant_columns(table, constant_columns)
+            for local in group_updates:
+                after[group_start + local] = table.slice(local, 1).to_pylist()[0]
+
+            if group_deletes:
+                mask = np.ones(group_rows, dtype=bool)
+                mask[group_deletes] = False
+                table = table.filter(pa.array(mask))
+        else:
+            table = _set_constant_columns(table, constant_columns)
+
+        writer.write_table(table)
+        rows += table.num_rows
+        group_start = group_end
+
+    if inserted is not None and inserted.num_rows:
+        writer.write_table(_set_constant_columns(inserted.select(schema.names).cast(schema), constant_columns))
+        rows += inserted.num_rows
+
+    return {
+        "rows": rows,
+        "row_groups": parquet_file.metadata.num_row_groups,
+        "row_groups_rewritten": rewritten,
+        "before": before,
+        "after": after,
+    }
@@ -0,0 +1,231 @@
+import collections
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+# Header que activa el perfilado de UNA request (solo header: en la query
+# string el token quedaría en los logs de acceso y en el historial)
+PROFILE_HEADER = "X-Profile"
+
+# Asignaciones (por línea) que se reportan en el resumen de memoria
+TOP_ALLOCATIONS = 10
+
+# Una sola request perfilada a la vez por proceso: tracemalloc (y su pico) es
+# global, y dos perfiles simultáneos mezclarían sus asignaciones
+_profile_slot = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class StackSampler(threading.Thread):
+    """
+    Perfilador por muestreo: cada 'interval' segundos toma el stack del thread
+    'thread_id' (sys._current_frames) y lo acumula en formato "folded"
+    (raíz;...;hoja -> cantidad), el que leen flamegraph.pl y speedscope.
+    El thread perfilado no se instrumenta: solo se le observa desde afuera.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name="request-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.stacks[_fold(frame)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _fold(frame):
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def _short_path(path):
+    # Rutas relativas a site-packages o al proyecto: más legibles en el flamegraph
+    marker = "site-packages" + os.sep
+    if marker in path:
+        return path.split(marker, 1)[1]
+    return os.path.relpath(path) if os.path.isabs(path) else path
+
+
+def _start_tracemalloc() -> bool:
+    """
+    Enciende tracemalloc (si no lo estaba) y reinicia el pico.
+    Devuelve True si lo encendió esta llamada.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    return started
+
+
+def _stop_tracemalloc(stop):
+    """
+    Devuelve (actual, pico, top de asignaciones vivas); apaga tracemalloc si 'stop'.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    top = [
+        {"where": str(stat.traceback), "size_bytes": stat.size, "count": stat.count}
+        for stat in tracemalloc.take_snapshot().statistics("lineno")[:TOP_ALLOCATIONS]
+    ]
+    if stop:
+        tracemalloc.stop()
+    return current, peak, top
+
+
+class RequestProfile:
+    """
+    Perfil de una request en curso: muestreo de stacks + tracemalloc.
+    Se crea con start(), que respeta el límite de uno a la vez por proceso.
+    """
+
+    def __init__(self, interval):
+        self.id = uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self._owns_tracemalloc = _start_tracemalloc()
+        self.sampler.start()
+
+    @classmethod
+    def start(cls, interval):
+        """
+        Returns:
+            RequestProfile: El perfil iniciado, o None si ya hay otra request
+            perfilándose en el proceso.
+        """
+        if not _profile_slot.acquire(blocking=False):
+            return None
+        try:
+            return cls(interval)
+        except BaseException:
+            _profile_slot.release()
+            raise
+
+    def finish(self, output_dir, method, path, status):
+        """
+        Detiene el perfilado y guarda '<id>.folded' (stacks) y '<id>.json' (resumen).
+
+        Returns:
+            dict: El resumen guardado.
+        """
+        try:
+            self.sampler.stop()
+            current, peak, top = _stop_tracemalloc(self._owns_tracemalloc)
+        finally:
+            _profile_slot.release()
+
+        summary = {
+            "id": self.id,
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "samples": self.sampler.samples,
+            "interval_ms": self.sampler.interval * 1000,
+            "peak_alloc_bytes": peak,
+            "retained_alloc_bytes": current,
+            "top_allocations": top,
+        }
+
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, f"{self.id}.folded"), "w") as f:
+            f.write(self.sampler.folded())
+        with open(os.path.join(output_dir, f"{self.id}.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+def is_authorized(request, token) -> bool:
+    """
+    True si la request trae el token de perfilado en el header X-Profile.
+    """
+    supplied = request.headers.get(PROFILE_HEADER)
+    return bool(token and supplied) and hmac.compare_digest(supplied.encode(), token.encode())
+
+
+def sweep_old_profiles(output_dir, max_profiles):
+    """
+    Deja solo los 'max_profiles' perfiles más recientes.
+    """
+    try:
+        names = [n for n in os.listdir(output_dir) if n.endswith(".json")]
+    except FileNotFoundError:
+        return
+    names.sort(key=lambda n: os.path.getmtime(os.path.join(output_dir, n)), reverse=True)
+    for name in names[max_profiles:]:
+        profile_id = name[:-len(".json")]
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(output_dir, profile_id + suffix))
+            except OSError:
+                pass
+
+
+def init_app(app, token, output_dir, interval, max_profiles):
+    """
+    Permite perfilar cualquier request de la app enviando el header
+    'X-Profile: <token>'. Esa request corre bajo el muestreador de stacks y
+    tracemalloc; la respuesta lleva 'X-Profile-Id' y 'X-Profile-Peak-Alloc' y
+    el perfil queda en 'output_dir'.
+
+    Solo se llama si hay token configurado: sin él no se registra ningún hook.
+    Se perfila una request a la vez por proceso; si llega otra mientras tanto
+    corre sin perfilar y responde 'X-Profile-Busy: 1'. tracemalloc es global:
+    las requests concurrentes sin perfilar también suman a la memoria medida.
+    En respuestas en streaming solo se mide hasta que empieza el cuerpo.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        if is_authorized(request, token):
+            g._profile = RequestProfile.start(interval)
+            g._profile_busy = g._profile is None
+
+    @app.after_request
+    def _finish_profile(response):
+        if g.pop("_profile_busy", False):
+            response.headers["X-Profile-Busy"] = "1"
+        profile = g.pop("_profile", None)
+        if profile is None:
+            return response
+        summary = profile.finish(output_dir, request.method, request.path, response.status_code)
+        sweep_old_profiles(output_dir, max_profiles)
+        response.headers["X-Profile-Id"] = summary["id"]
+        response.headers["X-Profile-Peak-Alloc"] = str(summary["peak_alloc_bytes"])
+        response.headers["X-Profile-Samples"] = str(summary["samples"])
+        logger.info("%s %s: %s ms, %s muestras, pico %s bytes -> %s", request.method, request.path,
+                    summary["duration_ms"], summary["samples"], summary["peak_alloc_bytes"], summary["id"])
+        return response
+
+    @app.teardown_request
+    def _abort_profile(error=None):
+        # Si la request terminó con una excepción no manejada, after_request no corre
+        profile = g.pop("_profile", None)
+        if profile is not None:
+            profile.finish(output_dir, request.method, request.path, 500)
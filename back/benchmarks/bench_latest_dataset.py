@@ -0,0 +1,69 @@
+"""
+Compara la búsqueda del dataset más reciente: escaneo completo vs. recorrido
+de particiones year=/month=/day=, sobre un GCS falso en memoria.
+
+Uso (desde back/):
+    python -m benchmarks.bench_latest_dataset --objects 10000 --page-latency-ms 80
+"""
+import argparse
+import time
+from datetime import date, timedelta
+from benchmarks.fakes import FakeStorageClient
+from app.services import storage_service
+
+
+def populate(bucket, table_path, objects):
+    """
+    Crea 'objects' particiones diarias (una por día, hacia atrás desde hoy),
+    cada una con su data.parquet.
+    """
+    start = date.today() - timedelta(days=objects - 1)
+    for i in range(objects):
+        day = start + timedelta(days=i)
+        name = f"{table_path}/year={day:%Y}/month={day:%m}/day={day:%d}/data.parquet"
+        bucket.blob(name).upload_from_string(b"PAR1")
+
+
+def measure(client, label, func, repeat, page_latency_ms):
+    client.reset_counters()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - started) / repeat
+
+    calls = client.list_calls / repeat
+    pages = client.list_pages / repeat
+    items = client.listed_items / repeat
+    estimated = elapsed + pages * page_latency_ms / 1000
+    print(f"{label:<22} {elapsed * 1000:>9.2f} ms local | {calls:>5.0f} list calls | "
+          f"{pages:>5.0f} pages | {items:>7.0f} items | ~{estimated * 1000:>8.1f} ms con red")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--page-latency-ms", type=float, default=80.0,
+                        help="Latencia estimada por página de list_blobs en GCS real.")
+    args = parser.parse_args()
+
+    client = FakeStorageClient()
+    bucket = client.bucket("raw-bench-bucket")
+    table_path = "producto/tabla"
+    populate(bucket, table_path, args.objects)
+
+    print(f"{args.objects} objetos bajo '{table_path}/'")
+    full = measure(client, "escaneo completo",
+                   lambda: storage_service._find_latest_blob_full_scan(bucket, f"{table_path}/"),
+                   args.repeat, args.page_latency_ms)
+    walk = measure(client, "recorrido particiones",
+                   lambda: storage_service._find_latest_blob(bucket, table_path),
+                   args.repeat, args.page_latency_ms)
+
+    assert full.name == walk.name, (full.name, walk.name)
+    print(f"Ambos encuentran: {walk.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Mide el arranque en frío: tiempo de import + create_app() y latencia de la
+primera request, cada corrida en un proceso Python nuevo.
+
+Uso (desde back/):
+    python -m benchmarks.bench_startup --runs 5
+
+Para comparar "antes/después", se puede medir otro checkout del backend:
+    git worktree add /tmp/before <commit> && \\
+    python -m benchmarks.bench_startup --tree /tmp/before/back
+
+Necesita GOOGLE_APPLICATION_CREDENTIALS apuntando a una llave de servicio
+(puede ser una de prueba: no se hacen llamadas de red, GCS se reemplaza por
+el doble en memoria de benchmarks.fakes).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BENCH_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código que corre en el proceso hijo. Reporta un JSON con los tiempos en ms.
+_CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+imported = time.perf_counter()
+
+from benchmarks.fakes import FakeStorageClient
+from app.config import Config
+from app.core import gcp
+
+env = Config.GCP_ENVIRONMENTS[0]
+bucket_name = env["buckets"][0]
+fake = FakeStorageClient()
+fake.bucket(bucket_name).blob("producto/tabla/data.parquet").upload_from_string(b"PAR1")
+if hasattr(gcp, "_build_storage_client"):
+    gcp._build_storage_client = lambda project_id: fake
+else:
+    # Árbol anterior: clientes creados al importar
+    for project_id in list(gcp.storage_client):
+        gcp.storage_client[project_id] = fake
+
+client = app.test_client()
+
+t0 = time.perf_counter()
+client.get("/api/storage/environments")
+t1 = time.perf_counter()
+response = client.get("/api/storage/products",
+                      query_string={"env_id": env["id"], "bucket_name": bucket_name})
+t2 = time.perf_counter()
+
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_request_ms": (t1 - t0) * 1000,
+    "first_listing_ms": (t2 - t1) * 1000,
+    "listing_status": response.status_code,
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def run_once(tree):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([tree, BENCH_ROOT, env.get("PYTHONPATH", "")])
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=tree, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout
+    # La app imprime sus propios mensajes: el resultado es la última línea
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tree", default=BENCH_ROOT,
+                        help="Carpeta back/ a medir (por defecto, la actual).")
+    args = parser.parse_args()
+
+    results = [run_once(os.path.abspath(args.tree)) for _ in range(args.runs)]
+
+    print(f"{args.runs} arranques en frío de {args.tree} (mediana)")
+    for metric in ("import_ms", "first_request_ms", "first_listing_ms"):
+        values = [r[metric] for r in results]
+        print(f"  {metric:<18} {statistics.median(values):>9.1f} ms "
+              f"(min {min(values):.1f}, max {max(values):.1f})")
+    print(f"  módulos cargados   {results[-1]['modules']:>9}")
+    print(f"  status listado     {results[-1]['listing_status']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Archivos sintéticos para los benchmarks: CSV, XLSX y Parquet con la forma de
+los exports que sube el equipo (códigos, cantidades, montos, fechas y texto
+con tildes), de tamaño configurable.
+"""
+import io
+import numpy as np
+import pandas as pd
+
+FORMATS = ("csv", "xlsx", "parquet")
+
+# Texto con tildes y ñ: ejercita la detección de encoding del CSV
+_WORDS = np.array(["Año", "Pequeño", "Camión", "Válvula", "Bodega", "Señal",
+                   "Material", "Repuesto", "Línea", "Acción"])
+
+
+def make_dataframe(rows, cols, seed=0, null_ratio=0.05):
+    """
+    DataFrame de 'rows' filas y 'cols' columnas que rotan entre texto, enteros,
+    decimales y fechas. Una fracción 'null_ratio' de cada columna queda vacía.
+    """
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 4
+        if kind == 0:
+            values = pd.Series(
+                _WORDS[rng.integers(0, len(_WORDS), rows)]) + " " + rng.integers(0, 10_000, rows).astype(str)
+        elif kind == 1:
+            values = pd.Series(rng.integers(0, 1_000_000, rows), dtype="Int64")
+        elif kind == 2:
+            values = pd.Series(np.round(rng.random(rows) * 10_000, 2))
+        else:
+            values = pd.Series(pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 730, rows), unit="D"))
+        if null_ratio:
+            values = values.mask(rng.random(rows) < null_ratio)
+        data[f"Columna {i} Código" if kind == 0 else f"col_{i}"] = values
+    return pd.DataFrame(data)
+
+
+def to_bytes(df, file_format, encoding="utf-8", sep=","):
+    """
+    Serializa el DataFrame en el formato pedido. 'encoding' y 'sep' solo
+    aplican a CSV.
+    """
+    buffer = io.BytesIO()
+    if file_format == "csv":
+        buffer.write(df.to_csv(index=False, sep=sep).encode(encoding))
+    elif file_format == "xlsx":
+        df.to_excel(buffer, index=False, engine="openpyxl")
+    elif file_format == "parquet":
+        df.to_parquet(buffer, index=False)
+    else:
+        raise ValueError(f"Formato no soportado: {file_format}")
+    return buffer.getvalue()
+
+
+def make_file(rows, cols, file_format, encoding="utf-8", sep=",", seed=0):
+    """
+    Genera un archivo sintético completo.
+
+    Returns:
+        tuple: (nombre de archivo, contenido en bytes)
+    """
+    df = make_dataframe(rows, cols, seed=seed)
+    return f"bench_{rows}x{cols}.{file_format}", to_bytes(df, file_format, encoding, sep)
@@ -0,0 +1,347 @@
+"""
+Dobles en memoria de los clientes de GCP para benchmarks locales.
+
+Implementan solo la parte de la API que usa la aplicación, y llevan la
+cuenta de las llamadas y de las páginas que GCS habría devuelto.
+"""
+import bisect
+import io
+import itertools
+import math
+import re
+from datetime import datetime, timedelta, timezone
+
+# GCS devuelve como máximo 1000 resultados por página en list_blobs
+GCS_PAGE_SIZE = 1000
+
+_clock = itertools.count()
+
+
+def _next_timestamp():
+    # Reloj monótono: cada objeto escrito es estrictamente más nuevo que el anterior
+    return datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=next(_clock))
+
+
+class FakeBlobIterator(list):
+    """
+    Resultado de list_blobs: una lista de blobs con la propiedad 'prefixes'.
+    """
+
+    def __init__(self, blobs, prefixes):
+        super().__init__(blobs)
+        self.prefixes = set(prefixes)
+
+
+class _FakeBlobWriter(io.BytesIO):
+    """
+    Emula blob.open('wb'): publica el objeto al cerrar, y lo descarta si hubo error.
+    """
+
+    def __init__(self, blob):
+        super().__init__()
+        self._blob = blob
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self._blob._publish(self.getvalue())
+        super().close()
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.time_created = None
+        self.generation = None
+        self._data = None
+
+    def _publish(self, data):
+        self._data = bytes(data)
+        self.time_created = _next_timestamp()
+        # Cada versión publicada tiene una generación nueva, como en GCS
+        self.generation = int(self.time_created.timestamp() * 1_000_000)
+        self.bucket._objects[self.name] = self
+        self.bucket._sorted_names = None
+
+    def _stored(self):
+        stored = self.bucket._objects.get(self.name)
+        if stored is None:
+            raise FileNotFoundError(f"404 No such object: {self.bucket.name}/{self.name}")
+        return stored
+
+    @property
+    def size(self):
+        return len(self._stored()._data)
+
+    def exists(self):
+        return self.name in self.bucket._objects
+
+    def reload(self):
+        self._stored()
+
+    def upload_from_string(self, data, content_type=None):
+        self._publish(data.encode() if isinstance(data, str) else data)
+
+    def upload_from_filename(self, filename, content_type=None):
+        with open(filename, "rb") as f:
+            self._publish(f.read())
+
+    def download_as_bytes(self, start=None, end=None):
+        self.bucket.client.downloads += 1
+        data = self._stored()._data
+        if start is None and end is None:
+            return data
+        return data[start or 0:(end + 1) if end is not None else None]
+
+    def open(self, mode="rb", **kwargs):
+        if "r" in mode:
+            self.bucket.client.downloads += 1
+            return io.BytesIO(self._stored()._data)
+        return _FakeBlobWriter(self)
+
+    def delete(self):
+        self._stored()
+        del self.bucket._objects[self.name]
+        self.bucket._sorted_names = None
+
+    def create_resumable_upload_session(self, origin=None, **kwargs):
+        return f"https://storage.fake/upload/{self.bucket.name}/{self.name}"
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._objects = {}
+        self._sorted_names = None
+
+    def blob(self, name):
+        return self._objects.get(name) or FakeBlob(self, name)
+
+    def get_blob(self, name):
+        return self._objects.get(name)
+
+    def list_blobs(self, prefix="", delimiter=None, **kwargs):
+        prefix = prefix or ""
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self._objects)
+        names = self._sorted_names
+
+        blobs = []
+        prefixes = set()
+        # Búsqueda binaria del rango del prefijo (como el índice ordenado de GCS)
+        index = bisect.bisect_left(names, prefix)
+        while index < len(names) and names[index].startswith(prefix):
+            name = names[index]
+            rest = name[len(prefix):]
+            if delimiter and delimiter in rest:
+                folder = prefix + rest.split(delimiter, 1)[0] + delimiter
+                prefixes.add(folder)
+                # Salta toda la "carpeta" de una vez, como hace GCS del lado del servidor
+                index = bisect.bisect_left(names, folder[:-1] + chr(ord(delimiter) + 1))
+            else:
+                blobs.append(self._objects[name])
+                index += 1
+
+        returned = len(blobs) + len(prefixes)
+        self.client.list_calls += 1
+        self.client.listed_items += returned
+        self.client.list_pages += max(1, math.ceil(returned / GCS_PAGE_SIZE))
+        return FakeBlobIterator(blobs, prefixes)
+
+
+class FakeStorageClient:
+    """
+    Reemplazo de google.cloud.storage.Client con contadores de uso.
+    """
+
+    def __init__(self, project=None):
+        self.project = project
+        self._buckets = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.list_calls = 0
+        self.list_pages = 0
+        self.listed_items = 0
+        self.downloads = 0
+
+    def bucket(self, name):
+        if name not in self._buckets:
+            self._buckets[name] = FakeBucket(self, name)
+        return self._buckets[name]
+
+
+class _FakeJob:
+    def __init__(self, output_rows=None, num_dml_affected_rows=None):
+        self.job_id = f"fake-job-{next(_clock)}"
+        self.output_rows = output_rows
+        self.num_dml_affected_rows = num_dml_affected_rows
+
+    def result(self):
+        return self
+
+
+class _FakeField:
+    def __init__(self, name, field_type="STRING", mode="NULLABLE"):
+        self.name = name
+        self.field_type = field_type
+        self.mode = mode
+
+
+class _FakeTable:
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class FakeBigQueryClient:
+    """
+    Reemplazo de google.cloud.bigquery.Client: guarda los esquemas creados y
+    cuenta las filas de las cargas leyendo el Parquet desde el GCS falso.
+    """
+
+    def __init__(self, storage_client=None):
+        self.storage_client = storage_client
+        self.tables = {}
+        self.loads = 0
+        self.queries = 0
+        # Filas de cada load_table_from_json y (query, job_config) de cada query
+        self.json_loads = []
+        self.query_log = []
+
+    def add_table(self, table_ref, columns):
+        self.tables[table_ref] = [_FakeField(name) for name in columns]
+
+    def get_table(self, table_ref):
+        from google.api_core.exceptions import NotFound
+
+        if table_ref not in self.tables:
+            raise NotFound(f"Not found: Table {table_ref}")
+        return _FakeTable(self.tables[table_ref])
+
+    def create_table(self, table, exists_ok=False):
+        table_ref = f"{table.project}.{table.dataset_id}.{table.table_id}"
+        if table_ref not in self.tables:
+            self.tables[table_ref] = [
+                _FakeField(f.name, f.field_type, f.mode) for f in table.schema]
+        return table
+
+    def delete_table(self, table_ref, not_found_ok=False):
+        self.tables.pop(table_ref, None)
+
+    def load_table_from_uri(self, uri, table_ref, job_config=None):
+        import pyarrow.parquet as pq
+
+        self.loads += 1
+        rows = 0
+        if self.storage_client is not None:
+            bucket_name, _, blob_name = uri[len("gs://"):].partition("/")
+            blob = self.storage_client.bucket(bucket_name).blob(blob_name)
+            rows = pq.ParquetFile(io.BytesIO(blob._stored()._data)).metadata.num_rows
+        return _FakeJob(output_rows=rows)
+
+    def load_table_from_json(self, rows, table_ref, job_config=None):
+        self.loads += 1
+        self.json_loads.append(list(rows))
+        return _FakeJob(output_rows=len(rows))
+
+    def query(self, query, job_config=None):
+        self.queries += 1
+        self.query_log.append((query, job_config))
+        return _FakeJob(num_dml_affected_rows=0)
+
+
+class _FakeLogEntry:
+    def __init__(self, payload, severity, timestamp):
+        self.payload = payload
+        self.severity = severity
+        self.timestamp = timestamp
+
+
+class _FakeLogBatch:
+    def __init__(self, logger):
+        self._logger = logger
+        self._entries = []
+
+    def log_struct(self, payload, severity=None, timestamp=None):
+        self._entries.append(_FakeLogEntry(payload, severity, timestamp or _next_timestamp()))
+
+    def commit(self):
+        self._logger.client.entries.extend(self._entries)
+        self._logger.client.commits += 1
+        self._entries = []
+
+
+class _FakeLogger:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def log_struct(self, payload, severity=None, timestamp=None):
+        self.client.entries.append(_FakeLogEntry(payload, severity, timestamp or _next_timestamp()))
+        self.client.commits += 1
+
+    def batch(self):
+        return _FakeLogBatch(self)
+
+
+# Condiciones del filtro de Cloud Logging que arma logging_service
+_FIELD_CONDITION = re.compile(r'jsonPayload\.(\w+)="([^"]*)"')
+_TIMESTAMP_CONDITION = re.compile(r'timestamp(>=|<=|<)"([^"]+)"')
+_TIMESTAMP_COMPARE = {
+    ">=": lambda value, bound: value >= bound,
+    "<=": lambda value, bound: value <= bound,
+    "<": lambda value, bound: value < bound,
+}
+
+
+def _parse_log_timestamp(value):
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+
+
+class FakeLoggingClient:
+    """
+    Reemplazo de google.cloud.logging.Client. list_entries aplica del filtro
+    solo las condiciones jsonPayload.<campo>="..." y timestamp (>=, <=, <), y
+    devuelve las entradas de la más nueva a la más antigua.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.commits = 0
+        self.queries = 0
+
+    def logger(self, name):
+        return _FakeLogger(self, name)
+
+    def list_entries(self, order_by=None, filter_=None, page_size=None, max_results=None):
+        self.queries += 1
+        fields = _FIELD_CONDITION.findall(filter_ or "")
+        bounds = [(_TIMESTAMP_COMPARE[op], _parse_log_timestamp(value))
+                  for op, value in _TIMESTAMP_CONDITION.findall(filter_ or "")]
+        entries = [
+            e for e in sorted(self.entries, key=lambda e: e.timestamp, reverse=True)
+            if all(isinstance(e.payload, dict) and e.payload.get(name) == value for name, value in fields)
+            and all(compare(e.timestamp, bound) for compare, bound in bounds)
+        ]
+        return iter(entries[:max_results] if max_results else entries)
+
+
+def install_fakes(storage_client=None):
+    """
+    Conecta los dobles a app.core.gcp para todos los proyectos configurados.
+
+    Returns:
+        tuple: (storage, bigquery, logging) los clientes falsos instalados.
+    """
+    from app.core import gcp
+
+    storage = storage_client or FakeStorageClient()
+    bigquery = FakeBigQueryClient(storage)
+    logging = FakeLoggingClient()
+
+    gcp._build_storage_client = lambda project_id: storage
+    gcp._logging_client = logging
+    for project_id in gcp._configured_project_ids():
+        gcp._bigquery_clients[project_id] = bigquery
+    return storage, bigquery, logging
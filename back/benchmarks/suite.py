@@ -0,0 +1,474 @@
+"""
+Suite de benchmarks de punta a punta contra dobles en memoria de GCS, BigQuery
+y Cloud Logging (benchmarks.fakes): lectura de archivos, conversión a Parquet,
+/analyze, /upload, preview-latest y save-data vía el test client de Flask.
+
+Cada escenario corre en un proceso Python nuevo, así el pico de memoria (RSS)
+es solo suyo. Reporta tiempo (mediana de --repeat corridas), pico de RSS y
+throughput (filas/s, MB/s), y guarda los resultados en JSON para comparar.
+
+Uso (desde back/):
+    python -m benchmarks.suite --rows 100000 --cols 20 --output results.json
+    python -m benchmarks.suite --only upload,save_data --compare results.json
+
+Necesita GOOGLE_APPLICATION_CREDENTIALS apuntando a una llave de servicio
+(puede ser una de prueba: no se hacen llamadas de red).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCH_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Destino usado por los escenarios (se toma el primer entorno/bucket configurado)
+PRODUCT = "producto-bench"
+TABLE = "tabla_bench"
+
+SCENARIOS = {}
+
+
+def scenario(name, per_format=False):
+    """
+    Registra un escenario. La función recibe el contexto (ver _Context) y
+    devuelve (run, before_each): 'run()' es lo que se mide y devuelve
+    (filas, bytes) procesados; 'before_each' (opcional) corre antes de cada
+    repetición sin contar en el tiempo.
+    """
+    def register(func):
+        SCENARIOS[name] = (func, per_format)
+        return func
+    return register
+
+
+# ---------------------------------------------------------------------------
+# Escenarios
+# ---------------------------------------------------------------------------
+
+def _clear_analysis_cache():
+    from app.utils import analysis_cache
+    with analysis_cache._lock:
+        analysis_cache._artifacts.clear()
+
+
+def _file_storage(ctx):
+    import io
+    from werkzeug.datastructures import FileStorage
+    return FileStorage(io.BytesIO(ctx.data), filename=ctx.filename)
+
+
+def _check(response):
+    if response.status_code >= 300:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:500]}")
+    return response
+
+
+@scenario("read_file", per_format=True)
+def bench_read_file(ctx):
+    from app.utils.file_processing import read_file_to_dataframe
+
+    def run():
+        df = read_file_to_dataframe(_file_storage(ctx))
+        return len(df), len(ctx.data)
+    return run, None
+
+
+@scenario("parquet_tempfile")
+def bench_parquet_tempfile(ctx):
+    from app.utils.file_converter import dataframe_to_parquet_tempfile
+
+    # Como en /upload: el DataFrame llega ya convertido a texto
+    df = ctx.dataframe().astype(str)
+
+    def run():
+        path = dataframe_to_parquet_tempfile(df, "bench.csv")
+        size = os.path.getsize(path)
+        os.remove(path)
+        return len(df), size
+    return run, None
+
+
+def _analyze_form(ctx, step):
+    import io
+    return {
+        "step": step,
+        "env_id": ctx.env_id,
+        "bucket_name": ctx.bucket_name,
+        "destination": f"{PRODUCT}/{TABLE}",
+        "file": (io.BytesIO(ctx.data), ctx.filename),
+    }
+
+
+@scenario("analyze_step1")
+def bench_analyze_step1(ctx):
+    def run():
+        _check(ctx.client.post("/api/storage/analyze", data=_analyze_form(ctx, "1"),
+                               content_type="multipart/form-data"))
+        return ctx.rows, len(ctx.data)
+    return run, None
+
+
+@scenario("analyze_step2", per_format=True)
+def bench_analyze_step2(ctx):
+    # Sin caché de análisis: mide el parseo completo
+    def run():
+        _check(ctx.client.post("/api/storage/analyze", data=_analyze_form(ctx, "2"),
+                               content_type="multipart/form-data"))
+        return ctx.rows, len(ctx.data)
+    return run, _clear_analysis_cache
+
+
+@scenario("analyze_step3")
+def bench_analyze_step3(ctx):
+    # Caso real: el paso 2 ya dejó el archivo en la caché de análisis
+    ctx.register_bq_table()
+    _check(ctx.client.post("/api/storage/analyze", data=_analyze_form(ctx, "2"),
+                           content_type="multipart/form-data"))
+
+    def run():
+        _check(ctx.client.post("/api/storage/analyze", data=_analyze_form(ctx, "3"),
+                               content_type="multipart/form-data"))
+        return ctx.rows, len(ctx.data)
+    return run, None
+
+
+@scenario("upload", per_format=True)
+def bench_upload(ctx):
+    import io
+
+    def run():
+        _check(ctx.client.post("/api/storage/upload", data={
+            "env_id": ctx.env_id,
+            "bucket_name": ctx.bucket_name,
+            "destination": f"{PRODUCT}/{TABLE}",
+            "file": (io.BytesIO(ctx.data), ctx.filename),
+        }, content_type="multipart/form-data"))
+        return ctx.rows, len(ctx.data)
+    return run, _clear_analysis_cache
+
+
+@scenario("preview_latest")
+def bench_preview_latest(ctx):
+    ctx.publish_dataset()
+
+    def run():
+        response = _check(ctx.client.get(
+            f"/api/storage/products/{PRODUCT}/{TABLE}/preview-latest",
+            query_string={"env_id": ctx.env_id, "bucket_name": ctx.bucket_name}))
+        return ctx.rows, len(response.get_data())
+    return run, None
+
+
+@scenario("preview_latest_arrow")
+def bench_preview_latest_arrow(ctx):
+    ctx.publish_dataset()
+
+    def run():
+        response = _check(ctx.client.get(
+            f"/api/storage/products/{PRODUCT}/{TABLE}/preview-latest",
+            query_string={"env_id": ctx.env_id, "bucket_name": ctx.bucket_name,
+                          "format": "arrow"}))
+        return ctx.rows, len(response.get_data())
+    return run, None
+
+
+@scenario("preview_latest_page")
+def bench_preview_latest_page(ctx):
+    ctx.publish_dataset()
+    limit = min(1000, ctx.rows)
+
+    def run():
+        response = _check(ctx.client.get(
+            f"/api/storage/products/{PRODUCT}/{TABLE}/preview-latest",
+            query_string={"env_id": ctx.env_id, "bucket_name": ctx.bucket_name,
+                          "offset": max(0, ctx.rows // 2 - limit), "limit": limit}))
+        return limit, len(response.get_data())
+    return run, None
+
+
+@scenario("preview_latest_query")
+def bench_preview_latest_query(ctx):
+    ctx.publish_dataset()
+
+    def run():
+        # Filtro de texto + orden: el peor caso (no hay row groups que saltar)
+        response = _check(ctx.client.get(
+            f"/api/storage/products/{PRODUCT}/{TABLE}/preview-latest",
+            query_string={"env_id": ctx.env_id, "bucket_name": ctx.bucket_name,
+                          "search": "Material 1", "sort": "-col_1", "limit": 100}))
+        return ctx.rows, len(response.get_data())
+    return run, None
+
+
+@scenario("save_data")
+def bench_save_data(ctx):
+    # El cuerpo se serializa antes: se mide el servidor, no el cliente de prueba
+    rows = ctx.dataframe().astype(str).replace({"nan": "", "NaT": "", "<NA>": ""}).to_dict("records")
+    body = json.dumps({
+        "env_id": ctx.env_id,
+        "bucket_name": ctx.bucket_name,
+        "product_name": PRODUCT,
+        "table_name": TABLE,
+        "user": "bench",
+        "rows": rows,
+        # Se mide el guardado completo, no solo el encolado
+        "sync": True,
+    }).encode()
+    del rows
+
+    def run():
+        _check(ctx.client.post("/api/storage/products/save-data", data=body,
+                               content_type="application/json"))
+        return ctx.rows, len(body)
+    return run, None
+
+
+# ---------------------------------------------------------------------------
+# Proceso hijo: corre UN escenario y reporta JSON en la última línea
+# ---------------------------------------------------------------------------
+
+class _Context:
+    def __init__(self, args, filename):
+        from app import create_app
+        from app.config import Config
+        from benchmarks.fakes import install_fakes
+
+        self.storage, self.bigquery, self.logging = install_fakes()
+        self.app = create_app()
+        self.client = self.app.test_client()
+
+        env = Config.GCP_ENVIRONMENTS[0]
+        self.env_id = env["id"]
+        self.bucket_name = env["buckets"][0]
+        self.project_id = env["project_id"]
+
+        self.rows = args.rows
+        self.filename = filename
+        with open(os.path.join(args.data_dir, filename), "rb") as f:
+            self.data = f.read()
+        self._parquet_path = os.path.join(args.data_dir, _data_filename(args, "parquet"))
+
+    def dataframe(self):
+        import pandas as pd
+        return pd.read_parquet(self._parquet_path)
+
+    def register_bq_table(self):
+        from app.services.dataset_service import resolve_raw_table
+
+        _, dataset, table = resolve_raw_table(
+            self.env_id, self.project_id, self.bucket_name, PRODUCT, TABLE)
+        columns = [str(c).lower().replace(" ", "_") for c in self.dataframe().columns]
+        self.bigquery.add_table(f"{self.project_id}.{dataset}.{table}", columns)
+
+    def publish_dataset(self):
+        from app.services import storage_service
+
+        df = self.dataframe().astype(str)
+        storage_service.upload_dataframe(
+            self.project_id, self.bucket_name, df, f"{PRODUCT}/{TABLE}")
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB; macOS, bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(args):
+    func, _ = SCENARIOS[args.child]
+    ctx = _Context(args, args.child_file)
+    run, before_each = func(ctx)
+
+    # Una corrida de calentamiento (imports diferidos, cachés de módulos)
+    if before_each:
+        before_each()
+    run()
+
+    rss_before = _peak_rss_mb()
+    times = []
+    for _ in range(args.repeat):
+        if before_each:
+            before_each()
+        started = time.perf_counter()
+        rows, nbytes = run()
+        times.append(time.perf_counter() - started)
+    rss_after = _peak_rss_mb()
+
+    wall = statistics.median(times)
+    print(json.dumps({
+        "wall_s": wall,
+        "wall_min_s": min(times),
+        "rows": rows,
+        "bytes": nbytes,
+        "rows_per_s": rows / wall if wall else None,
+        "mb_per_s": nbytes / (1024 * 1024) / wall if wall else None,
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": (rss_after - rss_before) if rss_after is not None else None,
+    }))
+
+
+# ---------------------------------------------------------------------------
+# Proceso padre: genera los archivos, lanza los escenarios y compara
+# ---------------------------------------------------------------------------
+
+def _data_filename(args, file_format):
+    variant = f"-{args.csv_encoding}-{ord(args.csv_sep)}" if file_format == "csv" else ""
+    return f"bench_{args.rows}x{args.cols}-s{args.seed}{variant}.{file_format}"
+
+
+def _prepare_data(args):
+    from benchmarks import datagen
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    df = None
+    for file_format in datagen.FORMATS:
+        path = os.path.join(args.data_dir, _data_filename(args, file_format))
+        if os.path.exists(path):
+            continue
+        if df is None:
+            df = datagen.make_dataframe(args.rows, args.cols, seed=args.seed)
+        content = datagen.to_bytes(df, file_format, args.csv_encoding, args.csv_sep)
+        with open(path, "wb") as f:
+            f.write(content)
+        print(f"Generado {path} ({len(content) / (1024 * 1024):.1f} MB)")
+
+
+def _plan(args):
+    only = set(args.only.split(",")) if args.only else None
+    formats = args.formats.split(",")
+    plan = []
+    for name, (_, per_format) in SCENARIOS.items():
+        if only and name not in only:
+            continue
+        if per_format:
+            plan.extend((f"{name}[{f}]", name, f) for f in formats)
+        else:
+            plan.append((name, name, "csv"))
+    return plan
+
+
+def _run_scenario(args, name, file_format):
+    command = [
+        sys.executable, "-m", "benchmarks.suite",
+        "--child", name, "--child-file", _data_filename(args, file_format),
+        "--data-dir", args.data_dir, "--rows", str(args.rows), "--cols", str(args.cols),
+        "--seed", str(args.seed), "--csv-encoding", args.csv_encoding,
+        "--csv-sep", args.csv_sep, "--repeat", str(args.repeat),
+    ]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([BENCH_ROOT, env.get("PYTHONPATH", "")])
+    completed = subprocess.run(command, cwd=BENCH_ROOT, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"El escenario '{name}' falló:\n{completed.stderr[-2000:]}")
+    # La app imprime sus propios mensajes: el resultado es la última línea
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_results(results):
+    print(f"\n{'escenario':<24} {'tiempo':>10} {'filas/s':>12} {'MB/s':>8} {'RSS pico':>10} {'RSS +':>9}")
+    for label, r in results.items():
+        print(f"{label:<24} {r['wall_s'] * 1000:>8.1f}ms {r['rows_per_s'] or 0:>12,.0f} "
+              f"{r['mb_per_s'] or 0:>8.1f} {r['peak_rss_mb'] or 0:>8.0f}MB {r['rss_growth_mb'] or 0:>7.0f}MB")
+
+
+def _compare(results, baseline_path, threshold):
+    """
+    Compara contra un JSON anterior. Devuelve los escenarios que empeoraron
+    más de 'threshold' (fracción) en tiempo o en pico de RSS.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\nComparación contra {baseline_path} (umbral {threshold:.0%})")
+    for label, r in results.items():
+        base = baseline.get(label)
+        if not base:
+            print(f"  {label:<24} (sin referencia)")
+            continue
+        wall_ratio = r["wall_s"] / base["wall_s"] if base["wall_s"] else 1.0
+        rss_ratio = (r["peak_rss_mb"] / base["peak_rss_mb"]
+                     if r.get("peak_rss_mb") and base.get("peak_rss_mb") else 1.0)
+        worse = wall_ratio > 1 + threshold or rss_ratio > 1 + threshold
+        if worse:
+            regressions.append(label)
+        print(f"  {label:<24} tiempo {wall_ratio - 1:>+7.1%}  RSS {rss_ratio - 1:>+7.1%}"
+              f"{'  <-- REGRESIÓN' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--cols", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--formats", default="csv,xlsx,parquet",
+                        help="Formatos para los escenarios que dependen del archivo.")
+    parser.add_argument("--csv-encoding", default="utf-8", help="Ej: utf-8, latin-1.")
+    parser.add_argument("--csv-sep", default=",")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", help=f"Escenarios separados por coma: {', '.join(SCENARIOS)}.")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "llevar-bench-data"),
+                        help="Carpeta de los archivos generados (se reutilizan entre corridas).")
+    parser.add_argument("--output", help="Ruta del JSON de resultados.")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para comparar.")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Empeoramiento tolerado al comparar (0.10 = 10%%).")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    _prepare_data(args)
+
+    results = {}
+    for label, name, file_format in _plan(args):
+        print(f"Corriendo {label}...", flush=True)
+        results[label] = _run_scenario(args, name, file_format)
+    _print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: getattr(args, k) for k in (
+                "rows", "cols", "seed", "formats", "csv_encoding", "csv_sep", "repeat")},
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResultados guardados en {args.output}")
+
+    if args.compare:
+        regressions = _compare(results, args.compare, args.threshold)
+        if regressions:
+            sys.exit(f"Regresiones: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
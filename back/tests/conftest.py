@@ -0,0 +1,82 @@
+"""
+Fixtures comunes: la app corre contra los dobles en memoria de GCS, BigQuery
+y Cloud Logging de benchmarks.fakes (no se hacen llamadas de red).
+
+Uso (desde back/):
+    python -m pytest tests
+"""
+import os
+import tempfile
+
+# Config lee el entorno al importarse: el store de jobs y los logs se
+# configuran antes de importar la app
+_TMP_DIR = tempfile.mkdtemp(prefix="llevar-tests-")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_TMP_DIR, "jobs.sqlite3"))
+os.environ.setdefault("LOGGING_MODE", "sync")
+
+import pytest
+
+
+@pytest.fixture
+def fakes():
+    """
+    Instala clientes falsos nuevos y limpia las cachés en memoria del proceso.
+
+    Returns:
+        tuple: (storage, bigquery, logging)
+    """
+    from app.core import gcp
+    from app.services import logging_service
+    from app.utils.cache import all_caches
+    from benchmarks.fakes import install_fakes
+
+    gcp._storage_clients.clear()
+    gcp._bigquery_clients.clear()
+    logging_service._logger = None
+    for cache in all_caches():
+        cache.invalidate()
+    return install_fakes()
+
+
+@pytest.fixture
+def analysis_dir(tmp_path, monkeypatch):
+    """
+    Caché de análisis (/analyze -> /upload) en una carpeta propia del test.
+    """
+    from app.utils import analysis_cache
+
+    monkeypatch.setattr(analysis_cache, "ANALYSIS_CACHE_DIR", str(tmp_path / "analysis"))
+    with analysis_cache._lock:
+        analysis_cache._artifacts.clear()
+    yield analysis_cache.ANALYSIS_CACHE_DIR
+    with analysis_cache._lock:
+        analysis_cache._artifacts.clear()
+
+
+@pytest.fixture
+def app(fakes, analysis_dir):
+    from app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def env():
+    """
+    Primer entorno/bucket configurado (environments.json).
+    """
+    from app.config import Config
+
+    environment = Config.GCP_ENVIRONMENTS[0]
+    return {
+        "env_id": environment["id"],
+        "bucket_name": environment["buckets"][0],
+        "project_id": environment["project_id"],
+    }
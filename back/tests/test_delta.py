@@ -0,0 +1,242 @@
+import io
+import json
+import time
+import uuid
+from contextlib import closing
+import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
+from app.services import dataset_service, job_service
+
+PRODUCT, TABLE = "producto", "tabla"
+BASE_NAME = f"{PRODUCT}/{TABLE}/year=2020/month=01/day=01/data.parquet"
+
+
+def _write_base(fakes, env, ids=("1", "2", "3", "4", "5"), row_group_size=2):
+    """
+    Archivo base en una partición vieja, con row groups chicos.
+    """
+    table = pa.table({
+        "id": list(ids),
+        "nombre": [f"n{i}" for i in ids],
+        "year": ["2020"] * len(ids),
+        "month": ["01"] * len(ids),
+        "day": ["01"] * len(ids),
+    })
+    sink = io.BytesIO()
+    pq.write_table(table, sink, row_group_size=row_group_size)
+    blob = fakes[0].bucket(env["bucket_name"]).blob(BASE_NAME)
+    blob.upload_from_string(sink.getvalue())
+    return blob
+
+
+def _save_delta(client, env, sync=True, **delta):
+    return client.post("/api/storage/products/save-data", json={
+        "env_id": env["env_id"],
+        "bucket_name": env["bucket_name"],
+        "product_name": PRODUCT,
+        "table_name": TABLE,
+        "mode": "delta",
+        "sync": sync,
+        **delta,
+    })
+
+
+def _latest_rows(fakes, env, path):
+    blob = fakes[0].bucket(env["bucket_name"])._objects[path]
+    return pq.read_table(io.BytesIO(blob._data)).to_pylist()
+
+
+def test_update_delete_and_insert(client, fakes, env):
+    _write_base(fakes, env)
+
+    response = _save_delta(
+        client, env,
+        updated=[{"row_id": 1, "values": {"nombre": "Ñoño"}}],
+        deleted=[3],
+        inserted=[{"id": "6", "nombre": "nuevo"}],
+    )
+
+    assert response.status_code == 200, response.get_data(as_text=True)
+    body = response.get_json()
+    assert (body["updated"], body["deleted"], body["inserted"]) == (1, 1, 1)
+    assert body["row_groups"] == 3
+    assert body["row_groups_rewritten"] == 2
+    rows = _latest_rows(fakes, env, body["path"])
+    assert [(r["id"], r["nombre"]) for r in rows] == [
+        ("1", "n1"), ("2", "nionio"), ("3", "n3"), ("5", "n5"), ("6", "nuevo")]
+
+
+def test_every_row_is_stamped_with_the_destination_partition(client, fakes, env):
+    _write_base(fakes, env)
+
+    body = _save_delta(client, env, updated=[{"row_id": 0, "values": {"nombre": "x"}}]).get_json()
+
+    _, year, month, day, _ = body["path"].split("/")[1:]
+    stamps = {(r["year"], r["month"], r["day"]) for r in _latest_rows(fakes, env, body["path"])}
+    assert stamps == {(year[5:], month[6:], day[4:])}
+
+
+def test_merge_restamps_untouched_rows(client, fakes, env):
+    _write_base(fakes, env)
+    bigquery = fakes[1]
+
+    response = _save_delta(client, env, key_columns=["id"],
+                           updated=[{"row_id": 0, "values": {"nombre": "x"}}], deleted=[4])
+
+    assert response.get_json()["bq_mode"] == "merge"
+    [changes] = bigquery.json_loads
+    update = next(c for c in changes if c["_op"] == "update")
+    assert update["_key_id"] == "1" and update["nombre"] == "x" and update["year"] != "2020"
+    assert [c["_key_id"] for c in changes if c["_op"] == "delete"] == ["5"]
+    query, config = bigquery.query_log[-1]
+    assert "WHEN NOT MATCHED BY SOURCE" in query
+    assert {p.name: p.value for p in config.query_parameters}["year"] == update["year"]
+
+
+def test_out_of_range_row_id_is_400(client, fakes, env):
+    _write_base(fakes, env)
+
+    response = _save_delta(client, env, deleted=[5])
+
+    assert response.status_code == 400
+    assert "row_id" in response.get_json()["error"]
+
+
+def test_unknown_column_is_400(client, fakes, env):
+    _write_base(fakes, env)
+
+    response = _save_delta(client, env, updated=[{"row_id": 0, "values": {"no_existe": "x"}}])
+
+    assert response.status_code == 400
+    assert "no_existe" in response.get_json()["error"]
+
+
+def test_duplicate_keys_are_400(client, fakes, env):
+    _write_base(fakes, env, ids=("1", "2", "2"))
+
+    response = _save_delta(client, env, key_columns=["id"], deleted=[0])
+    assert response.status_code == 400
+    assert "única" in response.get_json()["error"]
+
+
+def test_delta_that_creates_duplicate_keys_is_400(client, fakes, env):
+    _write_base(fakes, env)
+
+    response = _save_delta(client, env, key_columns=["id"], inserted=[{"id": "3", "nombre": "otro"}])
+    assert response.status_code == 400
+
+    # Cambiar la clave a una que se libera en el mismo delta es válido
+    response = _save_delta(client, env, key_columns=["id"], deleted=[2],
+                           updated=[{"row_id": 0, "values": {"id": "3"}}])
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def test_stale_base_is_409(client, fakes, env):
+    blob = _write_base(fakes, env)
+
+    response = _save_delta(client, env, base_file="otro.parquet", deleted=[0])
+    assert response.status_code == 409
+
+    response = _save_delta(client, env, base_generation=blob.generation - 1, deleted=[0])
+    assert response.status_code == 409
+
+
+def test_queued_delta_is_validated_before_enqueueing(client, fakes, env):
+    _write_base(fakes, env)
+
+    assert _save_delta(client, env, sync=False, deleted=[99]).status_code == 400
+
+    response = _save_delta(client, env, sync=False, deleted=[0])
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    job = job_service.get_job(job_id)
+    while job["status"] not in (job_service.SUCCEEDED, job_service.FAILED):
+        job = job_service.get_job(job_id)
+    assert job["status"] == job_service.SUCCEEDED, job["error"]
+    assert job["output_rows"] == 4
+
+
+def test_query_page_row_ids_address_the_file(client, fakes, env):
+    _write_base(fakes, env)
+
+    response = client.get(f"/api/storage/products/{PRODUCT}/{TABLE}/preview-latest", query_string={
+        **{k: env[k] for k in ("env_id", "bucket_name")},
+        "filter": "id:ge:3", "sort": "-id", "limit": 2,
+    })
+    page = response.get_json()
+    assert [r["id"] for r in page["rows"]] == ["5", "4"]
+    assert page["row_ids"] == [4, 3]
+
+    body = _save_delta(client, env, updated=[{"row_id": page["row_ids"][1], "values": {"nombre": "x"}}]).get_json()
+    assert [r["nombre"] for r in _latest_rows(fakes, env, body["path"])][3] == "x"
+
+
+def _crash_before_bigquery(fakes, env, **delta):
+    """
+    Aplica el delta como lo haría el job y corta justo después de escribir en
+    GCS, como un worker que se cae; devuelve el payload y el checkpoint.
+    """
+    blob = _write_base(fakes, env)
+    payload = {
+        "env_id": env["env_id"], "bucket_name": env["bucket_name"],
+        "product_name": PRODUCT, "table_name": TABLE, "mode": "delta",
+        "base_generation": blob.generation, **delta,
+    }
+    saved = {}
+
+    def report(stage, progress, output_rows=None, checkpoint=None):
+        if checkpoint is not None:
+            saved.update(checkpoint)
+        if stage == "bq_table":
+            raise SystemExit("worker caído")
+
+    with pytest.raises(SystemExit):
+        dataset_service.apply_delta_and_sync(
+            payload["env_id"], payload["bucket_name"], PRODUCT, TABLE,
+            delta.get("inserted"), delta.get("updated"), delta.get("deleted"), "tester",
+            key_columns=delta.get("key_columns"), base_generation=blob.generation, progress=report)
+    return payload, saved
+
+
+def _insert_orphan(payload, checkpoint):
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with closing(job_service._connect()) as conn, conn:
+        conn.execute(
+            "INSERT INTO jobs (id, type, status, stage, progress, payload, checkpoint, owner, "
+            "lease_expires_at, created_at, updated_at) VALUES (?, ?, ?, 'bq_table', 0.5, ?, ?, ?, ?, ?, ?)",
+            (job_id, dataset_service.SAVE_DATASET_JOB, job_service.RUNNING, json.dumps(payload),
+             json.dumps(checkpoint), "otro-host:9:abc", now - 1, now, now))
+    job_service._recover_orphaned_jobs(job_service._get_executor())
+    job = job_service.get_job(job_id)
+    while job["status"] not in (job_service.SUCCEEDED, job_service.FAILED):
+        time.sleep(0.02)
+        job = job_service.get_job(job_id)
+    return job
+
+
+def test_recovered_delta_job_resumes_at_bigquery(fakes, env):
+    payload, checkpoint = _crash_before_bigquery(
+        fakes, env, key_columns=["id"], updated=[{"row_id": 0, "values": {"nombre": "x"}}])
+    bigquery = fakes[1]
+    assert checkpoint["path"] and not bigquery.json_loads
+
+    job = _insert_orphan(payload, checkpoint)
+
+    assert job["status"] == job_service.SUCCEEDED, job["error"]
+    assert job["result"]["path"] == checkpoint["path"]
+    assert job["result"]["bq_mode"] == "merge"
+    [changes] = bigquery.json_loads
+    assert [c["_key_id"] for c in changes if c["_op"] == "update"] == ["1"]
+
+
+def test_recovered_delta_job_fails_if_dataset_changed(fakes, env):
+    payload, checkpoint = _crash_before_bigquery(fakes, env, deleted=[0])
+    newer = f"{PRODUCT}/{TABLE}/year=2999/month=01/day=01/data.parquet"
+    fakes[0].bucket(env["bucket_name"]).blob(newer).upload_from_string(b"otro")
+
+    job = _insert_orphan(payload, checkpoint)
+
+    assert job["status"] == job_service.FAILED
+    assert "BigQuery no se sincronizó" in job["error"]
@@ -0,0 +1,61 @@
+import io
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from app.utils.file_processing import iter_excel_chunks, read_excel_to_dataframe
+
+
+def _xlsx(*rows):
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(list(row))
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+    return stream
+
+
+def _streamed(stream, **options):
+    return pd.concat(list(iter_excel_chunks(stream, chunk_rows=2, **options)), ignore_index=True)
+
+
+def test_header_with_blank_column_is_kept_like_read_excel():
+    stream = _xlsx(
+        ["id", "nombre", "nota", None],
+        [1, "a", "x"],
+        [2, "b", "y", "extra"],
+        [3, "c", "z"],
+    )
+
+    streamed = _streamed(stream)
+    expected = pd.read_excel(io.BytesIO(stream.getvalue()), dtype=str)
+
+    assert list(streamed.columns) == ["id", "nombre", "nota", "Unnamed: 3"]
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False)
+
+
+def test_leading_title_and_blank_rows_are_skipped():
+    stream = _xlsx(
+        ["Reporte de ventas"],
+        [],
+        ["id", "nombre", "nota"],
+        [1, "a", None],
+        [2.0, "b", "y"],
+    )
+
+    df = _streamed(stream)
+
+    assert list(df.columns) == ["id", "nombre", "nota"]
+    assert df["id"].tolist() == ["1", "2"]
+    assert pd.isna(df.loc[0, "nota"])
+
+
+def test_explicit_header_row_and_sheet():
+    stream = _xlsx(["titulo", "x"], ["a", "b"], ["1", "2"])
+
+    df = read_excel_to_dataframe(stream, header_row=2)
+
+    assert df.to_dict(orient="records") == [{"a": "1", "b": "2"}]
+    with pytest.raises(ValueError):
+        list(iter_excel_chunks(stream, sheet_name="No existe"))
@@ -0,0 +1,130 @@
+import json
+import time
+import uuid
+from contextlib import closing
+import pytest
+from app.services import job_service
+
+PRODUCT, TABLE = "producto", "tabla"
+
+
+def _wait(job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while True:
+        job = job_service.get_job(job_id)
+        if job["status"] in (job_service.SUCCEEDED, job_service.FAILED) or time.time() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def _save_body(env, **extra):
+    return {
+        "env_id": env["env_id"],
+        "bucket_name": env["bucket_name"],
+        "product_name": PRODUCT,
+        "table_name": TABLE,
+        "rows": [{"a": "1", "b": "x"}, {"a": "2", "b": None}],
+        **extra,
+    }
+
+
+@job_service.register_handler("test_fail")
+def _failing_job(payload, report):
+    report("working", 0.5)
+    raise RuntimeError("falló a propósito")
+
+
+@job_service.register_handler("test_echo")
+def _echo_job(payload, report):
+    return {"echo": payload["value"], "output_rows": 1}
+
+
+def test_save_data_is_queued_by_default(client, fakes, env):
+    response = client.post("/api/storage/products/save-data", json=_save_body(env))
+
+    assert response.status_code == 202
+    body = response.get_json()
+    assert body["status_url"] == f"/api/storage/jobs/{body['job_id']}"
+
+    job = _wait(body["job_id"])
+    assert job["status"] == job_service.SUCCEEDED, job["error"]
+    assert job["output_rows"] == 2
+    assert job["result"]["path"].startswith(f"{PRODUCT}/{TABLE}/year=")
+    assert fakes[1].loads == 1
+
+    polled = client.get(body["status_url"]).get_json()
+    assert polled["status"] == job_service.SUCCEEDED
+    assert "payload" not in polled
+
+
+def test_save_data_sync_flag_runs_in_request(client, fakes, env):
+    response = client.post("/api/storage/products/save-data", json=_save_body(env, sync=True))
+
+    assert response.status_code == 200
+    assert response.get_json()["bq_loaded"] == 2
+
+
+def test_unknown_job_is_404(client):
+    assert client.get("/api/storage/jobs/no-existe").status_code == 404
+
+
+def test_failed_job_reports_error():
+    job = _wait(job_service.submit_job("test_fail", {}))
+
+    assert job["status"] == job_service.FAILED
+    assert job["error"] == "falló a propósito"
+    assert job["stage"] == "working"
+
+
+def test_submit_rejects_unknown_type():
+    with pytest.raises(ValueError):
+        job_service.submit_job("no_registrado", {})
+
+
+def _insert_job(owner, lease_expires_at, value):
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with closing(job_service._connect()) as conn, conn:
+        conn.execute(
+            "INSERT INTO jobs (id, type, status, stage, progress, payload, owner, lease_expires_at, "
+            "created_at, updated_at) VALUES (?, 'test_echo', ?, 'started', 0.3, ?, ?, ?, ?, ?)",
+            (job_id, job_service.RUNNING, json.dumps({"value": value}), owner, lease_expires_at, now, now))
+    return job_id
+
+
+def test_orphan_with_expired_lease_is_recovered():
+    executor = job_service._get_executor()
+    # Mismo pid en otro contenedor: solo cuenta el lease
+    orphan = _insert_job("otro-host:1:abc", time.time() - 1, "huérfano")
+    alive = _insert_job("otro-host:1:def", time.time() + 60, "vivo")
+
+    job_service._recover_orphaned_jobs(executor)
+
+    job = _wait(orphan)
+    assert job["status"] == job_service.SUCCEEDED
+    assert job["result"] == {"echo": "huérfano", "output_rows": 1}
+    assert job_service.get_job(alive)["status"] == job_service.RUNNING
+
+
+def test_orphan_is_claimed_once(monkeypatch):
+    executor = job_service._get_executor()
+    orphan = _insert_job("otro-host:2:abc", time.time() - 1, "una vez")
+    runs = []
+    monkeypatch.setattr(job_service, "_run_job", runs.append)
+
+    job_service._recover_orphaned_jobs(executor)
+    job_service._recover_orphaned_jobs(executor)
+    executor.submit(lambda: None).result()
+
+    assert runs == [orphan]
+
+
+def test_own_leases_are_renewed():
+    job_service._get_executor()
+    job_id = _insert_job(job_service._owner, time.time() - 1, "propio")
+
+    job_service._renew_leases()
+
+    with closing(job_service._connect()) as conn:
+        lease = conn.execute("SELECT lease_expires_at FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert lease > time.time()
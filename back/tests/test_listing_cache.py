@@ -0,0 +1,85 @@
+import threading
+import pandas as pd
+from app.services import storage_service
+from app.utils.cache import SharedTTLCache
+
+
+def test_listing_is_cached_until_own_write(fakes, env):
+    storage = fakes[0]
+    project_id, bucket_name = env["project_id"], env["bucket_name"]
+    df = pd.DataFrame({"a": ["1"]})
+
+    storage_service.upload_dataframe(project_id, bucket_name, df, "producto/tabla")
+    assert storage_service.list_data_products(project_id, bucket_name) == ["producto"]
+    calls = storage.list_calls
+    assert storage_service.list_data_products(project_id, bucket_name) == ["producto"]
+    assert storage.list_calls == calls
+
+    # La escritura propia invalida el listado del bucket (no hay que esperar el TTL)
+    storage_service.upload_dataframe(project_id, bucket_name, df, "otro/tabla")
+    assert sorted(storage_service.list_data_products(project_id, bucket_name)) == ["otro", "producto"]
+    assert storage.list_calls > calls
+
+
+def test_write_only_invalidates_prefixes_that_contain_it(fakes, env):
+    storage = fakes[0]
+    project_id, bucket_name = env["project_id"], env["bucket_name"]
+    df = pd.DataFrame({"a": ["1"]})
+    storage_service.upload_dataframe(project_id, bucket_name, df, "p1/t1")
+    storage_service.upload_dataframe(project_id, bucket_name, df, "p2/t1")
+
+    assert storage_service.list_subfolders_in_path(project_id, bucket_name, "p1") == ["t1"]
+    assert storage_service.list_subfolders_in_path(project_id, bucket_name, "p2") == ["t1"]
+    calls = storage.list_calls
+
+    storage_service.upload_dataframe(project_id, bucket_name, df, "p2/t2")
+    assert storage_service.list_subfolders_in_path(project_id, bucket_name, "p1") == ["t1"]
+    assert storage.list_calls == calls
+    assert sorted(storage_service.list_subfolders_in_path(project_id, bucket_name, "p2")) == ["t1", "t2"]
+    assert storage.list_calls == calls + 1
+
+
+def test_invalidation_during_load_is_not_cached():
+    cache = SharedTTLCache(maxsize=10, ttl=60, name="test")
+    loading = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        loading.set()
+        release.wait(5)
+        return "viejo"
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", cache.get_or_load("k", slow_loader)))
+    thread.start()
+    loading.wait(5)
+    cache.invalidate(lambda key: key == "k")
+    release.set()
+    thread.join(5)
+
+    # El valor calculado antes de la escritura se entrega, pero no se guarda
+    assert result["value"] == "viejo"
+    assert cache.get_or_load("k", lambda: "nuevo") == "nuevo"
+
+
+def test_concurrent_loads_are_coalesced():
+    cache = SharedTTLCache(maxsize=10, ttl=60, name="test")
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    threads = [threading.Thread(target=cache.get_or_load, args=("k", loader)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()["coalesced"] < 3:
+        threading.Event().wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert cache.stats()["misses"] == 1
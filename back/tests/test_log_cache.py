@@ -0,0 +1,44 @@
+from app.services import logging_service
+
+
+def _messages(page):
+    return [log["message"] for log in page["logs"]]
+
+
+def test_write_invalidates_only_queries_that_can_include_it(fakes):
+    logs = fakes[2]
+    logging_service.log_info("primero", user="ana", product="ventas")
+    logging_service.log_info("otro", user="beto", product="compras")
+
+    assert _messages(logging_service.get_all_logs_service()) == ["otro", "primero"]
+    assert _messages(logging_service.get_logs_by_user("ana")) == ["primero"]
+    assert _messages(logging_service.get_logs_by_user("beto")) == ["otro"]
+    assert _messages(logging_service.get_logs_by_product("ventas")) == ["primero"]
+    queries = logs.queries
+
+    logging_service.log_info("segundo", user="ana", product="ventas")
+
+    # Se vuelven a consultar la lista general, la del usuario y la del producto
+    assert _messages(logging_service.get_all_logs_service()) == ["segundo", "otro", "primero"]
+    assert _messages(logging_service.get_logs_by_user("ana")) == ["segundo", "primero"]
+    assert _messages(logging_service.get_logs_by_product("ventas")) == ["segundo", "primero"]
+    assert logs.queries == queries + 3
+    # La de otro usuario sigue en caché
+    assert _messages(logging_service.get_logs_by_user("beto")) == ["otro"]
+    assert logs.queries == queries + 3
+
+
+def test_bucket_write_invalidates_bucket_queries(fakes):
+    logs = fakes[2]
+    logging_service.log_info("carga", bucket="raw-uno")
+
+    assert _messages(logging_service.get_logs_by_product("raw-uno")) == ["carga"]
+    assert _messages(logging_service.get_logs_by_product("raw-dos")) == []
+    queries = logs.queries
+
+    logging_service.log_info("otra carga", bucket="raw-uno")
+
+    assert _messages(logging_service.get_logs_by_product("raw-dos")) == []
+    assert logs.queries == queries
+    assert _messages(logging_service.get_logs_by_product("raw-uno")) == ["otra carga", "carga"]
+    assert logs.queries == queries + 1
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+from app.services import logging_service
+
+BASE = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _write(fakes, entries):
+    """
+    entries: [(mensaje, segundos desde BASE)], escritos con ese timestamp.
+    """
+    logger = fakes[2].logger("test")
+    for message, seconds in entries:
+        logger.log_struct({"message": message, "user": "ana"}, severity="INFO",
+                          timestamp=BASE + timedelta(seconds=seconds))
+
+
+def _all_pages(client, url, limit):
+    messages, token, pages = [], None, 0
+    while True:
+        params = {"limit": limit, **({"page_token": token} if token else {})}
+        response = client.get(url, query_string=params)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        body = response.get_json()
+        messages += [log["message"] for log in body["logs"]]
+        pages += 1
+        token = body["next_page_token"]
+        if token is None:
+            return messages, pages
+
+
+def test_page_token_round_trip_keeps_ties(client, fakes):
+    # Tres entradas con el mismo timestamp cortadas por el límite de página
+    _write(fakes, [("e1", 1), ("e2", 2), ("e3", 2), ("e4", 2), ("e5", 3)])
+
+    messages, pages = _all_pages(client, "/api/logs/user/ana", limit=2)
+
+    assert sorted(messages) == ["e1", "e2", "e3", "e4", "e5"]
+    assert messages[0] == "e5" and messages[-1] == "e1"
+    assert pages == 3
+
+
+def test_start_and_end_filter_the_range(client, fakes):
+    _write(fakes, [(f"e{i}", i) for i in range(6)])
+
+    response = client.get("/api/logs/user/ana", query_string={
+        "start": (BASE + timedelta(seconds=2)).isoformat(),
+        "end": "2024-05-01T12:00:04Z",
+    })
+
+    assert [log["message"] for log in response.get_json()["logs"]] == ["e4", "e3", "e2"]
+
+
+def test_start_without_timezone_is_utc(fakes):
+    _write(fakes, [("antes", 0), ("despues", 10)])
+
+    page = logging_service.get_logs_by_user("ana", start=datetime(2024, 5, 1, 12, 0, 5))
+
+    assert [log["message"] for log in page["logs"]] == ["despues"]
+
+
+def test_invalid_page_token_is_400(client, fakes):
+    response = client.get("/api/logs/product/ventas", query_string={"page_token": "no-es-un-token"})
+
+    assert response.status_code == 400
+    assert "page_token" in response.get_json()["error"]
+
+
+def test_invalid_dates_and_limit_are_400(client, fakes):
+    assert client.get("/api/logs/user/ana", query_string={"start": "ayer"}).status_code == 400
+    assert client.get("/api/logs/product/ventas", query_string={"end": "2024-13-01"}).status_code == 400
+    assert client.get("/api/logs/user/ana", query_string={"limit": 0}).status_code == 400
@@ -0,0 +1,75 @@
+import threading
+from app.services.logging_service import BatchLogTransport
+from benchmarks.fakes import FakeLoggingClient
+
+
+def _transport(client, **kwargs):
+    options = dict(batch_size=3, flush_interval=0.05, max_queue=100)
+    options.update(kwargs)
+    return BatchLogTransport(lambda: client.logger("test"), **options)
+
+
+def test_entries_are_sent_in_batches():
+    client = FakeLoggingClient()
+    transport = _transport(client)
+    for i in range(7):
+        transport.enqueue({"message": str(i)}, "INFO")
+    transport.close()
+
+    assert [e.payload["message"] for e in client.entries] == [str(i) for i in range(7)]
+    stats = transport.stats()
+    assert stats["sent"] == 7 and stats["pending"] == 0
+    assert client.commits == stats["batches"] >= 3
+
+
+def test_full_queue_drops_entries():
+    client = FakeLoggingClient()
+    transport = _transport(client, max_queue=2, flush_interval=5)
+    transport._ensure_worker = lambda: None  # sin thread: la cola no se vacía
+    for i in range(5):
+        transport.enqueue({"message": str(i)}, "INFO")
+
+    assert transport.stats()["dropped"] == 3
+    transport.close()
+    assert transport.stats()["sent"] == 2
+
+
+def test_close_waits_for_in_flight_batch():
+    sending = threading.Event()
+    release = threading.Event()
+    commits = []
+
+    class SlowBatch:
+        def __init__(self):
+            self.entries = []
+
+        def log_struct(self, payload, **kwargs):
+            self.entries.append(payload)
+
+        def commit(self):
+            sending.set()
+            release.wait(5)
+            commits.append((threading.current_thread().name, len(self.entries)))
+
+    class SlowLogger:
+        def batch(self):
+            return SlowBatch()
+
+    transport = BatchLogTransport(lambda: SlowLogger(), batch_size=2, flush_interval=0.05, max_queue=100)
+    transport.enqueue({"message": "a"}, "INFO")
+    transport.enqueue({"message": "b"}, "INFO")
+    sending.wait(5)
+    transport.enqueue({"message": "c"}, "INFO")
+
+    closer = threading.Thread(target=transport.close)
+    closer.start()
+    closer.join(0.2)
+    # close() no envía mientras el thread tiene un lote en vuelo
+    assert closer.is_alive()
+    assert commits == []
+
+    release.set()
+    closer.join(5)
+    assert commits[0] == ("log-transport", 2)
+    assert sum(n for _, n in commits) == 3
+    assert transport.stats()["sent"] == 3
@@ -0,0 +1,47 @@
+import pytest
+from app.config import Config
+from app.utils import profiling
+
+TOKEN = "secreto"
+
+
+@pytest.fixture
+def profiled_client(fakes, analysis_dir, tmp_path, monkeypatch):
+    from app import create_app
+
+    monkeypatch.setattr(Config, "PROFILING_TOKEN", TOKEN)
+    monkeypatch.setattr(Config, "PROFILING_OUTPUT_DIR", str(tmp_path / "profiles"))
+    app = create_app()
+    app.config["TESTING"] = True
+    return app.test_client()
+
+
+def test_header_token_profiles_the_request(profiled_client):
+    response = profiled_client.get("/api/storage/environments", headers={"X-Profile": TOKEN})
+
+    profile_id = response.headers["X-Profile-Id"]
+    summary = profiled_client.get(f"/profiles/{profile_id}", query_string={"format": "json"},
+                                  headers={"X-Profile": TOKEN})
+    assert summary.get_json()["path"] == "/api/storage/environments"
+
+
+def test_query_token_is_not_accepted(profiled_client):
+    response = profiled_client.get("/api/storage/environments", query_string={"_profile": TOKEN})
+    assert "X-Profile-Id" not in response.headers
+
+    response = profiled_client.get("/api/storage/environments", headers={"X-Profile": "otro"})
+    assert "X-Profile-Id" not in response.headers
+
+
+def test_only_one_request_is_profiled_at_a_time(profiled_client):
+    running = profiling.RequestProfile.start(interval=1.0)
+    try:
+        response = profiled_client.get("/api/storage/environments", headers={"X-Profile": TOKEN})
+        assert response.status_code == 200
+        assert "X-Profile-Id" not in response.headers
+        assert response.headers["X-Profile-Busy"] == "1"
+    finally:
+        running.finish(Config.PROFILING_OUTPUT_DIR, "GET", "/", 200)
+
+    response = profiled_client.get("/api/storage/environments", headers={"X-Profile": TOKEN})
+    assert "X-Profile-Id" in response.headers
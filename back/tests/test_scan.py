@@ -0,0 +1,99 @@
+import io
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+from app.utils.parquet_utils import build_scan_filter, parse_filter, parse_sort, scan_page
+
+TABLE = pa.table({
+    "id": list(range(12)),
+    "estado": ["A", "B", "C", "a", "B", "A", "C", "B", "A", "A", "B", "C"],
+    "nombre": ["Ana", "beto", "Carla", "DANI", "eva", "Fede", "gabi", "Hugo", "ines", "Juan", "kiko", "Lola"],
+})
+
+
+def _fragment(table=TABLE, row_group_size=4):
+    sink = io.BytesIO()
+    pq.write_table(table, sink, row_group_size=row_group_size)
+    sink.seek(0)
+    return ds.ParquetFileFormat().make_fragment(sink)
+
+
+def _ids(specs, search=None):
+    expression = build_scan_filter(specs, search, TABLE.schema)
+    return TABLE.filter(expression).column("id").to_pylist()
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("id:eq:3", [3]),
+    ("id:ne:0", list(range(1, 12))),
+    ("id:lt:2", [0, 1]),
+    ("id:le:1", [0, 1]),
+    ("id:gt:10", [11]),
+    ("id:GE:10", [10, 11]),
+    ("estado:in:A|C", [0, 2, 5, 6, 8, 9, 11]),
+    ("id:in:1|3", [1, 3]),
+    ("nombre:contains:AN", [0, 3, 9]),
+    ("id:contains:1", [1, 10, 11]),
+    ("nombre:eq:a:b", []),
+])
+def test_parse_filter_operators(spec, expected):
+    assert _ids([spec]) == expected
+
+
+@pytest.mark.parametrize("spec", ["id", "id:eq", ":eq:1", "id:like:1", "no_existe:eq:1", "id:eq:uno", "id:in:1|x"])
+def test_parse_filter_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_filter(spec, TABLE.schema)
+
+
+def test_filters_and_search_are_combined():
+    assert _ids(["estado:eq:A"], search="an") == [0, 9]
+    assert build_scan_filter([], None, TABLE.schema) is None
+    assert _ids([], search="zzz") == []
+
+
+def test_search_without_text_columns_matches_nothing():
+    numbers = pa.table({"n": [1, 2]})
+    assert numbers.filter(build_scan_filter([], "1", numbers.schema)).num_rows == 0
+
+
+def test_parse_sort():
+    assert parse_sort("estado, -id,+nombre,", TABLE.schema) == [
+        ("estado", "ascending"), ("id", "descending"), ("nombre", "ascending")]
+    assert parse_sort(None, TABLE.schema) == []
+    with pytest.raises(ValueError):
+        parse_sort("-no_existe", TABLE.schema)
+
+
+@pytest.mark.parametrize("source", [_fragment(), TABLE], ids=["parquet", "table"])
+def test_top_k_ties_keep_file_order_across_batches(source):
+    sort_keys = parse_sort("estado", TABLE.schema)
+    pages = [scan_page(source, offset, 3, sort_keys=sort_keys, batch_size=2) for offset in range(0, 12, 3)]
+
+    assert {total for total, _, _ in pages} == {12}
+    ids = [i for _, page, _ in pages for i in page.column("id").to_pylist()]
+    # Empates de 'estado' en el orden del archivo, sin repetir ni saltar filas entre páginas
+    assert ids == [0, 5, 8, 9, 1, 4, 7, 10, 2, 6, 11, 3]
+    assert [r for _, _, row_ids in pages for r in row_ids] == ids
+
+
+def test_filtered_page_returns_file_row_ids():
+    fragment = _fragment()
+    expression = build_scan_filter(["estado:eq:B"], None, TABLE.schema)
+
+    total, page, row_ids = scan_page(fragment, 1, 2, columns=["nombre"], expression=expression, batch_size=2)
+
+    assert total == 4
+    assert page.column_names == ["nombre"]
+    assert page.column("nombre").to_pylist() == ["eva", "Hugo"]
+    assert row_ids == [4, 7]
+
+
+def test_row_groups_outside_the_filter_are_skipped():
+    fragment = _fragment()
+    expression = build_scan_filter(["id:ge:8"], None, TABLE.schema)
+
+    assert len(fragment.split_by_row_group(expression)) == 1
+    total, page, row_ids = scan_page(fragment, 0, 10, expression=expression)
+    assert (total, row_ids) == (4, [8, 9, 10, 11])
@@ -0,0 +1,76 @@
+import io
+import pyarrow.parquet as pq
+
+CSV = "a,b,c\n1,,x\n2,y,\n,,\n3,ñandú,z\n".encode("utf-8")
+DESTINATION = "producto/tabla"
+
+
+def _upload(client, env, data=CSV, filename="datos.csv"):
+    response = client.post("/api/storage/upload", data={
+        **{k: env[k] for k in ("env_id", "bucket_name")},
+        "destination": DESTINATION,
+        "file": (io.BytesIO(data), filename),
+    }, content_type="multipart/form-data")
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def _analyze(client, env, step, data=CSV, filename="datos.csv"):
+    response = client.post("/api/storage/analyze", data={
+        "step": step,
+        **{k: env[k] for k in ("env_id", "bucket_name")},
+        "destination": DESTINATION,
+        "file": (io.BytesIO(data), filename),
+    }, content_type="multipart/form-data")
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()
+
+
+def _written_rows(fakes, env):
+    storage = fakes[0]
+    bucket = storage.bucket(env["bucket_name"])
+    [blob] = [b for name, b in bucket._objects.items() if name.startswith(DESTINATION)]
+    return pq.read_table(io.BytesIO(blob._data)).to_pylist()
+
+
+def test_upload_writes_empty_cells_as_empty_strings(client, fakes, env):
+    _upload(client, env)
+
+    rows = _written_rows(fakes, env)
+    assert rows[0] == {"a": "1", "b": "", "c": "x"}
+    assert rows[2] == {"a": "", "b": "", "c": ""}
+    assert rows[3] == {"a": "3", "b": "niandu", "c": "z"}
+
+
+def test_upload_after_analyze_matches_uncached_upload(client, fakes, env, analysis_dir):
+    _upload(client, env)
+    uncached = _written_rows(fakes, env)
+    fakes[0].bucket(env["bucket_name"])._objects.clear()
+
+    # El paso 2 deja el parseo como artefacto Parquet y /upload lo reutiliza
+    preview = _analyze(client, env, "2")
+    assert preview["vista_previa"][0] == {"a": "1", "b": None, "c": "x"}
+    _upload(client, env)
+
+    assert _written_rows(fakes, env) == uncached
+
+
+def test_non_numeric_header_row_is_400(client, env):
+    for header_row in ("dos", "1.5"):
+        response = client.post("/api/storage/analyze", data={
+            "step": "1",
+            **{k: env[k] for k in ("env_id", "bucket_name")},
+            "header_row": header_row,
+            "file": (io.BytesIO(CSV), "datos.csv"),
+        }, content_type="multipart/form-data")
+
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "El parámetro 'header_row' debe ser un entero."
+
+
+def test_analyze_preview_with_columns_that_clean_to_the_same_name(client, env, analysis_dir):
+    csv = "Código,Codigo,valor\nA1,x,1\n".encode("utf-8")
+
+    structure = _analyze(client, env, "2", data=csv)
+
+    assert [c["nombre"] for c in structure["columnas_encontradas"]] == ["codigo", "codigo", "valor"]
+    assert structure["vista_previa"] == [{"codigo": "x", "valor": "1"}]
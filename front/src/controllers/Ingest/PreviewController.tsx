@@ -6,6 +6,7 @@ import DatasetAdapter, { DatasetModel } from "models/Ingest/dataset-model";
 import {
   getLatestDatasetPreviewService,
   saveDatasetDataService,
+  SaveJobPendingError,
 } from "services/Ingest/dataset-service";
 import PreviewScreen from "screens/Ingest/PreviewScreen";
 
@@ -107,6 +108,10 @@ const PreviewController = () => {
       // pero como el front ya tiene los datos actualizados, no es estrictamente necesario.
       // loadData();
     } catch (e) {
+      if (e instanceof SaveJobPendingError) {
+        enqueueSnackbar(e.message, { variant: "info" });
+        return;
+      }
       console.error("Error saving data:", e);
       setEndpointStatus("SaveDataset", { error: true });
       enqueueSnackbar("Error al guardar los cambios en la nube.", {
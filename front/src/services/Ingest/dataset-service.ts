@@ -14,8 +14,66 @@ export interface SaveDatasetResponse {
   success: boolean;
   message: string;
   path?: string;
+  job_id?: string;
 }
 
+// Estado de un job de guardado en segundo plano
+interface SaveJobStatus {
+  status: "queued" | "running" | "succeeded" | "failed";
+  stage?: string;
+  error?: string;
+  result?: { path?: string };
+}
+
+const JOB_POLL_INTERVAL_MS = 1000;
+// Tiempo máximo esperando el job antes de dejarlo corriendo en el servidor
+const JOB_WAIT_TIMEOUT_MS = 10 * 60 * 1000;
+// Consultas fallidas seguidas (red, 5xx, 429) que se toleran antes de abortar
+const JOB_POLL_MAX_FAILURES = 5;
+
+// El job sigue en cola o corriendo al vencer JOB_WAIT_TIMEOUT_MS: el guardado
+// puede terminar bien, pero el front deja de esperarlo
+export class SaveJobPendingError extends Error {
+  jobId: string;
+
+  constructor(jobId: string) {
+    super(`El guardado sigue en curso (job ${jobId}). Revisa el dataset más tarde.`);
+    this.name = "SaveJobPendingError";
+    this.jobId = jobId;
+  }
+}
+
+const isTransientStatus = (status?: number) =>
+  status === undefined || status === 429 || status >= 500;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// El guardado se encola (202 + job_id): se consulta el job hasta que termine,
+// reintentando los errores transitorios y con un plazo máximo
+const waitForSaveJob = async (jobId: string): Promise<SaveJobStatus> => {
+  const deadline = Date.now() + JOB_WAIT_TIMEOUT_MS;
+  let failures = 0;
+
+  while (Date.now() < deadline) {
+    const response = await AxiosGet(`/api/storage/jobs/${jobId}`);
+    const job: SaveJobStatus | undefined = response?.data;
+
+    if (response?.status === 200 && job?.status) {
+      failures = 0;
+      if (job.status === "succeeded" || job.status === "failed") {
+        return job;
+      }
+    } else if (isTransientStatus(response?.status) && failures < JOB_POLL_MAX_FAILURES) {
+      failures += 1;
+    } else {
+      throw new Error(`No se pudo consultar el job ${jobId} (HTTP ${response?.status ?? "sin respuesta"}).`);
+    }
+
+    await sleep(JOB_POLL_INTERVAL_MS * (failures + 1));
+  }
+  throw new SaveJobPendingError(jobId);
+};
+
 export const getLatestDatasetPreviewService = async (
   envId: string, 
   bucketName: string,
@@ -50,5 +108,14 @@ export const saveDatasetDataService = async (
   };
 
   const response = await AxiosPost("/api/storage/products/save-data", payload);
-  return response?.data;
+  const data: SaveDatasetResponse = response?.data;
+  if (response?.status !== 202 || !data?.job_id) {
+    return data;
+  }
+
+  const job = await waitForSaveJob(data.job_id);
+  if (job.status === "failed") {
+    throw new Error(job.error || "Error al guardar los datos.");
+  }
+  return { ...data, message: "Datos guardados.", path: job.result?.path };
 };
\ No newline at end of file